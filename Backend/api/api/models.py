@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.db import models
+
+
+class Notification(models.Model):
+    """
+    Notification model representing a notification for a user.
+
+    Attributes:
+        user (User): The user the notification belongs to.
+        message (str): The message of the notification.
+        timestamp (datetime): The timestamp when the notification was created.
+        is_read (bool): Indicates if the notification has been read.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='notifications',
+                             db_index=False)
+    message = models.CharField(max_length=255)
+    timestamp = models.DateTimeField(auto_now_add=True)
+    is_read = models.BooleanField(default=False)
+
+    class Meta:
+        ordering = ['-timestamp', '-id']
+        # The feed pages through a user's notifications by (timestamp, id); both
+        # indexes also serve every lookup by user alone.
+        indexes = [
+            models.Index(fields=['user', 'timestamp', 'id'], name='notification_user_ts_idx'),
+            models.Index(fields=['user', 'is_read', 'timestamp', 'id'], name='notification_user_read_ts_idx'),
+        ]
@@ -53,6 +53,7 @@ INSTALLED_APPS = [
     'rest_framework',  # Django Rest Framework
     'django_elasticsearch_dsl',  # Elasticsearch integration
     'django_extensions',  # Added django_extensions
+    'api',  # Project models
 ]
 
 MIDDLEWARE = [
@@ -228,6 +229,43 @@ CELERY_BEAT_SCHEDULE = {
         'task': 'app.tasks.task_name',
         'schedule': 3600.0,  # Run every hour
     },
+    'compute-related-posts': {
+        'task': 'app.tasks.compute_related_posts',
+        'schedule': 3600.0,  # Run every hour
+    },
+    'compute-related-posts-full': {
+        'task': 'app.tasks.compute_related_posts',
+        'schedule': 86400.0,  # Run every day; lets new posts enter the recommendations of unchanged posts
+        'kwargs': {'full': True},
+    },
+    'flush-view-counts': {
+        'task': 'app.tasks.flush_view_counts',
+        'schedule': 30.0,  # Run every 30 seconds
+    },
+    'reconcile-trending': {
+        'task': 'app.tasks.reconcile_trending',
+        'schedule': 3600.0,  # Run every hour
+    },
+    'purge-deleted-users': {
+        'task': 'app.tasks.purge_deleted_users',
+        'schedule': 3600.0,  # Run every hour
+    },
+    'flush-admin-stats': {
+        'task': 'app.tasks.flush_admin_stats',
+        'schedule': 10.0,  # Run every 10 seconds
+    },
+    'reconcile-admin-stats': {
+        'task': 'app.tasks.reconcile_admin_stats',
+        'schedule': 3600.0,  # Run every hour
+    },
+    'reconcile-unread-notifications': {
+        'task': 'app.tasks.reconcile_unread_notifications',
+        'schedule': 3600.0,  # Run every hour
+    },
+    'drain-mail-outbox': {
+        'task': 'app.tasks.drain_mail_outbox',
+        'schedule': 30.0,  # Run every 30 seconds; catches emails whose scheduled drain was lost
+    },
 }
 
 # Redis caching configuration
@@ -10,16 +10,17 @@ from django.core.files.storage import default_storage
 from django.core.files.base import ContentFile
 from django.http import JsonResponse
 from django.shortcuts import get_object_or_404
-from django.core.mail import send_mail
 from django.conf import settings
 from django.db.models import Q
 from rest_framework import serializers
 from channels.generic.websocket import WebsocketConsumer
 import json
+from datetime import datetime, timedelta, timezone
 from django.utils.html import escape
 from elasticsearch import Elasticsearch
 from elasticsearch_dsl import Search, Q as ESQ
 from elasticsearch_dsl.query import MultiMatch
+from app.mail_outbox import enqueue_email
 
 
 class StandardizedResponse:
@@ -124,31 +125,99 @@ class UserRoleView(APIView):
         return StandardizedResponse.success({"message": "Role added successfully"})
 
 
+NOTIFICATION_PAGE_SIZE = 20
+NOTIFICATION_PAGE_SIZE_MAX = 100
+# Cursors hold the timestamp as integer microseconds since the UTC epoch, like the Flask feed
+NOTIFICATION_CURSOR_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def encode_notification_cursor(notification):
+    """
+    Build the cursor pointing after a notification in the feed.
+
+    :param notification: The last notification of a page.
+    :return: The cursor string, ``<microseconds since the epoch>_<id>``.
+    """
+    timestamp = notification.timestamp
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return f"{(timestamp - NOTIFICATION_CURSOR_EPOCH) // timedelta(microseconds=1)}_{notification.id}"
+
+
+def decode_notification_cursor(cursor):
+    """
+    Parse a notification feed cursor.
+
+    :param cursor: The cursor string.
+    :return: Tuple of the timestamp and the notification ID.
+    :raises ValueError: If the cursor is malformed.
+    """
+    micros, _, notification_id = cursor.partition('_')
+    try:
+        timestamp = NOTIFICATION_CURSOR_EPOCH + timedelta(microseconds=int(micros))
+    except OverflowError as e:
+        raise ValueError(f"Cursor out of range: {cursor}") from e
+    if not settings.USE_TZ:
+        timestamp = timestamp.replace(tzinfo=None)
+    return timestamp, int(notification_id)
+
+
+def notification_feed(request):
+    """
+    Respond with a page of the authenticated user's notifications, newest first.
+
+    Pages continue from the ``next_cursor`` metadata of the previous page, so
+    each page is a range scan of the (user, timestamp, id) index. ``limit``
+    sets the page size and ``unread_only=true`` leaves out read notifications.
+
+    :param request: The request.
+    :return: A standardized response with the notifications and the next cursor.
+    """
+    try:
+        limit = min(max(int(request.query_params.get('limit', NOTIFICATION_PAGE_SIZE)), 1),
+                    NOTIFICATION_PAGE_SIZE_MAX)
+    except ValueError:
+        return StandardizedResponse.error("Invalid limit")
+
+    notifications = request.user.notifications.order_by('-timestamp', '-id')
+    if request.query_params.get('unread_only', '').lower() in ('1', 'true', 'yes'):
+        notifications = notifications.filter(is_read=False)
+    cursor = request.query_params.get('cursor')
+    if cursor:
+        try:
+            timestamp, notification_id = decode_notification_cursor(cursor)
+        except ValueError:
+            return StandardizedResponse.error("Invalid cursor")
+        notifications = notifications.filter(Q(timestamp__lt=timestamp) | Q(timestamp=timestamp,
+                                                                            id__lt=notification_id))
+
+    page = list(notifications[:limit + 1])
+    next_cursor = None
+    if len(page) > limit:
+        page = page[:limit]
+        next_cursor = encode_notification_cursor(page[-1])
+    data = [{"id": notification.id, "message": notification.message, "timestamp": notification.timestamp,
+             "is_read": notification.is_read} for notification in page]
+    return StandardizedResponse.success(data, metadata={"next_cursor": next_cursor})
+
+
 class NotificationView(APIView):
     """
     View to manage notifications.
 
     Methods:
-        get(request): Retrieves all notifications for the authenticated user.
+        get(request): Retrieves a page of notifications for the authenticated user.
         post(request): Sends a notification to the authenticated user.
     """
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        notifications = request.user.notifications.all()
-        data = [{"id": notification.id, "message": notification.message, "timestamp": notification.timestamp}
-                for notification in notifications]
-        return StandardizedResponse.success(data)
+        return notification_feed(request)
 
     def post(self, request):
         message = request.data.get("message")
-        send_mail(
-            'New Notification',
-            escape(message),
-            settings.DEFAULT_FROM_EMAIL,
-            [request.user.email],
-            fail_silently=False,
-        )
+        enqueue_email('New Notification', [request.user.email], body=escape(message),
+                      sender=settings.DEFAULT_FROM_EMAIL)
         return StandardizedResponse.success({"message": "Notification sent successfully"})
 
 
@@ -364,24 +433,16 @@ class NotificationCenterView(APIView):
     View to manage the notification center.
 
     Methods:
-        get(request): Retrieves all notifications for the authenticated user.
+        get(request): Retrieves a page of notifications for the authenticated user.
         post(request): Sends a notification to the authenticated user.
     """
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        notifications = request.user.notifications.all()
-        data = [{"id": notification.id, "message": notification.message, "timestamp": notification.timestamp}
-                for notification in notifications]
-        return StandardizedResponse.success(data)
+        return notification_feed(request)
 
     def post(self, request):
         message = request.data.get("message")
-        send_mail(
-            'New Notification',
-            escape(message),
-            settings.DEFAULT_FROM_EMAIL,
-            [request.user.email],
-            fail_silently=False,
-        )
+        enqueue_email('New Notification', [request.user.email], body=escape(message),
+                      sender=settings.DEFAULT_FROM_EMAIL)
         return StandardizedResponse.success({"message": "Notification sent successfully"})
@@ -1,6 +1,7 @@
 from datetime import datetime
 from app.viwes import db
 from app.models import UserActivityLog
+from app.admin_stats import increment_stats
 from app import preprocess  # Import the preprocess module
 import logging
 
@@ -18,6 +19,7 @@ def log_user_activity(user_id, activity):
     """
     log = UserActivityLog(user_id=user_id, activity=activity, timestamp=datetime.utcnow())
     db.session.add(log)
+    increment_stats(activity_log_count=1)
     db.session.commit()
     logger.info(f"User {user_id} activity: {activity}")
 
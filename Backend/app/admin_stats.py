@@ -0,0 +1,206 @@
+import logging
+from datetime import datetime
+
+import redis
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.models import db, User, BlogPost, UserActivityLog, Notification, AdminStats
+from app.redis_client import get_redis, mark_redis_unavailable
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+STATS_ID = 1
+STAT_FIELDS = ('user_count', 'post_count', 'activity_log_count', 'notification_count')
+# Redis hash of counter changes committed but not yet folded into the admin_stats row
+PENDING_STATS_KEY = 'admin:stats:pending'
+
+# Takes the pending changes and removes them in one step, so each change is folded in once
+CLAIM_PENDING_SCRIPT = """
+local deltas = redis.call('HGETALL', KEYS[1])
+redis.call('DEL', KEYS[1])
+return deltas
+"""
+
+_PENDING_KEY = 'admin_stats_deltas'
+
+
+def _apply_deltas(deltas):
+    """
+    Add to the counters of the admin_stats row with one relative UPDATE.
+
+    :param deltas: The amount to add to each counter, by field name.
+    :return: True if the row exists.
+    """
+    table = AdminStats.__table__
+    values = {field: table.c[field] + delta for field, delta in deltas.items() if delta}
+    if not values:
+        return True
+    return db.session.execute(table.update().where(table.c.id == STATS_ID).values(values)).rowcount > 0
+
+
+def increment_stats(**deltas):
+    """
+    Add to the admin dashboard counters once the current transaction commits.
+
+    Writers do not update the single admin_stats row, which would serialize
+    every transaction that counts something on its row lock. The changes are
+    added to a Redis hash after the commit and folded into the row by the
+    ``flush_admin_stats`` task. While Redis is unavailable the row is
+    updated in the transaction instead.
+
+    :param deltas: The amount to add to each counter, by field name; zero amounts are ignored.
+    """
+    deltas = {field: delta for field, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    if get_redis() is None:
+        if not _apply_deltas(deltas):
+            logger.error("The admin_stats row is missing, run the reconcile_admin_stats task to create it")
+        return
+    pending = db.session.info.setdefault(_PENDING_KEY, {})
+    for field, delta in deltas.items():
+        pending[field] = pending.get(field, 0) + delta
+
+
+@event.listens_for(Session, 'after_commit')
+def _publish_stats_deltas(session):
+    deltas = session.info.pop(_PENDING_KEY, None)
+    if not deltas:
+        return
+    client = get_redis()
+    if client is not None:
+        try:
+            pipeline = client.pipeline(transaction=False)
+            for field, delta in deltas.items():
+                pipeline.hincrby(PENDING_STATS_KEY, field, delta)
+            pipeline.execute()
+            return
+        except redis.RedisError as e:
+            mark_redis_unavailable(e)
+    # The rows are committed, so the next reconciliation counts them
+    logger.warning(f"Lost admin stats changes {deltas}, corrected by the next reconciliation")
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_stats_deltas(session):
+    session.info.pop(_PENDING_KEY, None)
+
+
+def _claim_pending(client):
+    """
+    Take the pending counter changes out of Redis.
+
+    :param client: The Redis client.
+    :return: Dictionary of the changes by field name.
+    """
+    flat = client.eval(CLAIM_PENDING_SCRIPT, 1, PENDING_STATS_KEY)
+    return {field.decode(): int(delta) for field, delta in zip(flat[::2], flat[1::2])}
+
+
+def flush_stats():
+    """
+    Fold the pending counter changes from Redis into the admin_stats row.
+
+    If the row does not exist yet, it is created from the tables instead,
+    which already include every pending change.
+
+    :return: Dictionary of the changes applied.
+    """
+    client = get_redis()
+    if client is None:
+        return {}
+    try:
+        deltas = _claim_pending(client)
+    except redis.RedisError as e:
+        mark_redis_unavailable(e)
+        return {}
+    if not deltas:
+        return {}
+
+    try:
+        if not _apply_deltas(deltas):
+            db.session.rollback()
+            reconcile_stats()
+            return {}
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        try:
+            pipeline = client.pipeline(transaction=False)
+            for field, delta in deltas.items():
+                pipeline.hincrby(PENDING_STATS_KEY, field, delta)
+            pipeline.execute()
+        except redis.RedisError as e:
+            mark_redis_unavailable(e)
+        raise
+    return deltas
+
+
+def _count_rows():
+    """
+    Count the rows behind each dashboard counter.
+
+    :return: Dictionary of counter values by field name.
+    """
+    return {
+        'user_count': db.session.query(db.func.count(User.id)).filter(User.deleted_at.is_(None)).scalar(),
+        'post_count': db.session.query(db.func.count(BlogPost.id)).scalar(),
+        'activity_log_count': db.session.query(db.func.count(UserActivityLog.id)).scalar(),
+        'notification_count': db.session.query(db.func.count(Notification.id)).scalar(),
+    }
+
+
+def reconcile_stats():
+    """
+    Recompute the admin dashboard counters from the tables.
+
+    This corrects drift from writes that bypassed increment_stats and
+    creates the counters row on first use. The pending changes in Redis are
+    dropped first, since the tables already include them.
+
+    :return: The AdminStats row.
+    """
+    client = get_redis()
+    if client is not None:
+        try:
+            client.delete(PENDING_STATS_KEY)
+        except redis.RedisError as e:
+            mark_redis_unavailable(e)
+    counts = _count_rows()
+    stats = AdminStats.query.get(STATS_ID)
+    if stats is None:
+        stats = AdminStats(id=STATS_ID)
+        db.session.add(stats)
+    drift = {field: counts[field] - (getattr(stats, field) or 0) for field in STAT_FIELDS}
+    for field in STAT_FIELDS:
+        setattr(stats, field, counts[field])
+    stats.reconciled_at = datetime.utcnow()
+    db.session.commit()
+    if any(drift.values()):
+        logger.info(f"Reconciled admin stats, drift: {drift}")
+    return stats
+
+
+def get_stats():
+    """
+    Get the admin dashboard counters with a single primary key read.
+
+    Changes not yet folded into the row are added from Redis.
+
+    :return: Dictionary of the counters and the timestamp of the last reconciliation.
+    """
+    stats = AdminStats.query.get(STATS_ID) or reconcile_stats()
+    result = {field: getattr(stats, field) for field in STAT_FIELDS}
+    client = get_redis()
+    if client is not None:
+        try:
+            for field, delta in zip(STAT_FIELDS, client.hmget(PENDING_STATS_KEY, STAT_FIELDS)):
+                result[field] += int(delta or 0)
+        except redis.RedisError as e:
+            mark_redis_unavailable(e)
+    result['reconciled_at'] = stats.reconciled_at.isoformat() if stats.reconciled_at else None
+    return result
@@ -0,0 +1,229 @@
+import logging
+import os
+import threading
+import time
+
+import redis
+from flask_jwt_extended import get_jwt, get_jwt_identity
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.models import db, User
+from app.redis_client import get_redis, mark_redis_unavailable
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+# Seconds a worker trusts its cached authorization version of a user
+AUTHZ_CACHE_TTL = float(os.getenv('AUTHZ_CACHE_TTL', 30))
+# Seconds the authorization version of a user is kept in Redis after it was last loaded or bumped.
+# Matches the default access token lifetime, so a version left stale by a failed publish expires with the tokens.
+AUTHZ_VERSION_TTL = int(os.getenv('AUTHZ_VERSION_TTL', 15 * 60))
+# Claims of users that no longer exist
+NO_CLAIMS = {'is_admin': False, 'is_active': False, 'roles': [], 'authz_version': -1}
+
+_local_cache = {}
+_local_lock = threading.Lock()
+# Users whose bumped versions could not be published; their versions in Redis may be stale
+_unpublished = set()
+
+_PENDING_KEY = 'authz_bumped_versions'
+
+
+def _version_key(user_id):
+    return f"authz:version:{user_id}"
+
+
+def authz_claims(user):
+    """
+    Build the authorization claims embedded in the access token of a user.
+
+    :param user: The User instance.
+    :return: Dictionary with the admin flag, active flag, role names and authorization version.
+    """
+    return {
+        'is_admin': bool(user.is_admin),
+        'is_active': user.is_active is not False and user.deleted_at is None,
+        'roles': sorted(role.name for role in user.roles),
+        'authz_version': user.authz_version or 0,
+    }
+
+
+def bump_authz_version(user):
+    """
+    Invalidate the authorization claims in the tokens of a user.
+
+    Call this before committing a change to the user's admin flag, roles or
+    active state. The new version is published once the transaction commits;
+    tokens issued earlier are then re-checked against the database, at the
+    latest ``AUTHZ_CACHE_TTL`` seconds later on each worker.
+
+    :param user: The User instance.
+    """
+    user.authz_version = (user.authz_version or 0) + 1
+    db.session.info.setdefault(_PENDING_KEY, {})[user.id] = user.authz_version
+
+
+@event.listens_for(Session, 'after_commit')
+def _publish_bumped_versions(session):
+    versions = session.info.pop(_PENDING_KEY, None)
+    if not versions:
+        return
+    client = get_redis()
+    published = False
+    if client is not None:
+        try:
+            pipeline = client.pipeline(transaction=False)
+            for user_id, version in versions.items():
+                pipeline.set(_version_key(user_id), version, ex=AUTHZ_VERSION_TTL)
+            pipeline.execute()
+            published = True
+        except redis.RedisError as e:
+            mark_redis_unavailable(e)
+    with _local_lock:
+        for user_id in versions:
+            _local_cache.pop(user_id, None)
+        if not published:
+            _unpublished.update(versions)
+    if not published:
+        logger.warning(f"Could not publish the authorization versions of users {sorted(versions)}, "
+                       f"retrying once Redis is available")
+
+
+def _retry_unpublished():
+    """
+    Delete the published versions of users whose bumps could not be published.
+
+    Until this succeeds, this worker checks those users against the database.
+    Afterwards every worker does so and publishes the current version again.
+    """
+    client = get_redis()
+    if client is None:
+        return
+    with _local_lock:
+        user_ids = list(_unpublished)
+    try:
+        client.delete(*[_version_key(user_id) for user_id in user_ids])
+    except redis.RedisError as e:
+        mark_redis_unavailable(e)
+        return
+    with _local_lock:
+        _unpublished.difference_update(user_ids)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_bumped_versions(session):
+    session.info.pop(_PENDING_KEY, None)
+
+
+def invalidate_authz_versions(user_ids):
+    """
+    Forget the published authorization versions of users whose versions were bumped in SQL.
+
+    Call this after committing a set-based update that incremented
+    ``authz_version``; the next check of each user reloads their claims.
+
+    :param user_ids: The IDs of the users.
+    """
+    client = get_redis()
+    if client is not None:
+        try:
+            client.delete(*[_version_key(user_id) for user_id in user_ids])
+        except redis.RedisError as e:
+            mark_redis_unavailable(e)
+    with _local_lock:
+        for user_id in user_ids:
+            _local_cache.pop(user_id, None)
+
+
+def _load_claims(user_id):
+    """
+    Load the current authorization claims of a user from the database.
+
+    The version is published to Redis unless a newer bump already did.
+
+    :param user_id: The ID of the user.
+    :return: The claims dictionary.
+    """
+    user = User.query.get(user_id)
+    claims = authz_claims(user) if user else NO_CLAIMS
+    client = get_redis()
+    if client is not None:
+        try:
+            client.set(_version_key(user_id), claims['authz_version'], ex=AUTHZ_VERSION_TTL, nx=True)
+        except redis.RedisError as e:
+            mark_redis_unavailable(e)
+    return claims
+
+
+def _current_version(user_id):
+    """
+    Get the published authorization version of a user.
+
+    :param user_id: The ID of the user.
+    :return: The version, or None if it is not known.
+    """
+    client = get_redis()
+    if client is not None:
+        try:
+            version = client.get(_version_key(user_id))
+            return int(version) if version is not None else None
+        except redis.RedisError as e:
+            mark_redis_unavailable(e)
+    return None
+
+
+def get_claims(user_id, token_claims=None):
+    """
+    Get the authorization claims of a user.
+
+    The claims of the access token are used as long as their version matches
+    the published version of the user, which each worker caches for
+    ``AUTHZ_CACHE_TTL`` seconds, so the hot path needs no database query.
+    Stale or missing claims are loaded from the database.
+
+    :param user_id: The ID of the user.
+    :param token_claims: The claims of the access token, or None to load them from the database.
+    :return: The claims dictionary.
+    """
+    now = time.monotonic()
+    with _local_lock:
+        entry = _local_cache.get(user_id)
+    if entry is None or entry[0] < now:
+        if _unpublished:
+            _retry_unpublished()
+        claims = None
+        version = None if user_id in _unpublished else _current_version(user_id)
+        if version is None:
+            claims = _load_claims(user_id)
+            version = claims['authz_version']
+        entry = (now + AUTHZ_CACHE_TTL, version, claims)
+        with _local_lock:
+            _local_cache[user_id] = entry
+
+    _, version, claims = entry
+    if token_claims and token_claims.get('authz_version') == version:
+        return token_claims
+    if claims is None:
+        claims = _load_claims(user_id)
+        with _local_lock:
+            _local_cache[user_id] = (entry[0], claims['authz_version'], claims)
+    return claims
+
+
+def current_claims(user_id):
+    """
+    Get the authorization claims of a user, using the current access token when it belongs to them.
+
+    :param user_id: The ID of the user.
+    :return: The claims dictionary.
+    """
+    token_claims = None
+    try:
+        if get_jwt_identity() == user_id:
+            token_claims = get_jwt()
+    except RuntimeError:
+        pass  # Not in a request with a verified token
+    return get_claims(user_id, token_claims)
@@ -0,0 +1,136 @@
+import hashlib
+import math
+import mmap
+import os
+import struct
+import tempfile
+
+
+# File layout: magic, version, number of bits, number of hash functions, item count, then the bit array
+BLOOM_MAGIC = b'TTNBLOOM'
+BLOOM_VERSION = 1
+BLOOM_HEADER = struct.Struct('<8sIQIQ')
+
+
+class BloomFilter:
+    """
+    Bloom filter over byte strings.
+
+    Positions are derived from one BLAKE2b digest with double hashing, so a
+    lookup costs a single hash and ``num_hashes`` bit reads. The bit array is
+    either a bytearray or a read-only memory map of a filter file.
+    """
+
+    def __init__(self, num_bits, num_hashes, bits=None, count=0):
+        """
+        :param num_bits: The size of the bit array.
+        :param num_hashes: The number of bit positions per item.
+        :param bits: The bit array, or None for an empty filter.
+        :param count: The number of items added so far.
+        """
+        self.num_bits = num_bits
+        self.num_hashes = num_hashes
+        self.bits = bits if bits is not None else bytearray((num_bits + 7) // 8)
+        self.count = count
+        self._offset = BLOOM_HEADER.size if isinstance(self.bits, mmap.mmap) else 0
+
+    @classmethod
+    def for_capacity(cls, capacity, fp_rate):
+        """
+        Create an empty filter sized for a number of items and false positive rate.
+
+        :param capacity: The expected number of items.
+        :param fp_rate: The acceptable false positive rate, between 0 and 1.
+        :return: The BloomFilter.
+        """
+        if not 0 < fp_rate < 1:
+            raise ValueError("fp_rate must be between 0 and 1")
+        capacity = max(capacity, 1)
+        num_bits = max(8, math.ceil(-capacity * math.log(fp_rate) / math.log(2) ** 2))
+        num_hashes = max(1, round(num_bits / capacity * math.log(2)))
+        return cls(num_bits, num_hashes)
+
+    @classmethod
+    def open(cls, path):
+        """
+        Memory-map a filter file read-only.
+
+        The pages are shared by every process that maps the same file.
+
+        :param path: The path of the filter file.
+        :return: The BloomFilter.
+        :raises ValueError: If the file is not a filter file.
+        """
+        with open(path, 'rb') as filter_file:
+            bits = mmap.mmap(filter_file.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(bits) < BLOOM_HEADER.size:
+            raise ValueError(f"{path} is not a Bloom filter file")
+        magic, version, num_bits, num_hashes, count = BLOOM_HEADER.unpack_from(bits)
+        if magic != BLOOM_MAGIC or version != BLOOM_VERSION or len(bits) < BLOOM_HEADER.size + (num_bits + 7) // 8:
+            raise ValueError(f"{path} is not a Bloom filter file")
+        return cls(num_bits, num_hashes, bits, count)
+
+    def save(self, path):
+        """
+        Write the filter to a file.
+
+        The file is replaced atomically, so processes that mapped the previous
+        version keep reading it until they reopen the path.
+
+        :param path: The path of the filter file.
+        """
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as filter_file:
+                filter_file.write(BLOOM_HEADER.pack(BLOOM_MAGIC, BLOOM_VERSION, self.num_bits, self.num_hashes,
+                                                    self.count))
+                filter_file.write(self.bits[self._offset:])
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+    def _positions(self, item):
+        """
+        Get the bit positions of an item.
+
+        :param item: The item, as bytes or str.
+        :return: Generator of bit positions.
+        """
+        if isinstance(item, str):
+            item = item.encode('utf-8', 'surrogateescape')
+        digest = hashlib.blake2b(item, digest_size=16).digest()
+        first, second = struct.unpack('<QQ', digest)
+        second |= 1
+        for i in range(self.num_hashes):
+            yield (first + i * second) % self.num_bits
+
+    def add(self, item):
+        """
+        Add an item to the filter.
+
+        :param item: The item, as bytes or str.
+        """
+        if self._offset:
+            raise TypeError("Memory-mapped Bloom filters are read-only")
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item):
+        """
+        Check whether an item may have been added.
+
+        :param item: The item, as bytes or str.
+        :return: False if the item was never added, True if it probably was.
+        """
+        bits, offset = self.bits, self._offset
+        return all(bits[offset + (position >> 3)] & (1 << (position & 7)) for position in self._positions(item))
+
+    def close(self):
+        """
+        Release the memory map of a filter opened from a file.
+        """
+        if self._offset:
+            self.bits.close()
@@ -0,0 +1,6 @@
+from flask_caching import Cache
+from app import app
+
+
+cache = Cache(config={'CACHE_TYPE': 'redis', 'CACHE_REDIS_URL': 'redis://localhost:6379/1'})
+cache.init_app(app)
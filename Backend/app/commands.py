@@ -0,0 +1,95 @@
+import os
+
+import click
+
+from app import app
+from app.email_encryption import EMAIL_BATCH_SIZE, backfill_email_index
+from app.hashing import ARGON2_PROFILE_PATH, calibrate, save_profile
+from app.password_screening import PASSWORD_BLOOM_PATH, build_password_filter
+from app.provisioning import PROVISION_BATCH_SIZE, PROVISION_FORMATS, detect_format, read_user_records, \
+    provision_users
+from app.share_counters import recount_share_counts
+
+
+@app.cli.command('repair-share-counts')
+@click.option('--batch-size', default=1000, show_default=True, help='Number of post IDs recounted per UPDATE.')
+def repair_share_counts(batch_size):
+    """
+    Recount the share counters on BlogPost from the SocialMediaShare rows.
+
+    :param batch_size: The number of post IDs recounted per UPDATE.
+    """
+    recounted = recount_share_counts(batch_size=batch_size)
+    click.echo(f"Recounted share counters for {recounted} posts")
+
+
+@app.cli.command('calibrate-argon2')
+@click.option('--target-ms', default=250, show_default=True, help='Latency budget for one password hash.')
+@click.option('--max-memory-mib', default=256, show_default=True, help='Largest memory cost to try.')
+@click.option('--parallelism', default=os.cpu_count() or 1, show_default=True, help='Argon2 lanes.')
+@click.option('--output', default=ARGON2_PROFILE_PATH, show_default=True, help='Where to write the profile.')
+def calibrate_argon2(target_ms, max_memory_mib, parallelism, output):
+    """
+    Benchmark argon2 on this host and write a parameter profile.
+
+    Existing hashes are upgraded to the new profile on each user's next
+    successful login.
+
+    :param target_ms: The latency budget for one hash, in milliseconds.
+    :param max_memory_mib: The largest memory cost to try, in MiB.
+    :param parallelism: The number of argon2 lanes.
+    :param output: The path of the profile to write.
+    """
+    params, elapsed = calibrate(target_ms, max_memory_mib * 1024, parallelism)
+    save_profile(params, output, target_ms=target_ms, measured_ms=round(elapsed, 1))
+    click.echo(f"Wrote argon2 profile {params} ({elapsed:.1f} ms per hash) to {output}")
+
+
+@app.cli.command('build-password-bloom')
+@click.argument('corpus', type=click.Path(exists=True, dir_okay=False))
+@click.option('--output', default=PASSWORD_BLOOM_PATH, show_default=True, help='Where to write the filter.')
+@click.option('--fp-rate', default=0.001, show_default=True, help='Acceptable false positive rate.')
+def build_password_bloom(corpus, output, fp_rate):
+    """
+    Compile a breached password corpus (one password per line) into a Bloom filter.
+
+    Web workers map the filter when they start, so restart them after a rebuild.
+
+    :param corpus: The path of the corpus file.
+    :param output: The path of the filter file to write.
+    :param fp_rate: The acceptable false positive rate.
+    """
+    count = build_password_filter(corpus, output, fp_rate)
+    click.echo(f"Wrote a filter of {count} passwords to {output}")
+
+
+@app.cli.command('backfill-email-index')
+@click.option('--batch-size', default=EMAIL_BATCH_SIZE, show_default=True, help='Number of users updated per transaction.')
+def backfill_email_index_command(batch_size):
+    """
+    Compute the email blind index of existing users, encrypting plaintext emails.
+
+    :param batch_size: The number of users updated per transaction.
+    """
+    updated = backfill_email_index(batch_size=batch_size)
+    click.echo(f"Backfilled the email index of {updated} users")
+
+
+@app.cli.command('provision-users')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'file_format', type=click.Choice(PROVISION_FORMATS), default=None,
+              help='File format, guessed from the extension by default.')
+@click.option('--batch-size', default=PROVISION_BATCH_SIZE, show_default=True, help='Users inserted per transaction.')
+def provision_users_command(path, file_format, batch_size):
+    """
+    Create users from a CSV (username,email,password) or NDJSON file.
+
+    :param path: The path of the file.
+    :param file_format: 'csv' or 'ndjson'.
+    :param batch_size: The number of users inserted per transaction.
+    """
+    with open(path, 'rb') as users_file:
+        report = provision_users(read_user_records(users_file, file_format or detect_format(path)), batch_size)
+    for error in report['errors']:
+        click.echo(f"line {error['line']} ({error['username']}): {error['error']}", err=True)
+    click.echo(f"Created {report['created']} users, rejected {len(report['errors'])} rows")
@@ -0,0 +1,103 @@
+import logging
+
+from cryptography.fernet import InvalidToken
+
+from app.models import db, User, TaskCheckpoint, cipher_suite
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+# Number of users updated per transaction
+EMAIL_BATCH_SIZE = 500
+ROTATION_CHECKPOINT = 'rotate-email-encryption'
+
+
+def backfill_email_index(batch_size=EMAIL_BATCH_SIZE):
+    """
+    Fill in the email blind index of users created before it existed.
+
+    Users are walked in primary key order, one batch and commit at a time.
+    Emails that are still stored in plaintext are encrypted on the way.
+
+    :param batch_size: The number of users updated per transaction.
+    :return: The number of users updated.
+    """
+    updated = 0
+    last_id = 0
+    while True:
+        users = User.query.filter(User.id > last_id, User.email_index.is_(None)) \
+            .order_by(User.id).limit(batch_size).all()
+        if not users:
+            break
+        for user in users:
+            try:
+                email = user.get_email()
+            except InvalidToken:
+                email = user.email
+            user.set_email(email)
+        last_id = users[-1].id
+        db.session.commit()
+        updated += len(users)
+        logger.info(f"Backfilled email index up to user {last_id}")
+
+    return updated
+
+
+def rotate_email_encryption(batch_size=EMAIL_BATCH_SIZE, max_batches=None):
+    """
+    Re-encrypt user emails with the primary key of the key ring.
+
+    Users are processed in primary key ranges of ``batch_size``, each in its
+    own short transaction that also records the last finished range in a
+    TaskCheckpoint, so an interrupted rotation resumes where it stopped.
+    Only the ID and email columns are read, and a row is only rewritten if
+    its email did not change in the meantime.
+
+    :param batch_size: The number of user IDs covered by each transaction.
+    :param max_batches: Stop after this many batches, or None to run to the end.
+    :return: Tuple of the number of emails re-encrypted and whether the rotation finished.
+    """
+    checkpoint = TaskCheckpoint.query.get(ROTATION_CHECKPOINT)
+    if checkpoint is None:
+        checkpoint = TaskCheckpoint(name=ROTATION_CHECKPOINT, position='0')
+        db.session.add(checkpoint)
+    last_id = int(checkpoint.position or 0)
+    max_id = db.session.query(db.func.max(User.id)).scalar() or 0
+
+    user_table = User.__table__
+    rewrite = user_table.update() \
+        .where(user_table.c.id == db.bindparam('user_id')) \
+        .where(user_table.c.email == db.bindparam('old_email')) \
+        .values(email=db.bindparam('new_email'))
+
+    rotated = 0
+    batches = 0
+    while last_id < max_id:
+        if max_batches is not None and batches >= max_batches:
+            db.session.commit()
+            return rotated, False
+
+        end_id = last_id + batch_size
+        rows = db.session.query(User.id, User.email).filter(User.id > last_id, User.id <= end_id).all()
+        updates = []
+        for user_id, email in rows:
+            try:
+                updates.append({'user_id': user_id, 'old_email': email,
+                                'new_email': cipher_suite.rotate(email.encode()).decode()})
+            except InvalidToken:
+                logger.warning(f"Skipping user {user_id}: email is not encrypted with a known key")
+        if updates:
+            db.session.execute(rewrite, updates)
+        checkpoint.position = str(end_id)
+        db.session.commit()
+
+        rotated += len(updates)
+        batches += 1
+        last_id = end_id
+
+    db.session.delete(checkpoint)
+    db.session.commit()
+    logger.info(f"Re-encrypted {rotated} user emails with the primary key")
+    return rotated, True
@@ -6,6 +6,7 @@ from marshmallow import ValidationError
 from sqlalchemy.exc import SQLAlchemyError
 from werkzeug.exceptions import HTTPException  # type: ignore
 from flask_jwt_extended.exceptions import NoAuthorizationError
+from app.hashing import HashingPoolSaturated
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -133,6 +134,18 @@ def init_error_handler(app):
         logger.error(f"Authentication Error: {str(e)}")  # Log the error
         return jsonify(error="An authentication error occurred"), 401
 
+    @app.errorhandler(HashingPoolSaturated)
+    def handle_hashing_pool_saturated(e):
+        """
+        Handle a saturated password hashing pool.
+
+        :param e: The HashingPoolSaturated exception.
+        :return: JSON response with error message and status code 503.
+        """
+        app.logger.error("Password hashing pool saturated")
+        logger.error("Password hashing pool saturated")  # Log the error
+        return jsonify(error="The server is busy, please try again shortly"), 503, {'Retry-After': '1'}
+
     @app.errorhandler(Exception)
     def handle_unexpected_error(e):
         """
@@ -0,0 +1,353 @@
+import json
+import logging
+import os
+import statistics
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, TimeoutError, wait
+
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHashError, VerificationError
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+# Password hashing pool settings. A pool size of 0 hashes inline on the calling thread.
+# Every web worker has its own pool, so by default the CPUs are split between the
+# WEB_CONCURRENCY workers instead of each worker starting one process per CPU.
+WEB_CONCURRENCY = int(os.getenv('WEB_CONCURRENCY', 1))
+HASHING_POOL_SIZE = int(os.getenv('HASHING_POOL_SIZE', max((os.cpu_count() or 1) // max(WEB_CONCURRENCY, 1), 1)))
+HASHING_MAX_PENDING = int(os.getenv('HASHING_MAX_PENDING', max(HASHING_POOL_SIZE, 1) * 2))
+HASHING_TIMEOUT = float(os.getenv('HASHING_TIMEOUT', 10))
+# Argon2 parameter profile written by `flask calibrate-argon2`
+ARGON2_PROFILE_PATH = os.getenv(
+    'ARGON2_PROFILE_PATH', os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'argon2_profile.json')
+)
+ARGON2_PROFILE_FIELDS = ('time_cost', 'memory_cost', 'parallelism', 'hash_len', 'salt_len')
+
+
+class HashingPoolSaturated(Exception):
+    """
+    Raised when the password hashing pool already has the maximum number of pending jobs,
+    or does not finish a job within ``HASHING_TIMEOUT``.
+    """
+
+
+def load_profile(path=ARGON2_PROFILE_PATH):
+    """
+    Load the argon2 parameter profile.
+
+    :param path: The path of the profile JSON file.
+    :return: Dictionary of PasswordHasher parameters, empty to use the library defaults.
+    """
+    try:
+        with open(path) as profile_file:
+            profile = json.load(profile_file)
+    except FileNotFoundError:
+        return {}
+    return {field: int(profile[field]) for field in ARGON2_PROFILE_FIELDS if field in profile}
+
+
+def save_profile(params, path=ARGON2_PROFILE_PATH, **metadata):
+    """
+    Write an argon2 parameter profile.
+
+    :param params: Dictionary of PasswordHasher parameters.
+    :param path: The path of the profile JSON file.
+    :param metadata: Extra informational fields to store alongside the parameters.
+    """
+    with open(path, 'w') as profile_file:
+        json.dump(dict(metadata, **params), profile_file, indent=2, sort_keys=True)
+        profile_file.write('\n')
+
+
+ph = PasswordHasher(**load_profile())
+
+_executor = None
+_executor_pid = None
+_slots = None
+_executor_lock = threading.Lock()
+
+
+def _init_worker(params):
+    """
+    Configure the password hasher of a pool worker process.
+
+    :param params: Dictionary of PasswordHasher parameters.
+    """
+    global ph
+    ph = PasswordHasher(**params)
+
+
+def _hash(secret):
+    """
+    Hash a secret with argon2. Runs inside a pool worker process.
+
+    :param secret: The secret to hash.
+    :return: The encoded argon2 hash.
+    """
+    return ph.hash(secret)
+
+
+def _verify(password_hash, secret):
+    """
+    Verify a secret against an argon2 hash. Runs inside a pool worker process.
+
+    :param password_hash: The encoded argon2 hash.
+    :param secret: The secret to verify.
+    :return: True if the secret matches, False otherwise.
+    """
+    try:
+        return ph.verify(password_hash, secret)
+    except (VerificationError, InvalidHashError):
+        return False
+
+
+def _get_executor():
+    """
+    Get the hashing process pool, creating it on first use in each process.
+
+    The pool is created lazily so that every forked web worker gets its own
+    pool instead of sharing one inherited from the master process.
+
+    :return: Tuple of the executor and the semaphore bounding pending jobs.
+    """
+    global _executor, _executor_pid, _slots
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ProcessPoolExecutor(max_workers=HASHING_POOL_SIZE, initializer=_init_worker,
+                                            initargs=(_hasher_params(),))
+            _executor_pid = os.getpid()
+            _slots = threading.BoundedSemaphore(HASHING_MAX_PENDING)
+    return _executor, _slots
+
+
+def _submit(executor, slots, function, *args):
+    """
+    Submit a hashing function to the pool if a pending slot is free.
+
+    :param executor: The hashing process pool.
+    :param slots: The semaphore bounding pending jobs.
+    :param function: The function to run.
+    :param args: The arguments of the function.
+    :return: The future of the job, or None if every slot is taken.
+    """
+    if not slots.acquire(blocking=False):
+        return None
+    try:
+        future = executor.submit(function, *args)
+    except BaseException:
+        slots.release()
+        raise
+    future.add_done_callback(lambda _: slots.release())
+    return future
+
+
+def _run(function, *args):
+    """
+    Run a hashing function in the pool and wait for its result.
+
+    :param function: The function to run.
+    :param args: The arguments of the function.
+    :return: The result of the function.
+    :raises HashingPoolSaturated: If ``HASHING_MAX_PENDING`` jobs are already pending,
+        or the job does not finish within ``HASHING_TIMEOUT``.
+    """
+    if HASHING_POOL_SIZE <= 0:
+        return function(*args)
+
+    future = _submit(*_get_executor(), function, *args)
+    if future is None:
+        logger.warning("Password hashing pool saturated, rejecting request")
+        raise HashingPoolSaturated()
+    try:
+        return future.result(timeout=HASHING_TIMEOUT)
+    except TimeoutError:
+        future.cancel()
+        logger.warning(f"Password hashing took longer than {HASHING_TIMEOUT} s, rejecting request")
+        raise HashingPoolSaturated()
+
+
+def hash_password(secret):
+    """
+    Hash a secret with argon2 in the hashing pool.
+
+    :param secret: The secret to hash.
+    :return: The encoded argon2 hash.
+    :raises HashingPoolSaturated: If the pool has too many pending jobs.
+    """
+    return _run(_hash, secret)
+
+
+def hash_many(secrets):
+    """
+    Hash many secrets across the hashing pool, for batch jobs.
+
+    Unlike ``hash_password`` this does not reject work when the pool is
+    busy: each secret takes a pending slot like any other job, and when none
+    is free it waits for one of its own jobs to finish. A batch therefore
+    never queues more than ``HASHING_MAX_PENDING`` jobs ahead of logins.
+
+    :param secrets: List of secrets to hash.
+    :return: List of encoded argon2 hashes, in the order of the secrets.
+    :raises HashingPoolSaturated: If no job finishes within ``HASHING_TIMEOUT``.
+    """
+    if HASHING_POOL_SIZE <= 0:
+        return [_hash(secret) for secret in secrets]
+
+    executor, slots = _get_executor()
+    futures = []
+    pending = set()
+    try:
+        for secret in secrets:
+            while True:
+                future = _submit(executor, slots, _hash, secret)
+                if future is not None:
+                    break
+                if pending:
+                    done, pending = wait(pending, timeout=HASHING_TIMEOUT, return_when=FIRST_COMPLETED)
+                    if not done:
+                        logger.warning(f"Password hashing took longer than {HASHING_TIMEOUT} s, aborting batch")
+                        raise HashingPoolSaturated()
+                else:
+                    # Every slot is held by other requests
+                    time.sleep(0.01)
+            futures.append(future)
+            pending.add(future)
+        return [future.result(timeout=HASHING_TIMEOUT) for future in futures]
+    except BaseException:
+        for future in pending:
+            future.cancel()
+        raise
+
+
+def verify_password(password_hash, secret):
+    """
+    Verify a secret against an argon2 hash in the hashing pool.
+
+    :param password_hash: The encoded argon2 hash.
+    :param secret: The secret to verify.
+    :return: True if the secret matches, False otherwise.
+    :raises HashingPoolSaturated: If the pool has too many pending jobs.
+    """
+    return _run(_verify, password_hash, secret)
+
+
+def verify_any(password_hashes, secret):
+    """
+    Check whether a secret matches any of several argon2 hashes.
+
+    The hashes are verified in parallel in the hashing pool, using as many
+    pending slots as are free. As soon as one matches, the remaining jobs are
+    cancelled, so the latency is bounded by the number of hashes divided by
+    the free slots, times the cost of one verification.
+
+    :param password_hashes: The encoded argon2 hashes.
+    :param secret: The secret to verify.
+    :return: True if the secret matches one of the hashes, False otherwise.
+    :raises HashingPoolSaturated: If no slot is free to start verifying, or the
+        hashes are not verified within ``HASHING_TIMEOUT``.
+    """
+    password_hashes = list(password_hashes)
+    if HASHING_POOL_SIZE <= 0:
+        return any(_verify(password_hash, secret) for password_hash in password_hashes)
+
+    executor, slots = _get_executor()
+    deadline = time.monotonic() + HASHING_TIMEOUT
+    pending = set()
+    try:
+        while True:
+            while password_hashes:
+                future = _submit(executor, slots, _verify, password_hashes[-1], secret)
+                if future is None:
+                    break
+                pending.add(future)
+                password_hashes.pop()
+
+            if not pending:
+                if not password_hashes:
+                    return False
+                logger.warning("Password hashing pool saturated, rejecting request")
+                raise HashingPoolSaturated()
+
+            done, pending = wait(pending, timeout=max(deadline - time.monotonic(), 0), return_when=FIRST_COMPLETED)
+            if not done:
+                logger.warning(f"Password hashing took longer than {HASHING_TIMEOUT} s, rejecting request")
+                raise HashingPoolSaturated()
+            if any(future.result() for future in done):
+                return True
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def _hasher_params():
+    """
+    Get the parameters of the configured password hasher.
+
+    :return: Dictionary of PasswordHasher parameters.
+    """
+    return {'time_cost': ph.time_cost, 'memory_cost': ph.memory_cost, 'parallelism': ph.parallelism,
+            'hash_len': ph.hash_len, 'salt_len': ph.salt_len}
+
+
+def needs_rehash(password_hash):
+    """
+    Check whether a hash was created with parameters other than the current profile.
+
+    This only parses the hash, so it runs inline.
+
+    :param password_hash: The encoded argon2 hash.
+    :return: True if the hash should be recomputed with the current parameters.
+    """
+    try:
+        return ph.check_needs_rehash(password_hash)
+    except InvalidHashError:
+        return True
+
+
+def calibrate(target_ms, max_memory_kib, parallelism, samples=3):
+    """
+    Find the most expensive argon2 parameters that hash within a latency budget.
+
+    Memory cost is preferred over time cost: starting at 19 MiB, the memory
+    is doubled up to ``max_memory_kib`` and, for each memory cost, the time
+    cost is raised while the median hashing time stays within the budget.
+
+    :param target_ms: The latency budget for one hash, in milliseconds.
+    :param max_memory_kib: The largest memory cost to try, in KiB.
+    :param parallelism: The number of lanes to use.
+    :param samples: The number of hashes timed per candidate.
+    :return: Tuple of the chosen PasswordHasher parameters and their median hashing time in milliseconds.
+    """
+    def measure(time_cost, memory_cost):
+        hasher = PasswordHasher(time_cost=time_cost, memory_cost=memory_cost, parallelism=parallelism)
+        timings = []
+        for _ in range(samples):
+            start = time.perf_counter()
+            hasher.hash('calibration-password')
+            timings.append((time.perf_counter() - start) * 1000)
+        return statistics.median(timings)
+
+    best = None
+    memory_cost = 19 * 1024
+    while memory_cost <= max_memory_kib:
+        time_cost = 1
+        elapsed = measure(time_cost, memory_cost)
+        if elapsed > target_ms:
+            break
+        while True:
+            candidate = measure(time_cost + 1, memory_cost)
+            if candidate > target_ms:
+                break
+            time_cost, elapsed = time_cost + 1, candidate
+        best = ({'time_cost': time_cost, 'memory_cost': memory_cost, 'parallelism': parallelism,
+                 'hash_len': ph.hash_len, 'salt_len': ph.salt_len}, elapsed)
+        logger.info(f"Argon2 m={memory_cost} KiB t={time_cost} p={parallelism}: {elapsed:.1f} ms")
+        memory_cost *= 2
+
+    if best is None:
+        raise ValueError(f"Even the minimum argon2 parameters take longer than {target_ms} ms on this host")
+    return best
@@ -0,0 +1,210 @@
+import logging
+import math
+import os
+import threading
+import time
+import uuid
+from collections import deque
+
+import redis
+
+from app.redis_client import get_redis, mark_redis_unavailable
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+# Account lockout settings: failed attempts allowed within the sliding window
+LOGIN_WINDOW = int(os.getenv('LOGIN_WINDOW', 15 * 60))
+MAX_FAILED_ATTEMPTS = int(os.getenv('MAX_FAILED_ATTEMPTS', 5))
+MAX_FAILED_ATTEMPTS_PER_IP = int(os.getenv('MAX_FAILED_ATTEMPTS_PER_IP', 50))
+
+# Failures are kept in a sorted set scored by time in milliseconds. Only the
+# newest ARGV[3] entries are kept, which is all a lockout decision needs, so
+# an attack cannot grow the set.
+RECORD_FAILURE_SCRIPT = """
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', tonumber(ARGV[1]) - tonumber(ARGV[2]))
+redis.call('ZADD', KEYS[1], ARGV[1], ARGV[4])
+redis.call('ZREMRANGEBYRANK', KEYS[1], 0, -tonumber(ARGV[3]) - 1)
+redis.call('PEXPIRE', KEYS[1], ARGV[2])
+return redis.call('ZCARD', KEYS[1])
+"""
+
+# Returns the milliseconds until the oldest counted failure leaves the window, or 0 if not locked
+LOCKOUT_SCRIPT = """
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', tonumber(ARGV[1]) - tonumber(ARGV[2]))
+local count = redis.call('ZCARD', KEYS[1])
+if count < tonumber(ARGV[3]) then
+    return 0
+end
+local oldest = redis.call('ZRANGE', KEYS[1], count - tonumber(ARGV[3]), count - tonumber(ARGV[3]), 'WITHSCORES')
+return tonumber(oldest[2]) + tonumber(ARGV[2]) - tonumber(ARGV[1])
+"""
+
+
+class MemoryAttemptStore:
+    """
+    In-process sliding window store, used in tests and while Redis is unavailable.
+    """
+
+    def __init__(self):
+        self._attempts = {}
+        self._lock = threading.Lock()
+
+    def _trim(self, key, now_ms, window_ms):
+        attempts = self._attempts.get(key)
+        while attempts and attempts[0] <= now_ms - window_ms:
+            attempts.popleft()
+        if attempts is not None and not attempts:
+            del self._attempts[key]
+            return None
+        return attempts
+
+    def record_failure(self, key, now_ms, window_ms, limit):
+        """
+        Record a failed attempt.
+
+        :param key: The key of the counter.
+        :param now_ms: The current time in milliseconds.
+        :param window_ms: The length of the window in milliseconds.
+        :param limit: The number of failures that locks the key.
+        :return: The number of failures in the window.
+        """
+        with self._lock:
+            attempts = self._trim(key, now_ms, window_ms)
+            if attempts is None:
+                attempts = self._attempts[key] = deque(maxlen=limit)
+            attempts.append(now_ms)
+            return len(attempts)
+
+    def lockout_remaining(self, key, now_ms, window_ms, limit):
+        """
+        Get the time until a key is no longer locked.
+
+        :param key: The key of the counter.
+        :param now_ms: The current time in milliseconds.
+        :param window_ms: The length of the window in milliseconds.
+        :param limit: The number of failures that locks the key.
+        :return: The remaining lockout in milliseconds, or 0 if the key is not locked.
+        """
+        with self._lock:
+            attempts = self._trim(key, now_ms, window_ms)
+            if attempts is None or len(attempts) < limit:
+                return 0
+            return attempts[len(attempts) - limit] + window_ms - now_ms
+
+    def clear(self, key):
+        """
+        Forget the failures of a key.
+
+        :param key: The key of the counter.
+        """
+        with self._lock:
+            self._attempts.pop(key, None)
+
+
+class RedisAttemptStore:
+    """
+    Sliding window store shared by all workers through Redis.
+
+    Each update runs as one Lua script, so concurrent attempts cannot race.
+    Falls back to a MemoryAttemptStore while Redis is unavailable.
+    """
+
+    def __init__(self):
+        self._fallback = MemoryAttemptStore()
+
+    def _call(self, script, key, *args):
+        client = get_redis()
+        if client is not None:
+            try:
+                return int(client.eval(script, 1, key, *args))
+            except redis.RedisError as e:
+                mark_redis_unavailable(e)
+        return None
+
+    def record_failure(self, key, now_ms, window_ms, limit):
+        count = self._call(RECORD_FAILURE_SCRIPT, key, now_ms, window_ms, limit, uuid.uuid4().hex)
+        if count is None:
+            return self._fallback.record_failure(key, now_ms, window_ms, limit)
+        return count
+
+    def lockout_remaining(self, key, now_ms, window_ms, limit):
+        remaining = self._call(LOCKOUT_SCRIPT, key, now_ms, window_ms, limit)
+        if remaining is None:
+            return self._fallback.lockout_remaining(key, now_ms, window_ms, limit)
+        return remaining
+
+    def clear(self, key):
+        self._fallback.clear(key)
+        client = get_redis()
+        if client is not None:
+            try:
+                client.delete(key)
+            except redis.RedisError as e:
+                mark_redis_unavailable(e)
+
+
+class LoginThrottle:
+    """
+    Locks out usernames and client IPs after too many failed logins in a sliding window.
+    """
+
+    def __init__(self, store, window=LOGIN_WINDOW, max_attempts=MAX_FAILED_ATTEMPTS,
+                 max_attempts_per_ip=MAX_FAILED_ATTEMPTS_PER_IP, clock=time.time):
+        """
+        :param store: The attempt store, a RedisAttemptStore or MemoryAttemptStore.
+        :param window: The length of the sliding window in seconds.
+        :param max_attempts: The failures per username that lock it out.
+        :param max_attempts_per_ip: The failures per client IP that lock it out.
+        :param clock: Function returning the current UNIX time.
+        """
+        self.store = store
+        self.window_ms = window * 1000
+        self.max_attempts = max_attempts
+        self.max_attempts_per_ip = max_attempts_per_ip
+        self.clock = clock
+
+    def _limits(self, username, ip):
+        return ((f"login:fail:user:{username}", self.max_attempts),
+                (f"login:fail:ip:{ip}", self.max_attempts_per_ip))
+
+    def _now_ms(self):
+        return int(self.clock() * 1000)
+
+    def lockout_remaining(self, username, ip):
+        """
+        Check whether a login attempt is locked out.
+
+        :param username: The username of the attempt.
+        :param ip: The client IP of the attempt.
+        :return: Seconds until the attempt is allowed, or 0 if it is allowed now.
+        """
+        now_ms = self._now_ms()
+        remaining = max(self.store.lockout_remaining(key, now_ms, self.window_ms, limit)
+                        for key, limit in self._limits(username, ip))
+        return math.ceil(remaining / 1000)
+
+    def record_failure(self, username, ip):
+        """
+        Record a failed login attempt for the username and the client IP.
+
+        :param username: The username of the attempt.
+        :param ip: The client IP of the attempt.
+        """
+        now_ms = self._now_ms()
+        for key, limit in self._limits(username, ip):
+            if self.store.record_failure(key, now_ms, self.window_ms, limit) >= limit:
+                logger.warning(f"Locking out {key} after {limit} failed login attempts")
+
+    def record_success(self, username):
+        """
+        Reset the failed attempts of a username after a successful login.
+
+        :param username: The username that logged in.
+        """
+        self.store.clear(f"login:fail:user:{username}")
+
+
+login_throttle = LoginThrottle(RedisAttemptStore())
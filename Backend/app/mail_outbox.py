@@ -0,0 +1,294 @@
+import json
+import logging
+import os
+import queue
+import smtplib
+import threading
+import time
+from contextlib import contextmanager
+from email.message import EmailMessage
+
+import redis
+
+from api.celery_app import app as celery_app
+from app.redis_client import get_redis, mark_redis_unavailable
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+# SMTP settings, named like the Flask-Mail configuration
+MAIL_SERVER = os.getenv('MAIL_SERVER', 'localhost')
+MAIL_PORT = int(os.getenv('MAIL_PORT', 25))
+MAIL_USERNAME = os.getenv('MAIL_USERNAME')
+MAIL_PASSWORD = os.getenv('MAIL_PASSWORD')
+MAIL_USE_TLS = os.getenv('MAIL_USE_TLS', 'False') == 'True'
+MAIL_USE_SSL = os.getenv('MAIL_USE_SSL', 'False') == 'True'
+MAIL_DEFAULT_SENDER = os.getenv('MAIL_DEFAULT_SENDER', 'noreply@thetechnous.com')
+MAIL_TIMEOUT = float(os.getenv('MAIL_TIMEOUT', 10))
+# Idle connections kept open per worker process
+MAIL_POOL_SIZE = int(os.getenv('MAIL_POOL_SIZE', 2))
+# Seconds a connection may sit idle before it is checked with NOOP on reuse
+MAIL_MAX_IDLE = 30
+MAIL_MAX_RETRIES = 8
+MAIL_RETRY_BACKOFF = 5
+MAIL_RETRY_BACKOFF_MAX = 600
+# Outbox of emails waiting to be sent in batches
+MAIL_OUTBOX_KEY = 'mail:outbox'
+MAIL_BATCH_SIZE = int(os.getenv('MAIL_BATCH_SIZE', 50))
+# Seconds the first email of an empty outbox waits for others to join its batch
+MAIL_BATCH_DELAY = float(os.getenv('MAIL_BATCH_DELAY', 1))
+
+
+class SMTPConnectionPool:
+    """
+    Pool of persistent SMTP connections.
+
+    A connection is returned to the pool after a successful send and
+    discarded after any error, so a broken connection is never reused.
+    """
+
+    def __init__(self, host=None, port=None, username=None, password=None, use_tls=None, use_ssl=None,
+                 size=MAIL_POOL_SIZE, timeout=MAIL_TIMEOUT):
+        self.host = host or MAIL_SERVER
+        self.port = port or MAIL_PORT
+        self.username = username if username is not None else MAIL_USERNAME
+        self.password = password if password is not None else MAIL_PASSWORD
+        self.use_tls = use_tls if use_tls is not None else MAIL_USE_TLS
+        self.use_ssl = use_ssl if use_ssl is not None else MAIL_USE_SSL
+        self.size = size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+
+    def _connect(self):
+        smtp_class = smtplib.SMTP_SSL if self.use_ssl else smtplib.SMTP
+        connection = smtp_class(self.host, self.port, timeout=self.timeout)
+        if self.use_tls:
+            connection.starttls()
+        if self.username:
+            connection.login(self.username, self.password)
+        return connection
+
+    def _discard(self, connection):
+        try:
+            connection.quit()
+        except (smtplib.SMTPException, OSError):
+            connection.close()
+
+    def _acquire(self):
+        while True:
+            try:
+                connection, last_used = self._idle.get_nowait()
+            except queue.Empty:
+                return self._connect()
+            if time.monotonic() - last_used < MAIL_MAX_IDLE:
+                return connection
+            # Servers drop idle clients, so check the connection before reusing it
+            try:
+                if connection.noop()[0] == 250:
+                    return connection
+            except (smtplib.SMTPException, OSError):
+                pass
+            connection.close()
+
+    def _release(self, connection):
+        if self._idle.qsize() < self.size:
+            self._idle.put((connection, time.monotonic()))
+        else:
+            self._discard(connection)
+
+    @contextmanager
+    def connection(self):
+        """
+        Borrow a connection from the pool.
+
+        :return: Context manager yielding an smtplib.SMTP connection.
+        """
+        connection = self._acquire()
+        try:
+            yield connection
+        except BaseException:
+            self._discard(connection)
+            raise
+        self._release(connection)
+
+    def close(self):
+        """
+        Close every idle connection.
+        """
+        while True:
+            try:
+                connection, _ = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._discard(connection)
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """
+    Get the SMTP connection pool of this process.
+
+    :return: The SMTPConnectionPool.
+    """
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = SMTPConnectionPool()
+            _pool_pid = os.getpid()
+    return _pool
+
+
+def build_message(message):
+    """
+    Build an email from its queued form.
+
+    :param message: Dictionary with subject, sender, recipients, body and html.
+    :return: The EmailMessage.
+    """
+    email = EmailMessage()
+    email['Subject'] = message['subject']
+    email['From'] = message.get('sender') or MAIL_DEFAULT_SENDER
+    email['To'] = ', '.join(message['recipients'])
+    email.set_content(message.get('body') or '')
+    if message.get('html'):
+        email.add_alternative(message['html'], subtype='html')
+    return email
+
+
+def _is_permanent(error):
+    """
+    Check whether a send error will not go away by retrying.
+
+    :param error: The smtplib exception.
+    :return: True for 5xx replies and refused recipients.
+    """
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return True
+    return isinstance(error, smtplib.SMTPResponseException) and error.smtp_code >= 500
+
+
+def send_messages(messages, pool=None):
+    """
+    Send a batch of queued emails over one pooled connection.
+
+    Messages rejected with a permanent error are logged and dropped.
+
+    :param messages: List of message dictionaries.
+    :param pool: The SMTPConnectionPool, by default the one of this process.
+    :return: List of the messages that failed with a temporary error and should be retried.
+    """
+    pool = pool or get_pool()
+    failed = []
+    sent = 0
+    try:
+        with pool.connection() as connection:
+            for message in messages:
+                try:
+                    connection.send_message(build_message(message))
+                except (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError) as e:
+                    if _is_permanent(e):
+                        logger.error(f"Dropping email to {message['recipients']}: {e}")
+                    else:
+                        failed.append(message)
+                sent += 1
+    except (smtplib.SMTPException, OSError) as e:
+        logger.warning(f"SMTP connection failed after {sent} of {len(messages)} emails: {e}")
+        failed.extend(messages[sent:])
+    return failed
+
+
+@celery_app.task(bind=True, max_retries=MAIL_MAX_RETRIES)
+def send_email_batch(self, messages):
+    """
+    Send queued emails, retrying the temporarily failed ones with exponential backoff.
+
+    :param messages: List of message dictionaries.
+    :return: The number of emails handled.
+    """
+    failed = send_messages(messages)
+    if failed:
+        countdown = min(MAIL_RETRY_BACKOFF * 2 ** self.request.retries, MAIL_RETRY_BACKOFF_MAX)
+        raise self.retry(args=(failed,), countdown=countdown)
+    return len(messages)
+
+
+def _pop_batch(client, batch_size):
+    """
+    Take the oldest emails off the outbox.
+
+    :param client: The Redis client.
+    :param batch_size: The maximum number of emails to take.
+    :return: List of message dictionaries.
+    """
+    pipeline = client.pipeline()
+    pipeline.lrange(MAIL_OUTBOX_KEY, 0, batch_size - 1)
+    pipeline.ltrim(MAIL_OUTBOX_KEY, batch_size, -1)
+    raw_messages, _ = pipeline.execute()
+    return [json.loads(raw_message) for raw_message in raw_messages]
+
+
+def drain_outbox(batch_size=MAIL_BATCH_SIZE):
+    """
+    Send every email in the outbox, in batches over pooled connections.
+
+    Emails that fail with a temporary error are handed to ``send_email_batch``
+    to be retried with backoff. A batch is removed from the outbox before it
+    is sent, so a worker crash mid-batch loses that batch.
+
+    :param batch_size: The number of emails sent per batch.
+    :return: The number of emails taken off the outbox.
+    """
+    client = get_redis()
+    if client is None:
+        return 0
+    drained = 0
+    while True:
+        try:
+            messages = _pop_batch(client, batch_size)
+        except redis.RedisError as e:
+            mark_redis_unavailable(e)
+            break
+        if not messages:
+            break
+        drained += len(messages)
+        failed = send_messages(messages)
+        if failed:
+            send_email_batch.apply_async(args=(failed,), countdown=MAIL_RETRY_BACKOFF)
+    return drained
+
+
+def enqueue_email(subject, recipients, body=None, html=None, sender=None):
+    """
+    Queue an email for delivery by a Celery worker.
+
+    The email is added to the Redis outbox, and the first email of an empty
+    outbox schedules a drain ``MAIL_BATCH_DELAY`` seconds later, so emails
+    queued in the meantime share its batch and connection. While Redis is
+    unavailable the email is sent by its own task.
+
+    :param subject: The subject of the email.
+    :param recipients: List of recipient addresses.
+    :param body: The plain text body.
+    :param html: The HTML body.
+    :param sender: The sender address, by default MAIL_DEFAULT_SENDER.
+    """
+    message = {'subject': subject, 'sender': sender, 'recipients': list(recipients), 'body': body, 'html': html}
+    client = get_redis()
+    if client is not None:
+        try:
+            if client.rpush(MAIL_OUTBOX_KEY, json.dumps(message)) == 1:
+                try:
+                    celery_app.send_task('app.tasks.drain_mail_outbox', countdown=MAIL_BATCH_DELAY)
+                except Exception as e:
+                    # The periodic drain picks the email up
+                    logger.warning(f"Could not schedule the mail outbox drain: {e}")
+            return
+        except redis.RedisError as e:
+            mark_redis_unavailable(e)
+    send_email_batch.delay([message])
@@ -1,20 +1,56 @@
+import hashlib
+import hmac
+import logging
 import os
 import re
 from flask_sqlalchemy import SQLAlchemy
 from werkzeug.security import check_password_hash
-from argon2 import PasswordHasher
-from cryptography.fernet import Fernet
+from cryptography.fernet import Fernet, MultiFernet
 from datetime import datetime, timedelta
 
+from app.hashing import hash_password, verify_password, verify_any, needs_rehash, HashingPoolSaturated
+from app.password_screening import is_common_password
+
 
 db = SQLAlchemy()
 
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+# Platforms with a dedicated share counter column on BlogPost
+SHARE_PLATFORMS = ('facebook', 'twitter', 'linkedin', 'reddit', 'email')
 
-ph = PasswordHasher()
+# Number of previous passwords that may not be reused
+PASSWORD_HISTORY_SIZE = int(os.getenv('PASSWORD_HISTORY_SIZE', 5))
 
-# Generate a key for encryption
-key = os.getenv('ENCRYPTION_KEY', Fernet.generate_key())
-cipher_suite = Fernet(key)
+# Encryption key ring: the first key encrypts, every key decrypts. Rotate by prepending a new key
+# and running the rotate_email_encryption task, then drop the old key.
+ENCRYPTION_KEYS = [k.strip() for k in os.getenv('ENCRYPTION_KEYS', os.getenv('ENCRYPTION_KEY', '')).split(',') if k.strip()]
+if not ENCRYPTION_KEYS:
+    if os.getenv('ALLOW_EPHEMERAL_ENCRYPTION_KEY', '').lower() not in ('1', 'true', 'yes'):
+        raise RuntimeError("ENCRYPTION_KEYS is not set")
+    # Development only: each process generates its own key and cannot read the others' data
+    logger.error("ENCRYPTION_KEYS is not set, encrypting with a key that is lost when this process exits")
+    ENCRYPTION_KEYS = [Fernet.generate_key()]
+cipher_suite = MultiFernet([Fernet(k) for k in ENCRYPTION_KEYS])
+
+# Key of the HMAC blind index used to look up users by email without decrypting every row
+EMAIL_INDEX_KEY = os.getenv('EMAIL_INDEX_KEY', '').encode()
+if not EMAIL_INDEX_KEY:
+    # A shared default would make the index of every deployment computable by anyone
+    raise RuntimeError("EMAIL_INDEX_KEY is not set")
+
+
+def email_blind_index(email):
+    """
+    Compute the deterministic blind index of an email address.
+
+    :param email: The plaintext email address.
+    :return: The hex HMAC-SHA256 of the normalized address.
+    """
+    return hmac.new(EMAIL_INDEX_KEY, email.strip().lower().encode(), hashlib.sha256).hexdigest()
 
 
 class User(db.Model):
@@ -24,7 +60,8 @@ class User(db.Model):
     Attributes:
         id (int): The unique identifier for the user.
         username (str): The username of the user.
-        email (str): The email address of the user.
+        email (str): The encrypted email address of the user.
+        email_index (str): The blind index of the email address, used for lookups.
         password_hash (str): The hashed password of the user.
         is_admin (bool): Indicates if the user is an admin.
         roles (list): The roles assigned to the user.
@@ -35,20 +72,27 @@ class User(db.Model):
         is_active (bool): Indicates if the user is active.
         password_reset_token (str): The token for password reset.
         password_reset_token_expiry (datetime): The expiry timestamp for the password reset token.
+        authz_version (int): Incremented whenever the admin flag, roles or active state change.
+        deleted_at (datetime): The timestamp when the user was deleted; their rows are purged in the background.
+        unread_notification_count (int): The number of unread notifications, also cached in Redis.
     """
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(64), unique=True, nullable=False, index=True)
-    email = db.Column(db.String(120), unique=True, nullable=False, index=True)
+    email = db.Column(db.String(512), nullable=False)
+    email_index = db.Column(db.String(64), unique=True, nullable=True, index=True)
     password_hash = db.Column(db.String(128), nullable=False)
     is_admin = db.Column(db.Boolean, default=False)
     roles = db.relationship('Role', secondary='user_roles', backref=db.backref('users', lazy='dynamic'))
     mfa_secret = db.Column(db.String(32), nullable=True)
-    salt = db.Column(db.String(32), nullable=False, default=os.urandom(16).hex())
+    salt = db.Column(db.String(32), nullable=False, default=lambda: os.urandom(16).hex())
     password_history = db.relationship('PasswordHistory', backref='user', lazy=True)
     last_login = db.Column(db.DateTime, nullable=True)
     is_active = db.Column(db.Boolean, default=True)
     password_reset_token = db.Column(db.String(128), nullable=True)
     password_reset_token_expiry = db.Column(db.DateTime, nullable=True)
+    authz_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    deleted_at = db.Column(db.DateTime, nullable=True, index=True)
+    unread_notification_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
     def set_password(self, password):
         if not self.validate_password(password):
@@ -57,16 +101,28 @@ class User(db.Model):
             raise ValueError("Password is too common")
         if self.is_password_reused(password):
             raise ValueError("Password has been used before")
-        self.password_hash = ph.hash(password + self.salt)
-        self.add_password_to_history(password)
+        if not self.salt:
+            # The column default is only applied on insert, after the hash is computed
+            self.salt = os.urandom(16).hex()
+        self.password_hash = hash_password(password + self.salt)
+        self.add_password_to_history()
 
     def check_password(self, password):
         try:
-            return ph.verify(self.password_hash, password + self.salt)
-        except:
-            return False
+            if not verify_password(self.password_hash, password + self.salt):
+                return False
+        except TypeError:
+            return False  # Missing password, salt or hash
+        if needs_rehash(self.password_hash):
+            # Upgrade hashes made with an outdated profile; committed with the login.
+            try:
+                self.password_hash = hash_password(password + self.salt)
+            except HashingPoolSaturated:
+                pass  # Retried on the next login
+        return True
 
-    def validate_password(self, password):
+    @staticmethod
+    def validate_password(password):
         if len(password) < 8:
             return False
         if not re.search(r"[A-Z]", password):
@@ -80,22 +136,28 @@ class User(db.Model):
         return True
 
     def is_common_password(self, password):
-        common_passwords = [
-            "123456", "password", "123456789", "12345678", "12345", "1234567", "1234567890", "qwerty", "abc123",
-            "password1"
-        ]
-        return password in common_passwords
+        return is_common_password(password)
 
     def is_password_reused(self, password):
-        for history in self.password_history:
-            if ph.verify(history.password_hash, password + self.salt):
-                return True
-        return False
-
-    def add_password_to_history(self, password):
-        password_history = PasswordHistory(user_id=self.id, password_hash=ph.hash(password + self.salt))
-        db.session.add(password_history)
-        db.session.commit()
+        if self.id is None:
+            return False
+        recent_hashes = db.session.query(PasswordHistory.password_hash).filter_by(user_id=self.id) \
+            .order_by(PasswordHistory.id.desc()).limit(PASSWORD_HISTORY_SIZE)
+        return verify_any((row.password_hash for row in recent_hashes), password + self.salt)
+
+    def add_password_to_history(self):
+        # Not committed here: set_password's callers (register, reset_password) commit the
+        # user and the history entry together. Only the last PASSWORD_HISTORY_SIZE entries are kept.
+        if self.id is None:
+            # A new user has no history to load, and the entry gets the user's id on insert.
+            self.password_history.append(PasswordHistory(password_hash=self.password_hash))
+            return
+        db.session.add(PasswordHistory(user_id=self.id, password_hash=self.password_hash))
+        newest_dropped = db.session.query(PasswordHistory.id).filter_by(user_id=self.id) \
+            .order_by(PasswordHistory.id.desc()).offset(PASSWORD_HISTORY_SIZE).limit(1).scalar()
+        if newest_dropped is not None:
+            PasswordHistory.query.filter(PasswordHistory.user_id == self.id, PasswordHistory.id <= newest_dropped) \
+                .delete(synchronize_session=False)
 
     def encrypt_data(self, data):
         return cipher_suite.encrypt(data.encode()).decode()
@@ -105,10 +167,18 @@ class User(db.Model):
 
     def set_email(self, email):
         self.email = self.encrypt_data(email)
+        self.email_index = email_blind_index(email)
 
     def get_email(self):
         return self.decrypt_data(self.email)
 
+    @classmethod
+    def find_by_email(cls, email, include_deleted=False):
+        query = cls.query.filter_by(email_index=email_blind_index(email))
+        if not include_deleted:
+            query = query.filter(cls.deleted_at.is_(None))
+        return query.first()
+
 
 class Role(db.Model):
     """
@@ -117,9 +187,11 @@ class Role(db.Model):
     Attributes:
         id (int): The unique identifier for the role.
         name (str): The name of the role.
+        permissions (int): The bitset of permissions granted by the role, see app.permissions.Permission.
     """
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(64), unique=True)
+    permissions = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
 
 class UserRoles(db.Model):
@@ -147,6 +219,13 @@ class BlogPost(db.Model):
         author_id (int): The unique identifier for the author of the blog post.
         created_at (datetime): The timestamp when the blog post was created.
         updated_at (datetime): The timestamp when the blog post was last updated.
+        view_count (int): The number of views flushed from the view counter buffer.
+        share_count (int): The total number of social media shares.
+        facebook_share_count (int): The number of shares on Facebook.
+        twitter_share_count (int): The number of shares on Twitter.
+        linkedin_share_count (int): The number of shares on LinkedIn.
+        reddit_share_count (int): The number of shares on Reddit.
+        email_share_count (int): The number of shares by email.
     """
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
@@ -154,12 +233,25 @@ class BlogPost(db.Model):
     author_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
     created_at = db.Column(db.DateTime, server_default=db.func.now())
     updated_at = db.Column(db.DateTime, server_default=db.func.now(), onupdate=db.func.now())
+    view_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Share counters are maintained by app.share_counters alongside SocialMediaShare rows.
+    share_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    facebook_share_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    twitter_share_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    linkedin_share_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    reddit_share_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    email_share_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
     author = db.relationship('User', backref=db.backref('blog_posts', lazy=True))
 
     def get_absolute_url(self):
         return f"/blog/post/{self.id}"
 
+    def get_share_counts(self):
+        counts = {platform: getattr(self, f'{platform}_share_count') for platform in SHARE_PLATFORMS}
+        counts['total'] = self.share_count
+        return counts
+
 
 class UserActivityLog(db.Model):
     """
@@ -190,11 +282,18 @@ class Notification(db.Model):
         timestamp (datetime): The timestamp when the notification was created.
         is_read (bool): Indicates if the notification has been read.
     """
+    # The feed pages through a user's notifications by (timestamp, id); both
+    # indexes also serve every lookup by user_id alone.
+    __table_args__ = (
+        db.Index('ix_notification_user_id_timestamp', 'user_id', 'timestamp', 'id'),
+        db.Index('ix_notification_user_id_is_read_timestamp', 'user_id', 'is_read', 'timestamp', 'id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     message = db.Column(db.String(255), nullable=False)
-    timestamp = db.Column(db.DateTime, server_default=db.func.now())
-    is_read = db.Column(db.Boolean, default=False)
+    timestamp = db.Column(db.DateTime, nullable=False, server_default=db.func.now())
+    is_read = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
 
     user = db.relationship('User', backref=db.backref('notifications', lazy=True))
 
@@ -209,7 +308,7 @@ class SocialMediaShare(db.Model):
         platform (str): The social media platform where the post was shared.
         shared_at (datetime): The timestamp when the post was shared.
     """
-    id = db.Column(db.Integer, primary key=True)
+    id = db.Column(db.Integer, primary_key=True)
     post_id = db.Column(db.Integer, db.ForeignKey('blog_post.id'), nullable=False, index=True)
     platform = db.Column(db.String(64), nullable=False)
     shared_at = db.Column(db.DateTime, server_default=db.func.now())
@@ -263,3 +362,68 @@ class PasswordHistory(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     password_hash = db.Column(db.String(128), nullable=False)
+
+
+class RelatedPost(db.Model):
+    """
+    RelatedPost model representing a precomputed related-post recommendation.
+
+    Attributes:
+        id (int): The unique identifier for the recommendation.
+        post_id (int): The unique identifier for the blog post the recommendation belongs to.
+        related_post_id (int): The unique identifier for the recommended blog post.
+        rank (int): The position of the recommendation, starting at 0 for the closest match.
+        score (float): The cosine similarity between the two posts.
+        computed_at (datetime): The timestamp when the recommendation was computed.
+    """
+    __table_args__ = (
+        db.Index('ix_related_post_post_id_rank', 'post_id', 'rank'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    post_id = db.Column(db.Integer, db.ForeignKey('blog_post.id', ondelete='CASCADE'), nullable=False)
+    # Not a foreign key: rows pointing at deleted posts are left in place so the
+    # next refresh can find the posts whose recommendations went stale.
+    related_post_id = db.Column(db.Integer, nullable=False, index=True)
+    rank = db.Column(db.Integer, nullable=False)
+    score = db.Column(db.Float, nullable=False)
+    computed_at = db.Column(db.DateTime, server_default=db.func.now())
+
+
+class TaskCheckpoint(db.Model):
+    """
+    TaskCheckpoint model recording the progress of a resumable background job.
+
+    Attributes:
+        name (str): The unique name of the job.
+        position (str): The job-specific progress marker.
+        updated_at (datetime): The timestamp when the checkpoint was last written.
+    """
+    name = db.Column(db.String(128), primary_key=True)
+    position = db.Column(db.String(255), nullable=True)
+    updated_at = db.Column(db.DateTime, server_default=db.func.now(), onupdate=db.func.now())
+
+
+class AdminStats(db.Model):
+    """
+    AdminStats model holding the single row of totals shown on the admin dashboard.
+
+    Committed changes to the counters are buffered in Redis and folded in
+    periodically, and the counters are periodically recomputed from the tables.
+
+    Attributes:
+        id (int): The unique identifier of the row, always 1.
+        user_count (int): The number of users that are not deleted.
+        post_count (int): The number of blog posts.
+        activity_log_count (int): The number of user activity log entries.
+        notification_count (int): The number of notifications.
+        reconciled_at (datetime): The timestamp when the counters were last recomputed.
+        updated_at (datetime): The timestamp when the counters were last changed.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    user_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    post_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    activity_log_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    notification_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    reconciled_at = db.Column(db.DateTime, nullable=True)
+    updated_at = db.Column(db.DateTime, server_default=db.func.now(), onupdate=db.func.now())
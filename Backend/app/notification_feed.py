@@ -0,0 +1,68 @@
+from datetime import datetime, timedelta, timezone
+
+from app.models import db, Notification
+
+
+# Notification feed settings
+FEED_PAGE_SIZE = 20
+FEED_PAGE_SIZE_MAX = 100
+
+# Cursors hold the timestamp as integer microseconds since this (naive UTC) epoch,
+# which round-trips exactly and needs no escaping in a query string
+_EPOCH = datetime(1970, 1, 1)
+
+
+def encode_cursor(timestamp, notification_id):
+    """
+    Build the cursor pointing after a notification in the feed.
+
+    :param timestamp: The timestamp of the notification, naive UTC or timezone-aware.
+    :param notification_id: The ID of the notification.
+    :return: The cursor string, ``<microseconds since the epoch>_<id>``.
+    """
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return f"{(timestamp - _EPOCH) // timedelta(microseconds=1)}_{notification_id}"
+
+
+def decode_cursor(cursor):
+    """
+    Parse a feed cursor.
+
+    :param cursor: The cursor string from encode_cursor.
+    :return: Tuple of the naive UTC timestamp and the notification ID.
+    :raises ValueError: If the cursor is malformed.
+    """
+    micros, _, notification_id = cursor.partition('_')
+    try:
+        return _EPOCH + timedelta(microseconds=int(micros)), int(notification_id)
+    except OverflowError as e:
+        raise ValueError(f"Cursor out of range: {cursor}") from e
+
+
+def list_notifications(user_id, cursor=None, limit=FEED_PAGE_SIZE, unread_only=False):
+    """
+    Get one page of a user's notifications, newest first.
+
+    Pages continue from the (timestamp, ID) of the last notification of the
+    previous page, so each page is a range scan of the composite
+    ``(user_id, timestamp, id)`` or ``(user_id, is_read, timestamp, id)``
+    index however many notifications the user has.
+
+    :param user_id: The ID of the user.
+    :param cursor: The ``next_cursor`` of the previous page, or None for the first page.
+    :param limit: The number of notifications per page.
+    :param unread_only: Whether to only include unread notifications.
+    :return: Tuple of the list of notifications and the cursor of the next page, or None on the last page.
+    :raises ValueError: If the cursor is malformed.
+    """
+    query = Notification.query.filter(Notification.user_id == user_id)
+    if unread_only:
+        query = query.filter(Notification.is_read.is_(False))
+    if cursor:
+        query = query.filter(db.tuple_(Notification.timestamp, Notification.id) < decode_cursor(cursor))
+    notifications = query.order_by(Notification.timestamp.desc(), Notification.id.desc()).limit(limit + 1).all()
+    if len(notifications) > limit:
+        last = notifications[limit - 1]
+        return notifications[:limit], encode_cursor(last.timestamp, last.id)
+    return notifications, None
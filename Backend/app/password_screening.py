@@ -0,0 +1,80 @@
+import logging
+import os
+
+from app.bloom import BloomFilter
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+# Bloom filter of breached passwords built by `flask build-password-bloom`
+PASSWORD_BLOOM_PATH = os.getenv(
+    'PASSWORD_BLOOM_PATH', os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'passwords.bloom')
+)
+# Always rejected, even when no filter has been built
+COMMON_PASSWORDS = frozenset([
+    "123456", "password", "123456789", "12345678", "12345", "1234567", "1234567890", "qwerty", "abc123",
+    "password1"
+])
+
+
+def load_password_filter(path=PASSWORD_BLOOM_PATH):
+    """
+    Memory-map the breached password filter.
+
+    :param path: The path of the filter file.
+    :return: The BloomFilter, or None if the file does not exist or is invalid.
+    """
+    try:
+        password_filter = BloomFilter.open(path)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.error(f"Could not load breached password filter {path}: {e}")
+        return None
+    logger.info(f"Loaded breached password filter with {password_filter.count} entries from {path}")
+    return password_filter
+
+
+# Mapped when the workers import the app, the pages are shared through the page cache
+password_filter = load_password_filter()
+
+
+def build_password_filter(corpus_path, output_path=PASSWORD_BLOOM_PATH, fp_rate=0.001):
+    """
+    Compile a password corpus into a Bloom filter file.
+
+    The corpus is a text file with one password per line. It is read twice,
+    once to size the filter and once to fill it, so it is never held in memory.
+
+    :param corpus_path: The path of the corpus file.
+    :param output_path: The path of the filter file to write.
+    :param fp_rate: The acceptable false positive rate.
+    :return: The number of passwords added.
+    """
+    with open(corpus_path, 'rb') as corpus:
+        capacity = sum(1 for line in corpus if line.rstrip(b'\r\n'))
+
+    bloom = BloomFilter.for_capacity(capacity, fp_rate)
+    with open(corpus_path, 'rb') as corpus:
+        for line in corpus:
+            password = line.rstrip(b'\r\n')
+            if password:
+                bloom.add(password)
+    bloom.save(output_path)
+    logger.info(f"Built breached password filter with {bloom.count} entries "
+                f"({bloom.num_bits // 8} bytes, {bloom.num_hashes} hashes) at {output_path}")
+    return bloom.count
+
+
+def is_common_password(password):
+    """
+    Check whether a password is common or appears in the breached password corpus.
+
+    :param password: The password to check.
+    :return: True if the password should be rejected.
+    """
+    if password in COMMON_PASSWORDS:
+        return True
+    return password_filter is not None and password in password_filter
@@ -0,0 +1,214 @@
+import enum
+import logging
+import threading
+from functools import wraps
+
+import redis
+from flask import jsonify
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from app.authz import current_claims, invalidate_authz_versions
+from app.models import db, User, Role, UserRoles
+from app.redis_client import get_redis, mark_redis_unavailable
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class Permission(enum.IntFlag):
+    """
+    Permissions granted by roles, one bit each.
+
+    ``MANAGE_USERS`` covers the admin user routes and ``VIEW_STATS`` the
+    dashboard totals. Changing the admin flag also needs ``MANAGE_ROLES``,
+    so only grant it to roles trusted to make admins.
+
+    Bits are stored in ``Role.permissions``, so existing values must never be renumbered.
+    """
+    CREATE_POST = 1 << 0
+    EDIT_ANY_POST = 1 << 1
+    DELETE_ANY_POST = 1 << 2
+    MANAGE_USERS = 1 << 3
+    MANAGE_ROLES = 1 << 4
+    VIEW_STATS = 1 << 5
+
+
+# The bits are distinct, so their sum has every bit set
+ALL_PERMISSIONS = sum(Permission)
+
+# Seconds a compiled permission set is kept in Redis; entries of old versions simply expire
+PERMISSION_CACHE_TTL = 24 * 3600
+# Compiled permission sets kept per worker before the cache is cleared
+PERMISSION_CACHE_SIZE = 10000
+
+_local_cache = {}
+_local_lock = threading.Lock()
+
+_PENDING_KEY = 'permissions_changed_user_ids'
+
+
+def _cache_key(user_id, version):
+    return f"perms:{user_id}:{version}"
+
+
+def _compile(user_id):
+    """
+    Compile the permissions of a user's roles into one bitset.
+
+    :param user_id: The ID of the user.
+    :return: The permission bits.
+    """
+    bits = 0
+    for role_permissions, in db.session.query(Role.permissions) \
+            .join(UserRoles, UserRoles.role_id == Role.id).filter(UserRoles.user_id == user_id):
+        bits |= role_permissions or 0
+    return bits
+
+
+def _role_permissions(user_id, version):
+    """
+    Get the compiled role permissions of a user at an authorization version.
+
+    Every change to a user's roles bumps their authorization version, so a
+    compiled set never needs to be invalidated: it is looked up per worker,
+    then in Redis, and only compiled from the database on a miss.
+
+    :param user_id: The ID of the user.
+    :param version: The current authorization version of the user.
+    :return: The permission bits.
+    """
+    with _local_lock:
+        entry = _local_cache.get(user_id)
+    if entry is not None and entry[0] == version:
+        return entry[1]
+
+    bits = None
+    client = get_redis()
+    if client is not None:
+        try:
+            cached = client.get(_cache_key(user_id, version))
+            bits = int(cached) if cached is not None else None
+        except redis.RedisError as e:
+            mark_redis_unavailable(e)
+    if bits is None:
+        bits = _compile(user_id)
+        if client is not None:
+            try:
+                client.set(_cache_key(user_id, version), bits, ex=PERMISSION_CACHE_TTL)
+            except redis.RedisError as e:
+                mark_redis_unavailable(e)
+
+    with _local_lock:
+        if len(_local_cache) >= PERMISSION_CACHE_SIZE:
+            _local_cache.clear()
+        _local_cache[user_id] = (version, bits)
+    return bits
+
+
+def get_permissions(user_id):
+    """
+    Get the permissions of a user.
+
+    Admins have every permission and inactive users none.
+
+    :param user_id: The ID of the user.
+    :return: The permission bits.
+    """
+    claims = current_claims(user_id)
+    if not claims['is_active']:
+        return 0
+    if claims['is_admin']:
+        return ALL_PERMISSIONS
+    return _role_permissions(user_id, claims['authz_version'])
+
+
+def has_permission(user_id, permission):
+    """
+    Check whether a user has all of the given permissions.
+
+    :param user_id: The ID of the user.
+    :param permission: A Permission, or several combined with ``|``.
+    :return: True if the user has every permission.
+    """
+    return get_permissions(user_id) & permission == permission
+
+
+def require_permission(permission, message='Permission denied'):
+    """
+    Restrict a route to users with the given permissions.
+
+    Apply it below ``@jwt_required()``.
+
+    :param permission: A Permission, or several combined with ``|``.
+    :param message: The message of the 403 response.
+    :return: The route decorator.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not has_permission(get_jwt_identity(), permission):
+                return jsonify({'msg': message}), 403
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@event.listens_for(Session, 'before_flush')
+def _bump_versions_on_role_changes(session, flush_context, instances):
+    """
+    Bump the authorization version of users whose roles or role permissions are about to change.
+
+    The bump is part of the same transaction, and the published versions
+    are dropped once it commits.
+    """
+    user_ids = set()
+    role_ids = set()
+    for obj in session.new:
+        if isinstance(obj, UserRoles) and obj.user_id is not None:
+            user_ids.add(obj.user_id)
+    for obj in session.deleted:
+        if isinstance(obj, UserRoles):
+            user_ids.add(obj.user_id)
+        elif isinstance(obj, Role):
+            role_ids.add(obj.id)
+    for obj in session.dirty:
+        state = inspect(obj)
+        if isinstance(obj, UserRoles):
+            history = state.attrs.user_id.history
+            user_ids.update(history.added + history.deleted + history.unchanged)
+        elif isinstance(obj, User) and obj.id is not None and state.attrs.roles.history.has_changes():
+            user_ids.add(obj.id)
+        elif isinstance(obj, Role) and state.attrs.permissions.history.has_changes():
+            role_ids.add(obj.id)
+
+    if role_ids:
+        user_ids.update(user_id for user_id, in session.query(UserRoles.user_id)
+                        .filter(UserRoles.role_id.in_(role_ids)).distinct())
+    user_ids.discard(None)
+    if not user_ids:
+        return
+
+    user_table = User.__table__
+    session.execute(user_table.update().where(user_table.c.id.in_(user_ids))
+                    .values(authz_version=user_table.c.authz_version + 1))
+    # Reload the bumped version of users already in the session, unless the flush writes its own
+    for obj in list(session.identity_map.values()):
+        if isinstance(obj, User) and obj.id in user_ids \
+                and not inspect(obj).attrs.authz_version.history.has_changes():
+            session.expire(obj, ['authz_version'])
+    session.info.setdefault(_PENDING_KEY, set()).update(user_ids)
+
+
+@event.listens_for(Session, 'after_commit')
+def _publish_role_changes(session):
+    user_ids = session.info.pop(_PENDING_KEY, None)
+    if user_ids:
+        invalidate_authz_versions(list(user_ids))
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_role_changes(session):
+    session.info.pop(_PENDING_KEY, None)
@@ -0,0 +1,227 @@
+import csv
+import io
+import json
+import logging
+import os
+
+from sqlalchemy.exc import IntegrityError
+
+from app.admin_stats import increment_stats
+from app.hashing import hash_many
+from app.models import db, User, PasswordHistory, cipher_suite, email_blind_index
+from app.password_screening import is_common_password
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+# Number of users checked, hashed and inserted per transaction
+PROVISION_BATCH_SIZE = 1000
+# Rows accepted by the upload endpoint; larger files go through `flask provision-users`
+PROVISION_MAX_UPLOAD_ROWS = int(os.getenv('PROVISION_MAX_UPLOAD_ROWS', 1000))
+PROVISION_FORMATS = ('csv', 'ndjson')
+
+
+def detect_format(filename=None, content_type=None):
+    """
+    Guess the format of a user import from its file name or content type.
+
+    :param filename: The name of the uploaded file.
+    :param content_type: The MIME type of the upload.
+    :return: 'csv' or 'ndjson'.
+    """
+    if (filename and filename.lower().endswith(('.ndjson', '.jsonl'))) or \
+            (content_type and 'json' in content_type):
+        return 'ndjson'
+    return 'csv'
+
+
+def read_user_records(stream, file_format):
+    """
+    Stream user records from a CSV or NDJSON file.
+
+    CSV files need a header row with ``username``, ``email`` and ``password``
+    columns; NDJSON files hold one object with those keys per line.
+
+    :param stream: A binary file-like object.
+    :param file_format: 'csv' or 'ndjson'.
+    :return: Generator of (line number, record dictionary or None, error message or None) tuples.
+    """
+    text = io.TextIOWrapper(stream, encoding='utf-8', newline='')
+    if file_format == 'csv':
+        reader = csv.DictReader(text)
+        for record in reader:
+            yield reader.line_num, record, None
+    elif file_format == 'ndjson':
+        for line_number, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield line_number, None, f"Invalid JSON: {e}"
+                continue
+            if not isinstance(record, dict):
+                yield line_number, None, "Expected a JSON object"
+                continue
+            yield line_number, record, None
+    else:
+        raise ValueError(f"Unsupported format: {file_format}")
+
+
+def _validate(record):
+    """
+    Validate one user record.
+
+    :param record: The record dictionary.
+    :return: Tuple of (username, email, password) and an error message or None.
+    """
+    username = str(record.get('username') or '').strip()
+    email = str(record.get('email') or '').strip()
+    password = str(record.get('password') or '')
+    if not username or not email or not password:
+        return (username, email, password), "username, email and password are required"
+    if len(username) > 64:
+        return (username, email, password), "Username is too long"
+    if '@' not in email:
+        return (username, email, password), "Invalid email address"
+    if not User.validate_password(password):
+        return (username, email, password), "Password does not meet the required criteria"
+    if is_common_password(password):
+        return (username, email, password), "Password is too common"
+    return (username, email, password), None
+
+
+def _drop_existing(rows, errors):
+    """
+    Remove the rows whose username or email is already taken, with two set-based queries.
+
+    :param rows: The batch rows.
+    :param errors: List collecting per-row errors.
+    :return: The rows that can be inserted.
+    """
+    taken_usernames = {username for username, in db.session.query(User.username)
+                       .filter(User.username.in_([row['username'] for row in rows]))}
+    taken_emails = {email_index for email_index, in db.session.query(User.email_index)
+                    .filter(User.email_index.in_([row['email_index'] for row in rows]))}
+    remaining = []
+    for row in rows:
+        if row['username'] in taken_usernames:
+            errors.append({'line': row['line'], 'username': row['username'], 'error': 'Username already exists'})
+        elif row['email_index'] in taken_emails:
+            errors.append({'line': row['line'], 'username': row['username'], 'error': 'Email already exists'})
+        else:
+            remaining.append(row)
+    return remaining
+
+
+def _insert(rows):
+    """
+    Insert a batch of users and their first password history entries in one transaction.
+
+    Users are created without an MFA secret; they enrol with ``/auth/enable_2fa``
+    after their first login.
+
+    :param rows: The batch rows, with salts and password hashes.
+    """
+    db.session.bulk_insert_mappings(User, [{
+        'username': row['username'],
+        'email': cipher_suite.encrypt(row['email'].encode()).decode(),
+        'email_index': row['email_index'],
+        'password_hash': row['password_hash'],
+        'salt': row['salt'],
+    } for row in rows])
+    user_ids = dict(db.session.query(User.username, User.id)
+                    .filter(User.username.in_([row['username'] for row in rows])))
+    db.session.bulk_insert_mappings(PasswordHistory, [
+        {'user_id': user_ids[row['username']], 'password_hash': row['password_hash']} for row in rows
+    ])
+    increment_stats(user_count=len(rows))
+    db.session.commit()
+
+
+def _provision_batch(rows, errors):
+    """
+    Check, hash and insert one batch of users.
+
+    :param rows: The batch rows.
+    :param errors: List collecting per-row errors.
+    :return: The number of users created.
+    """
+    rows = _drop_existing(rows, errors)
+    if not rows:
+        return 0
+    for row in rows:
+        row['salt'] = os.urandom(16).hex()
+    for row, password_hash in zip(rows, hash_many([row['password'] + row['salt'] for row in rows])):
+        row['password_hash'] = password_hash
+
+    try:
+        _insert(rows)
+    except IntegrityError:
+        # Users registered since the check; drop them and try once more
+        db.session.rollback()
+        rows = _drop_existing(rows, errors)
+        if not rows:
+            return 0
+        try:
+            _insert(rows)
+        except IntegrityError as e:
+            db.session.rollback()
+            errors.extend({'line': row['line'], 'username': row['username'], 'error': 'Could not be inserted'}
+                          for row in rows)
+            logger.error(f"Bulk provisioning batch failed: {e}")
+            return 0
+    return len(rows)
+
+
+def provision_users(records, batch_size=PROVISION_BATCH_SIZE):
+    """
+    Create users from a stream of records.
+
+    Records are validated one by one, then checked for existing usernames
+    and emails, hashed across the hashing pool and inserted in batches of
+    ``batch_size``, one transaction per batch. Invalid or conflicting rows
+    are reported and skipped without affecting the other rows.
+
+    :param records: Iterable of (line number, record or None, error or None) tuples from read_user_records.
+    :param batch_size: The number of users per transaction.
+    :return: Dictionary with the number of users created and the list of per-row errors.
+    """
+    created = 0
+    errors = []
+    seen_usernames = set()
+    seen_emails = set()
+    batch = []
+
+    for line_number, record, error in records:
+        if error is None:
+            (username, email, password), error = _validate(record)
+        else:
+            username = None
+        if error is None:
+            email_index = email_blind_index(email)
+            if username in seen_usernames:
+                error = 'Duplicate username in file'
+            elif email_index in seen_emails:
+                error = 'Duplicate email in file'
+        if error is not None:
+            errors.append({'line': line_number, 'username': username, 'error': error})
+            continue
+
+        seen_usernames.add(username)
+        seen_emails.add(email_index)
+        batch.append({'line': line_number, 'username': username, 'email': email, 'password': password,
+                      'email_index': email_index})
+        if len(batch) >= batch_size:
+            created += _provision_batch(batch, errors)
+            logger.info(f"Provisioned {created} users so far")
+            batch = []
+
+    if batch:
+        created += _provision_batch(batch, errors)
+
+    errors.sort(key=lambda entry: entry['line'])
+    logger.info(f"Provisioned {created} users, {len(errors)} rows rejected")
+    return {'created': created, 'errors': errors}
@@ -0,0 +1,60 @@
+import logging
+import os
+import time
+
+import redis
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+# Redis connection settings
+REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+REDIS_SOCKET_TIMEOUT = float(os.getenv('REDIS_SOCKET_TIMEOUT', 0.5))
+# Seconds to wait before trying to reconnect after Redis was found unreachable
+REDIS_RETRY_INTERVAL = 30
+
+_client = None
+_unavailable_until = 0.0
+
+
+def get_redis():
+    """
+    Get the shared Redis client.
+
+    After a failed connection attempt, None is returned without retrying
+    for ``REDIS_RETRY_INTERVAL`` seconds so that callers can fall back to
+    their in-process implementation without paying a connect timeout on
+    every call.
+
+    :return: A Redis client, or None if Redis is unavailable.
+    """
+    global _client
+    if _client is not None:
+        return _client
+    if time.monotonic() < _unavailable_until:
+        return None
+
+    try:
+        client = redis.Redis.from_url(REDIS_URL, socket_timeout=REDIS_SOCKET_TIMEOUT,
+                                      socket_connect_timeout=REDIS_SOCKET_TIMEOUT)
+        client.ping()
+    except redis.RedisError as e:
+        mark_redis_unavailable(e)
+        return None
+
+    _client = client
+    return _client
+
+
+def mark_redis_unavailable(error=None):
+    """
+    Drop the shared Redis client after a failed command.
+
+    :param error: The Redis exception that was raised, if any.
+    """
+    global _client, _unavailable_until
+    _client = None
+    _unavailable_until = time.monotonic() + REDIS_RETRY_INTERVAL
+    logger.warning(f"Redis unavailable, using in-process fallbacks: {error}")
@@ -0,0 +1,183 @@
+import logging
+import os
+import re
+from collections import Counter
+from datetime import datetime
+
+import numpy as np
+from scipy import sparse
+
+from app.models import db, BlogPost, RelatedPost, TaskCheckpoint
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+# Related posts settings
+RELATED_POSTS_K = int(os.getenv('RELATED_POSTS_K', 5))
+CHECKPOINT_NAME = 'related-posts'
+# Upper bound on the number of dense similarity cells materialised per batch
+SIMILARITY_BATCH_CELLS = 2 ** 22
+TOKEN_PATTERN = re.compile(r"[a-z0-9]{2,}")
+
+
+def tokenize(text):
+    """
+    Split text into lowercase alphanumeric terms.
+
+    :param text: The text to tokenize.
+    :return: List of terms.
+    """
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def build_tfidf_matrix(documents):
+    """
+    Build an L2-normalised TF-IDF matrix for the given documents.
+
+    Term frequencies are sublinear (1 + log tf) and inverse document
+    frequencies are smoothed, so every row is a unit vector and the dot
+    product of two rows is their cosine similarity.
+
+    :param documents: Iterable of document strings.
+    :return: CSR matrix of shape (n_documents, n_terms).
+    """
+    vocabulary = {}
+    indptr = [0]
+    indices = []
+    counts = []
+    for document in documents:
+        for term, count in Counter(tokenize(document)).items():
+            indices.append(vocabulary.setdefault(term, len(vocabulary)))
+            counts.append(count)
+        indptr.append(len(indices))
+
+    n_documents = len(indptr) - 1
+    matrix = sparse.csr_matrix(
+        (np.asarray(counts, dtype=np.float32), np.asarray(indices, dtype=np.int32), np.asarray(indptr)),
+        shape=(n_documents, len(vocabulary)),
+    )
+    matrix.data = 1.0 + np.log(matrix.data)
+
+    document_frequency = np.bincount(matrix.indices, minlength=matrix.shape[1])
+    idf = np.log((1.0 + n_documents) / (1.0 + document_frequency)) + 1.0
+    matrix = matrix @ sparse.diags(idf.astype(np.float32))
+
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1.0
+    return (sparse.diags(1.0 / norms) @ matrix).tocsr()
+
+
+def top_k_neighbours(matrix, rows, k):
+    """
+    Find the k most similar rows of the matrix for each of the given rows.
+
+    Similarities are computed as batched sparse matrix products, sized so
+    that each dense batch stays under ``SIMILARITY_BATCH_CELLS`` cells.
+
+    :param matrix: Row-normalised CSR matrix as returned by build_tfidf_matrix.
+    :param rows: Sequence of row indices to find neighbours for.
+    :param k: The number of neighbours per row.
+    :return: Generator of (row, [(neighbour_row, score), ...]) ordered by descending score.
+    """
+    n_rows = matrix.shape[0]
+    k = min(k, n_rows - 1)
+    if k <= 0:
+        for row in rows:
+            yield row, []
+        return
+
+    transposed = matrix.T.tocsc()
+    batch_size = max(1, SIMILARITY_BATCH_CELLS // n_rows)
+    for start in range(0, len(rows), batch_size):
+        batch = np.asarray(rows[start:start + batch_size])
+        similarities = (matrix[batch] @ transposed).toarray()
+        similarities[np.arange(len(batch)), batch] = -1.0
+
+        candidates = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+        scores = np.take_along_axis(similarities, candidates, axis=1)
+        order = np.argsort(-scores, axis=1)
+        candidates = np.take_along_axis(candidates, order, axis=1)
+        scores = np.take_along_axis(scores, order, axis=1)
+
+        for row, neighbours, neighbour_scores in zip(batch, candidates, scores):
+            yield int(row), [(int(neighbour), float(score))
+                             for neighbour, score in zip(neighbours, neighbour_scores) if score > 0]
+
+
+def refresh_related_posts(full=False, k=RELATED_POSTS_K):
+    """
+    Recompute the related-posts table.
+
+    Only posts updated since the previous run are recomputed, together with
+    posts that recommend one of them or recommend a post that has since been
+    deleted. A new post can also belong among the recommendations of posts
+    that did not change, which only a full run picks up, so ``full=True``
+    (recompute every post) is scheduled daily.
+
+    :param full: Whether to recompute every post.
+    :param k: The number of related posts to store per post.
+    :return: The number of posts whose recommendations were recomputed.
+    """
+    started_at = datetime.utcnow()
+    checkpoint = TaskCheckpoint.query.get(CHECKPOINT_NAME)
+    last_run = None
+    if checkpoint and checkpoint.position and not full:
+        last_run = datetime.fromisoformat(checkpoint.position)
+
+    posts = db.session.query(BlogPost.id, BlogPost.title, BlogPost.content, BlogPost.updated_at) \
+        .order_by(BlogPost.id).all()
+    if not posts:
+        return 0
+
+    post_ids = [post.id for post in posts]
+    if last_run is None:
+        affected = set(post_ids)
+    else:
+        changed = {post.id for post in posts if post.updated_at is None or post.updated_at > last_run}
+        stale = {post_id for post_id, in db.session.query(RelatedPost.post_id)
+                 .outerjoin(BlogPost, BlogPost.id == RelatedPost.related_post_id)
+                 .filter(RelatedPost.related_post_id.in_(changed) | BlogPost.id.is_(None))
+                 .distinct()}
+        affected = changed | stale
+
+    if affected:
+        matrix = build_tfidf_matrix(f"{post.title} {post.content}" for post in posts)
+        rows = [index for index, post_id in enumerate(post_ids) if post_id in affected]
+
+        RelatedPost.query.filter(RelatedPost.post_id.in_(affected)).delete(synchronize_session=False)
+        mappings = []
+        for row, neighbours in top_k_neighbours(matrix, rows, k):
+            mappings.extend({
+                'post_id': post_ids[row],
+                'related_post_id': post_ids[neighbour],
+                'rank': rank,
+                'score': score,
+                'computed_at': started_at,
+            } for rank, (neighbour, score) in enumerate(neighbours))
+        db.session.bulk_insert_mappings(RelatedPost, mappings)
+
+    if checkpoint is None:
+        checkpoint = TaskCheckpoint(name=CHECKPOINT_NAME)
+        db.session.add(checkpoint)
+    checkpoint.position = started_at.isoformat()
+    db.session.commit()
+
+    logger.info(f"Recomputed related posts for {len(affected)} of {len(posts)} posts")
+    return len(affected)
+
+
+def get_related_posts(post_id):
+    """
+    Retrieve the precomputed related posts for a blog post.
+
+    :param post_id: The ID of the blog post.
+    :return: List of dictionaries with the id, title, url and score of each related post.
+    """
+    related = db.session.query(RelatedPost.related_post_id, RelatedPost.score, BlogPost.title) \
+        .join(BlogPost, BlogPost.id == RelatedPost.related_post_id) \
+        .filter(RelatedPost.post_id == post_id) \
+        .order_by(RelatedPost.rank).all()
+    return [{"id": related_id, "title": title, "url": f"/blog/post/{related_id}", "score": round(score, 4)}
+            for related_id, score, title in related]
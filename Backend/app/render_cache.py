@@ -0,0 +1,139 @@
+import logging
+import os
+import tempfile
+
+from flask import render_template
+
+from api.celery_app import app as celery_app
+from app.cache import cache
+from app.models import db, BlogPost
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+# Render cache settings
+SITE_URL = os.getenv('SITE_URL', 'http://localhost:5000')
+RENDER_CACHE_TIMEOUT = 7 * 24 * 3600
+# When set, rendered pages are also written to <dir>/blog/post/<id>.html for whitenoise to serve
+RENDER_CACHE_STATIC_DIR = os.getenv('RENDER_CACHE_STATIC_DIR')
+
+
+def _cache_key(post_id, updated_at):
+    """
+    Build the render cache key for a version of a blog post.
+
+    :param post_id: The ID of the blog post.
+    :param updated_at: The last modification time of the blog post.
+    :return: The cache key.
+    """
+    return f"post-html:{post_id}:{updated_at.isoformat() if updated_at else ''}"
+
+
+def _static_path(post_id):
+    """
+    Get the path of the static copy of a rendered blog post.
+
+    :param post_id: The ID of the blog post.
+    :return: The file path.
+    """
+    return os.path.join(RENDER_CACHE_STATIC_DIR, 'blog', 'post', f'{post_id}.html')
+
+
+def render_post_html(post):
+    """
+    Render the blog_post.html template for a blog post.
+
+    :param post: The BlogPost instance.
+    :return: The rendered HTML.
+    """
+    return render_template('blog_post.html', post=post, canonical_url=f"{SITE_URL}{post.get_absolute_url()}")
+
+
+def _store(post, html):
+    """
+    Store a rendered blog post in the cache and, if enabled, as a static file.
+
+    :param post: The BlogPost instance.
+    :param html: The rendered HTML.
+    """
+    cache.set(_cache_key(post.id, post.updated_at), html, timeout=RENDER_CACHE_TIMEOUT)
+    if RENDER_CACHE_STATIC_DIR:
+        path = _static_path(post.id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temporary file and rename it so readers never see a partial page.
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as static_file:
+            static_file.write(html)
+        os.replace(temp_path, path)
+
+
+def warm_post_html(post_id):
+    """
+    Render a blog post and store it in the render cache.
+
+    :param post_id: The ID of the blog post.
+    :return: True if the post was rendered, False if it does not exist.
+    """
+    post = BlogPost.query.get(post_id)
+    if not post:
+        return False
+    _store(post, render_post_html(post))
+    logger.info(f"Pre-rendered blog post {post_id}")
+    return True
+
+
+def queue_warm_post_html(post_id):
+    """
+    Queue a blog post to be pre-rendered by a Celery worker.
+
+    The task is sent by name, so the request path does not import the task
+    modules. Failing to reach the broker is logged and ignored: the post was
+    already saved and is rendered on its first view instead.
+
+    :param post_id: The ID of the blog post.
+    """
+    try:
+        celery_app.send_task('app.tasks.warm_post_html', args=[post_id])
+    except Exception as e:
+        logger.warning(f"Could not queue pre-rendering of blog post {post_id}: {e}")
+
+
+def get_post_html(post_id):
+    """
+    Get the rendered HTML of a blog post.
+
+    The current version is looked up by primary key using only the
+    ``updated_at`` column; the template is only evaluated when that version
+    has not been rendered yet.
+
+    :param post_id: The ID of the blog post.
+    :return: The rendered HTML, or None if the post does not exist.
+    """
+    version = db.session.query(BlogPost.updated_at).filter_by(id=post_id).first()
+    if version is None:
+        return None
+
+    html = cache.get(_cache_key(post_id, version.updated_at))
+    if html is None:
+        post = BlogPost.query.get(post_id)
+        html = render_post_html(post)
+        _store(post, html)
+    return html
+
+
+def remove_post_html(post_id):
+    """
+    Remove the static copy of a deleted blog post.
+
+    Cached entries need no invalidation: they are keyed by modification
+    time and are never looked up once the post is gone.
+
+    :param post_id: The ID of the blog post.
+    """
+    if RENDER_CACHE_STATIC_DIR:
+        try:
+            os.remove(_static_path(post_id))
+        except FileNotFoundError:
+            pass
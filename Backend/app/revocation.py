@@ -0,0 +1,274 @@
+import logging
+import os
+import threading
+import time
+from datetime import timedelta
+
+import redis
+from flask import current_app
+
+from app.bloom import BloomFilter
+from app.redis_client import REDIS_URL, REDIS_RETRY_INTERVAL, get_redis, mark_redis_unavailable
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+# Revocation settings
+REVOCATION_CHANNEL = 'revoked:events'
+REVOKED_JTI_PREFIX = 'revoked:jti:'
+REVOKED_USER_PREFIX = 'revoked:user:'
+# Seconds between rebuilds of the per-worker filter, which drops expired revocations
+REVOCATION_REBUILD_INTERVAL = int(os.getenv('REVOCATION_REBUILD_INTERVAL', 600))
+REVOCATION_FILTER_CAPACITY = 10000
+REVOCATION_FILTER_FP_RATE = 0.001
+DEFAULT_TOKEN_LIFETIME = timedelta(minutes=15)
+
+# Once the filter of this process has been built from Redis, every revoked jti
+# and user is in it, so a token missing from it is not revoked and is accepted
+# without asking Redis. Only filter hits are confirmed against Redis.
+_filter = BloomFilter.for_capacity(REVOCATION_FILTER_CAPACITY, REVOCATION_FILTER_FP_RATE)
+_synced_pid = None
+_sync_lock = threading.Lock()
+_listener_pid = None
+_listener_lock = threading.Lock()
+
+# Revocations made while Redis is unavailable, only known to this process
+_local_jtis = {}
+_local_valid_after = {}
+
+
+def _token_lifetime():
+    """
+    Get the lifetime of access tokens in seconds.
+
+    :return: The lifetime, or None if access tokens do not expire.
+    """
+    lifetime = current_app.config.get('JWT_ACCESS_TOKEN_EXPIRES', DEFAULT_TOKEN_LIFETIME)
+    if isinstance(lifetime, timedelta):
+        return int(lifetime.total_seconds())
+    return int(lifetime) if lifetime else None
+
+
+def _listener_client():
+    """
+    Create a Redis client for the pub/sub listener.
+
+    The shared client uses a short socket timeout, which would break the
+    blocking subscription, so the listener gets a dedicated connection.
+
+    :return: A Redis client.
+    """
+    return redis.Redis.from_url(REDIS_URL, health_check_interval=30)
+
+
+def _rebuild(client):
+    """
+    Replace the filter with one built from the revocations currently in Redis.
+
+    :param client: The Redis client.
+    """
+    members = []
+    for key in client.scan_iter(match='revoked:*:*', count=1000):
+        key = key.decode()
+        if key.startswith(REVOKED_JTI_PREFIX):
+            members.append(f"jti:{key[len(REVOKED_JTI_PREFIX):]}")
+        elif key.startswith(REVOKED_USER_PREFIX):
+            members.append(f"user:{key[len(REVOKED_USER_PREFIX):]}")
+
+    rebuilt = BloomFilter.for_capacity(max(len(members) * 2, REVOCATION_FILTER_CAPACITY), REVOCATION_FILTER_FP_RATE)
+    for member in members:
+        rebuilt.add(member)
+    for jti in _local_jtis:
+        rebuilt.add(f"jti:{jti}")
+    for user_id in _local_valid_after:
+        rebuilt.add(f"user:{user_id}")
+
+    global _filter, _synced_pid
+    _filter = rebuilt
+    _synced_pid = os.getpid()
+
+
+def _ensure_synced():
+    """
+    Build the filter of this process from Redis if it has not been built yet.
+
+    A forked worker does not trust the filter inherited from its parent.
+
+    :return: True if the filter holds every revocation, False if Redis is unavailable.
+    """
+    if _synced_pid == os.getpid():
+        return True
+    client = get_redis()
+    if client is None:
+        return False
+    with _sync_lock:
+        if _synced_pid != os.getpid():
+            try:
+                _rebuild(client)
+            except redis.RedisError as e:
+                mark_redis_unavailable(e)
+                return False
+    return True
+
+
+def _listen():
+    """
+    Keep the filter of this worker in sync with revocations made by others.
+
+    The filter is rebuilt after every (re)subscription, so revocations
+    published while the listener was disconnected are never missed.
+    """
+    while True:
+        try:
+            client = _listener_client()
+            pubsub = client.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(REVOCATION_CHANNEL)
+            _rebuild(client)
+            next_rebuild = time.monotonic() + REVOCATION_REBUILD_INTERVAL
+            while True:
+                message = pubsub.get_message(timeout=1.0)
+                if message is not None:
+                    _filter.add(message['data'].decode())
+                if time.monotonic() >= next_rebuild:
+                    _rebuild(client)
+                    next_rebuild = time.monotonic() + REVOCATION_REBUILD_INTERVAL
+        except redis.RedisError as e:
+            logger.warning(f"Token revocation listener disconnected: {e}")
+            time.sleep(REDIS_RETRY_INTERVAL)
+
+
+def _ensure_listener():
+    """
+    Start the pub/sub listener thread of this process if it is not running.
+    """
+    global _listener_pid
+    if _listener_pid == os.getpid():
+        return
+    with _listener_lock:
+        if _listener_pid != os.getpid():
+            threading.Thread(target=_listen, name='token-revocation-listener', daemon=True).start()
+            _listener_pid = os.getpid()
+
+
+def _publish(key, value, ttl, member):
+    """
+    Store a revocation in Redis and announce it to the other workers.
+
+    :param key: The Redis key of the revocation.
+    :param value: The value to store.
+    :param ttl: The TTL of the key in seconds, or None to keep it.
+    :param member: The filter member of the revocation.
+    :return: True if the revocation was stored in Redis.
+    """
+    _filter.add(member)
+    client = get_redis()
+    if client is None:
+        return False
+    try:
+        pipeline = client.pipeline()
+        pipeline.set(key, value, ex=ttl)
+        pipeline.publish(REVOCATION_CHANNEL, member)
+        pipeline.execute()
+        return True
+    except redis.RedisError as e:
+        mark_redis_unavailable(e)
+        return False
+
+
+def revoke_token(jwt_payload):
+    """
+    Revoke a single access token.
+
+    :param jwt_payload: The decoded payload of the token.
+    """
+    jti = jwt_payload['jti']
+    expires = jwt_payload.get('exp')
+    ttl = max(int(expires - time.time()), 1) if expires else None
+    if not _publish(f"{REVOKED_JTI_PREFIX}{jti}", 1, ttl, f"jti:{jti}"):
+        _local_jtis[jti] = expires
+
+
+def revoke_user_tokens(user_id):
+    """
+    Revoke every access token issued to a user until now.
+
+    Tokens issued later in the same second stay valid, since ``iat`` has a
+    resolution of one second.
+
+    :param user_id: The ID of the user.
+    """
+    valid_after = int(time.time())
+    if not _publish(f"{REVOKED_USER_PREFIX}{user_id}", valid_after, _token_lifetime(), f"user:{user_id}"):
+        _local_valid_after[str(user_id)] = valid_after
+
+
+def revoke_users_tokens(user_ids):
+    """
+    Revoke every access token issued to several users until now, in one Redis round trip.
+
+    :param user_ids: The IDs of the users.
+    """
+    valid_after = int(time.time())
+    ttl = _token_lifetime()
+    members = [f"user:{user_id}" for user_id in user_ids]
+    for member in members:
+        _filter.add(member)
+    client = get_redis()
+    if client is not None:
+        try:
+            pipeline = client.pipeline()
+            for user_id, member in zip(user_ids, members):
+                pipeline.set(f"{REVOKED_USER_PREFIX}{user_id}", valid_after, ex=ttl)
+                pipeline.publish(REVOCATION_CHANNEL, member)
+            pipeline.execute()
+            return
+        except redis.RedisError as e:
+            mark_redis_unavailable(e)
+    for user_id in user_ids:
+        _local_valid_after[str(user_id)] = valid_after
+
+
+def is_token_revoked(jwt_header, jwt_payload):
+    """
+    Check whether an access token has been revoked.
+
+    Registered as the flask_jwt_extended blocklist loader. Tokens that miss
+    the per-worker filter are accepted without a network round trip. Filter
+    hits are confirmed in Redis, and treated as revoked if Redis is down.
+    Until the filter has been built from Redis every token is a hit, so a
+    worker that starts while Redis is down rejects all tokens.
+
+    :param jwt_header: The decoded header of the token.
+    :param jwt_payload: The decoded payload of the token.
+    :return: True if the token has been revoked.
+    """
+    _ensure_listener()
+    synced = _ensure_synced()
+    jti = jwt_payload['jti']
+    user_id = str(jwt_payload[current_app.config.get('JWT_IDENTITY_CLAIM', 'sub')])
+    jti_hit = not synced or f"jti:{jti}" in _filter
+    user_hit = not synced or f"user:{user_id}" in _filter
+    if not jti_hit and not user_hit:
+        return False
+
+    if jti in _local_jtis:
+        return True
+    issued_at = jwt_payload.get('iat', 0)
+    if issued_at < _local_valid_after.get(user_id, 0):
+        return True
+
+    client = get_redis()
+    if client is None:
+        return True
+    try:
+        if jti_hit and client.exists(f"{REVOKED_JTI_PREFIX}{jti}"):
+            return True
+        if user_hit:
+            valid_after = client.get(f"{REVOKED_USER_PREFIX}{user_id}")
+            return valid_after is not None and issued_at < float(valid_after)
+        return False
+    except redis.RedisError as e:
+        mark_redis_unavailable(e)
+        return True
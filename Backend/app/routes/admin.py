@@ -1,7 +1,19 @@
-from flask import Blueprint, request, jsonify
+import io
+from datetime import datetime
+from itertools import islice
+
+from flask import Blueprint, current_app, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.models import db, User
 from app.activity_logger import log_user_activity
+from app.admin_stats import get_stats, increment_stats
+from app.authz import bump_authz_version
+from app.permissions import Permission, require_permission
+from app.revocation import revoke_user_tokens
+from app.user_admin import (USER_PAGE_SIZE, USER_PAGE_SIZE_MAX, list_users, count_users, iter_user_id_chunks,
+                             bulk_update_users, soft_delete_users, queue_purge_deleted_users)
+from app.provisioning import PROVISION_FORMATS, PROVISION_MAX_UPLOAD_ROWS, detect_format, read_user_records
+from app.tasks import provision_uploaded_users
 
 
 admin = Blueprint('admin', __name__)
@@ -17,58 +29,180 @@ def admin_home():
     return jsonify({'msg': 'Admin Home'}), 200
 
 
-def is_admin(user_id):
+def _bool_arg(name):
     """
-    Check if the user is an admin.
+    Read an optional boolean query parameter.
 
-    :param user_id: The ID of the user.
-    :return: True if the user is an admin, False otherwise.
+    :param name: The name of the parameter.
+    :return: True, False, or None if the parameter is missing.
     """
-    user = User.query.get(user_id)
-    return user.is_admin if user else False
+    value = request.args.get(name)
+    if value is None:
+        return None
+    return value.lower() in ('1', 'true', 'yes')
+
+
+@admin.route('/stats', methods=['GET'])
+@jwt_required()
+@require_permission(Permission.VIEW_STATS, 'Admin Access required')
+def get_admin_stats():
+    """
+    Retrieve the totals for the admin dashboard.
+
+    The totals are maintained with every write and recomputed hourly, so
+    loading them is a single row read.
+
+    **Headers:**
+    Authorization: Bearer your_jwt_token
+
+    **Response:**
+    ```json
+    {
+      "user_count": 1200,
+      "post_count": 340,
+      "activity_log_count": 98000,
+      "notification_count": 5200,
+      "reconciled_at": "2024-01-01T12:00:00"
+    }
+    ```
+    """
+    return jsonify(get_stats()), 200
 
 
 @admin.route('/users', methods=['GET'])
 @jwt_required()
+@require_permission(Permission.MANAGE_USERS, 'Admin Access required')
 def get_users():
     """
-    Retrieve a list of users.
+    Retrieve a page of users, optionally filtered.
+
+    Pages are requested with ``after_id`` set to the ``next_after_id`` of the
+    previous page. ``limit`` sets the page size (default 50, at most 200).
+    ``is_active``, ``is_admin`` and ``role`` filter the users; ``total`` counts
+    every user matching the filters and may be up to a minute old.
+
+    **Headers:**
+    Authorization: Bearer your_jwt_token
+
+    **Response:**
+    ```json
+    {
+      "users": [
+        {
+          "id": 1,
+          "username": "john_doe",
+          "email": "john@example.com",
+          "is_admin": false,
+          "is_active": true
+        }
+      ],
+      "next_after_id": 1,
+      "total": 120
+    }
+    ```
+    """
+    current_user_id = get_jwt_identity()
+    after_id = request.args.get('after_id', type=int)
+    limit = min(max(request.args.get('limit', USER_PAGE_SIZE, type=int), 1), USER_PAGE_SIZE_MAX)
+    filters = {'is_active': _bool_arg('is_active'), 'is_admin': _bool_arg('is_admin'),
+               'role': request.args.get('role')}
+    users, next_after_id = list_users(after_id=after_id, limit=limit, **filters)
+    if after_id is None:
+        # Log browsing sessions, not every page turned
+        log_user_activity(current_user_id, 'Retrieved user list')
+    return jsonify({
+        'users': [{"id": user.id, "username": user.username, "email": user.get_email(),
+                   "is_admin": user.is_admin, "is_active": user.is_active} for user in users],
+        'next_after_id': next_after_id,
+        'total': count_users(**filters),
+    }), 200
+
+
+@admin.route('/users/bulk', methods=['POST'])
+@jwt_required()
+@require_permission(Permission.MANAGE_USERS, 'Admin Access required')
+def bulk_provision_users():
+    """
+    Create users from an uploaded CSV or NDJSON file.
+
+    The file is sent either as the ``file`` field of a multipart form or as
+    the raw request body. CSV files need a ``username,email,password``
+    header; NDJSON files hold one JSON object with those keys per line. The
+    format is taken from the ``format`` query parameter, the file name or the
+    content type. Files with more than ``PROVISION_MAX_UPLOAD_ROWS`` rows are
+    rejected with 413; import them with ``flask provision-users``.
+
+    The users are created by a background task; poll
+    ``/users/bulk/<task_id>`` for its report.
 
     **Headers:**
     Authorization: Bearer your_jwt_token
 
     **Response:**
     ```json
-    [
-      {
-        "id": 1,
-        "username": "john_doe",
-        "email": "john@example.com",
-        "is_admin": false
-      },
-      {
-        "id": 2,
-        "username": "jane_doe",
-        "email": "jane@example.com",
-        "is_admin": true
-      }
-    ]
+    {
+      "task_id": "d9b1c6a2-5f0e-4c1b-9a57-3f7e2b8c4d10",
+      "rows": 3
+    }
     ```
     """
     current_user_id = get_jwt_identity()
-    if not is_admin(current_user_id):
-        return jsonify({'msg': 'Admin Access required'}), 403
+    upload = request.files.get('file')
+    # TextIOWrapper needs a readable() stream, which SpooledTemporaryFile lacks before Python 3.11
+    stream = io.BytesIO(upload.read() if upload else request.get_data())
+    file_format = request.args.get('format') or detect_format(upload.filename if upload else None,
+                                                              upload.content_type if upload else request.content_type)
+    if file_format not in PROVISION_FORMATS:
+        return jsonify({'msg': f"Unsupported format, use one of {', '.join(PROVISION_FORMATS)}"}), 400
+
+    records = list(islice(read_user_records(stream, file_format), PROVISION_MAX_UPLOAD_ROWS + 1))
+    if len(records) > PROVISION_MAX_UPLOAD_ROWS:
+        return jsonify({'msg': f"Files with more than {PROVISION_MAX_UPLOAD_ROWS} users must be imported "
+                               f"with flask provision-users"}), 413
+
+    try:
+        task = provision_uploaded_users.delay(records)
+    except Exception as e:
+        current_app.logger.error(f"Could not queue bulk provisioning: {e}")
+        return jsonify({'msg': 'The import could not be queued, try again later'}), 503
+    log_user_activity(current_user_id, f"Queued bulk provisioning of {len(records)} rows")
+    return jsonify({'task_id': task.id, 'rows': len(records)}), 202
+
+
+@admin.route('/users/bulk/<task_id>', methods=['GET'])
+@jwt_required()
+@require_permission(Permission.MANAGE_USERS, 'Admin Access required')
+def bulk_provision_status(task_id):
+    """
+    Get the status of a bulk user import.
+
+    **Headers:**
+    Authorization: Bearer your_jwt_token
 
-    page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 10, type=int)
-    users = User.query.paginate(page=page, per_page=per_page)
-    log_user_activity(current_user_id, 'Retrieved user list')
-    return jsonify([{"id": user.id, "username": user.username,
-                     "email": user.email, "is_admin": user.is_admin} for user in users.items]), 200
+    **Response:**
+    ```json
+    {
+      "status": "SUCCESS",
+      "report": {
+        "created": 2,
+        "errors": [
+          {"line": 3, "username": "john_doe", "error": "Username already exists"}
+        ]
+      }
+    }
+    ```
+    """
+    result = provision_uploaded_users.AsyncResult(task_id)
+    if not result.ready():
+        return jsonify({'status': result.status}), 200
+    if result.failed():
+        return jsonify({'status': result.status, 'msg': 'The import failed'}), 500
+    return jsonify({'status': result.status, 'report': result.result}), 200
 
 
 @admin.route('/users/<int:user_id>', methods=['PUT'])
 @jwt_required()
+@require_permission(Permission.MANAGE_USERS | Permission.MANAGE_ROLES, 'Admin Access required')
 def update_user(user_id):
     """
     Update an existing user.
@@ -91,15 +225,14 @@ def update_user(user_id):
     ```
     """
     current_user_id = get_jwt_identity()
-    if not is_admin(current_user_id):
-        return jsonify({'msg': 'Admin Access required'}), 403
-
     user = User.query.get(user_id)
-    if not user:
+    if not user or user.deleted_at:
         return jsonify({'msg': 'User not found'}), 404
 
     data = request.get_json()
-    user.is_admin = data.get('is_admin', user.is_admin)
+    if data.get('is_admin', user.is_admin) != user.is_admin:
+        user.is_admin = data['is_admin']
+        bump_authz_version(user)
     db.session.commit()
     log_user_activity(current_user_id, f'Updated user {user_id}')
 
@@ -108,6 +241,7 @@ def update_user(user_id):
 
 @admin.route('/users/<int:user_id>', methods=['DELETE'])
 @jwt_required()
+@require_permission(Permission.MANAGE_USERS, 'Admin Access required')
 def delete_user(user_id):
     """
     Delete an existing user.
@@ -123,15 +257,18 @@ def delete_user(user_id):
     ```
     """
     current_user_id = get_jwt_identity()
-    if not is_admin(current_user_id):
-        return jsonify({'msg': 'Admin Access required'}), 403
-
     user = User.query.get(user_id)
-    if not user:
+    if not user or user.deleted_at:
         return jsonify({'msg': 'User not found'}), 404
 
-    db.session.delete(user)
+    # The user's rows are removed by a background purge, so the request does not load them
+    user.deleted_at = datetime.utcnow()
+    user.is_active = False
+    bump_authz_version(user)
+    increment_stats(user_count=-1)
     db.session.commit()
+    revoke_user_tokens(user_id)
+    queue_purge_deleted_users()
     log_user_activity(current_user_id, f'Deleted user {user_id}')
 
     return jsonify({"msg": "User deleted successfully"}), 200
@@ -139,6 +276,7 @@ def delete_user(user_id):
 
 @admin.route('/users/<int:user_id>/activate', methods=['PUT'])
 @jwt_required()
+@require_permission(Permission.MANAGE_USERS, 'Admin Access required')
 def activate_user(user_id):
     """
     Activate a user account.
@@ -154,14 +292,12 @@ def activate_user(user_id):
     ```
     """
     current_user_id = get_jwt_identity()
-    if not is_admin(current_user_id):
-        return jsonify({'msg': 'Admin Access required'}), 403
-
     user = User.query.get(user_id)
-    if not user:
+    if not user or user.deleted_at:
         return jsonify({'msg': 'User not found'}), 404
 
     user.is_active = True
+    bump_authz_version(user)
     db.session.commit()
     log_user_activity(current_user_id, f'Activated user {user_id}')
 
@@ -170,6 +306,7 @@ def activate_user(user_id):
 
 @admin.route('/users/<int:user_id>/deactivate', methods=['PUT'])
 @jwt_required()
+@require_permission(Permission.MANAGE_USERS, 'Admin Access required')
 def deactivate_user(user_id):
     """
     Deactivate a user account.
@@ -185,15 +322,184 @@ def deactivate_user(user_id):
     ```
     """
     current_user_id = get_jwt_identity()
-    if not is_admin(current_user_id):
-        return jsonify({'msg': 'Admin Access required'}), 403
-
     user = User.query.get(user_id)
-    if not user:
+    if not user or user.deleted_at:
         return jsonify({'msg': 'User not found'}), 404
 
     user.is_active = False
+    bump_authz_version(user)
     db.session.commit()
+    revoke_user_tokens(user_id)
     log_user_activity(current_user_id, f'Deactivated user {user_id}')
 
     return jsonify({"msg": "User deactivated successfully"}), 200
+
+
+def _bulk_selection(current_user_id):
+    """
+    Read the users selected by a bulk request.
+
+    The request body holds either ``ids``, a list of user IDs, or ``filter``,
+    an object with at least one of ``is_active``, ``is_admin`` and ``role``.
+    The acting admin is never selected.
+
+    :param current_user_id: The ID of the acting admin.
+    :return: Tuple of a generator of ID chunks and an error response, one of them None.
+    """
+    data = request.get_json() or {}
+    ids = data.get('ids')
+    filters = data.get('filter')
+    if ids is not None:
+        if not isinstance(ids, list) or not all(isinstance(user_id, int) for user_id in ids):
+            return None, (jsonify({'msg': 'ids must be a list of user IDs'}), 400)
+        return iter_user_id_chunks(ids=ids, exclude_id=current_user_id), None
+    if isinstance(filters, dict):
+        filters = {key: filters[key] for key in ('is_active', 'is_admin', 'role') if filters.get(key) is not None}
+        if filters:
+            return iter_user_id_chunks(filters=filters, exclude_id=current_user_id), None
+    return None, (jsonify({'msg': 'Provide ids or a non-empty filter'}), 400)
+
+
+@admin.route('/users/bulk/update', methods=['PUT'])
+@jwt_required()
+@require_permission(Permission.MANAGE_USERS | Permission.MANAGE_ROLES, 'Admin Access required')
+def bulk_update_users_route():
+    """
+    Update the admin flag of many users.
+
+    **Headers:**
+    Authorization: Bearer your_jwt_token
+
+    **Request:**
+    ```json
+    {
+      "ids": [3, 4, 5],
+      "is_admin": false
+    }
+    ```
+
+    **Response:**
+    ```json
+    {
+      "msg": "Users updated successfully",
+      "count": 3
+    }
+    ```
+    """
+    current_user_id = get_jwt_identity()
+    is_admin_value = (request.get_json() or {}).get('is_admin')
+    if not isinstance(is_admin_value, bool):
+        return jsonify({'msg': 'is_admin must be true or false'}), 400
+    chunks, error = _bulk_selection(current_user_id)
+    if error:
+        return error
+
+    count = bulk_update_users(chunks, {'is_admin': is_admin_value})
+    log_user_activity(current_user_id, f'Bulk updated {count} users (is_admin={is_admin_value})')
+    return jsonify({"msg": "Users updated successfully", "count": count}), 200
+
+
+@admin.route('/users/bulk/activate', methods=['PUT'])
+@jwt_required()
+@require_permission(Permission.MANAGE_USERS, 'Admin Access required')
+def bulk_activate_users():
+    """
+    Activate many user accounts.
+
+    **Headers:**
+    Authorization: Bearer your_jwt_token
+
+    **Request:**
+    ```json
+    {
+      "ids": [3, 4, 5]
+    }
+    ```
+
+    **Response:**
+    ```json
+    {
+      "msg": "Users activated successfully",
+      "count": 3
+    }
+    ```
+    """
+    current_user_id = get_jwt_identity()
+    chunks, error = _bulk_selection(current_user_id)
+    if error:
+        return error
+
+    count = bulk_update_users(chunks, {'is_active': True})
+    log_user_activity(current_user_id, f'Bulk activated {count} users')
+    return jsonify({"msg": "Users activated successfully", "count": count}), 200
+
+
+@admin.route('/users/bulk/deactivate', methods=['PUT'])
+@jwt_required()
+@require_permission(Permission.MANAGE_USERS, 'Admin Access required')
+def bulk_deactivate_users():
+    """
+    Deactivate many user accounts and revoke their access tokens.
+
+    **Headers:**
+    Authorization: Bearer your_jwt_token
+
+    **Request:**
+    ```json
+    {
+      "filter": {"is_active": true, "role": "spam"}
+    }
+    ```
+
+    **Response:**
+    ```json
+    {
+      "msg": "Users deactivated successfully",
+      "count": 1200
+    }
+    ```
+    """
+    current_user_id = get_jwt_identity()
+    chunks, error = _bulk_selection(current_user_id)
+    if error:
+        return error
+
+    count = bulk_update_users(chunks, {'is_active': False}, revoke_tokens=True)
+    log_user_activity(current_user_id, f'Bulk deactivated {count} users')
+    return jsonify({"msg": "Users deactivated successfully", "count": count}), 200
+
+
+@admin.route('/users/bulk/delete', methods=['POST'])
+@jwt_required()
+@require_permission(Permission.MANAGE_USERS, 'Admin Access required')
+def bulk_delete_users_route():
+    """
+    Delete many users.
+
+    **Headers:**
+    Authorization: Bearer your_jwt_token
+
+    **Request:**
+    ```json
+    {
+      "ids": [3, 4, 5]
+    }
+    ```
+
+    **Response:**
+    ```json
+    {
+      "msg": "Users deleted successfully",
+      "count": 3
+    }
+    ```
+    """
+    current_user_id = get_jwt_identity()
+    chunks, error = _bulk_selection(current_user_id)
+    if error:
+        return error
+
+    count = soft_delete_users(chunks)
+    queue_purge_deleted_users()
+    log_user_activity(current_user_id, f'Bulk deleted {count} users')
+    return jsonify({"msg": "Users deleted successfully", "count": count}), 200
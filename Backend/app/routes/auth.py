@@ -1,21 +1,20 @@
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
+from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity, get_jwt
 import pyotp
-from datetime import datetime, timedelta
+from datetime import datetime
 
 from app.models import db, User
 from app.activity_logger import log_user_activity
+from app.admin_stats import increment_stats
+from app.login_throttle import login_throttle
+from app.authz import authz_claims
+from app.revocation import revoke_token, revoke_user_tokens
 from app.utils import generate_password_reset_token, verify_password_reset_token, send_password_reset_email
 
 
 auth = Blueprint('auth', __name__)
 
 
-# Account lockout settings
-MAX_FAILED_ATTEMPTS = 5
-LOCKOUT_TIME = timedelta(minutes=15)
-
-
 @auth.route('/')
 def auth_home():
     """
@@ -41,13 +40,15 @@ def register():
     if User.query.filter_by(username=username).first():
         return jsonify({'message': 'Username already exists'}), 400
 
-    if User.query.filter_by(email=email).first():
+    if User.find_by_email(email, include_deleted=True):
         return jsonify({'message': 'Email already exists'}), 400
 
-    new_user = User(username=username, email=email)
+    new_user = User(username=username)
+    new_user.set_email(email)
     new_user.set_password(password)
     new_user.mfa_secret = pyotp.random_base32()
     db.session.add(new_user)
+    increment_stats(user_count=1)
     db.session.commit()
 
     log_user_activity(new_user.id, 'User registered')
@@ -63,34 +64,49 @@ def login():
     :return: JSON response with an access token or error message.
     """
     data = request.get_json()
-    user = User.query.filter_by(username=data.get('username')).first()
+    username = data.get('username')
 
-    if user:
-        if user.failed_attempts >= MAX_FAILED_ATTEMPTS and datetime.utcnow() < user.lockout_until:
-            return jsonify({'message': 'Account locked. Try again later.'}), 403
+    # Failed attempts are only counted in Redis, so only a successful login writes to the database
+    retry_after = login_throttle.lockout_remaining(username, request.remote_addr)
+    if retry_after:
+        return jsonify({'message': 'Account locked. Try again later.'}), 403, {'Retry-After': str(retry_after)}
 
+    user = User.query.filter_by(username=username, deleted_at=None).first()
+
+    if user:
         if user.check_password(data.get('password')):
-            otp = data.get('otp')
-            totp = pyotp.TOTP(user.mfa_secret)
-            if totp.verify(otp):
-                access_token = create_access_token(identity=user.id)
+            # Users who have not enrolled in 2FA, such as provisioned users, log in without an OTP
+            if not user.mfa_secret or pyotp.TOTP(user.mfa_secret).verify(data.get('otp')):
+                access_token = create_access_token(identity=user.id, additional_claims=authz_claims(user))
                 log_user_activity(user.id, 'User logged in')
-                user.failed_attempts = 0
+                login_throttle.record_success(username)
                 user.last_login = datetime.utcnow()
                 db.session.commit()
                 return jsonify({'access_token': access_token}), 200
             else:
-                user.failed_attempts += 1
-                db.session.commit()
+                login_throttle.record_failure(username, request.remote_addr)
                 return jsonify({'message': 'Invalid OTP'}), 401
         else:
-            user.failed_attempts += 1
-            db.session.commit()
+            login_throttle.record_failure(username, request.remote_addr)
             return jsonify({'message': 'Invalid login credentials'}), 401
 
+    login_throttle.record_failure(username, request.remote_addr)
     return jsonify({'message': 'Invalid login credentials'}), 401
 
 
+@auth.route('/logout', methods=['POST'])
+@jwt_required()
+def logout():
+    """
+    Revoke the access token used for the request.
+
+    :return: JSON response with a message.
+    """
+    revoke_token(get_jwt())
+    log_user_activity(get_jwt_identity(), 'User logged out')
+    return jsonify({'message': 'Logged out successfully'}), 200
+
+
 @auth.route('/profile', methods=['GET'])
 @jwt_required()
 def profile():
@@ -102,7 +118,7 @@ def profile():
     current_user = get_jwt_identity()
     user = User.query.get(current_user)
     log_user_activity(current_user, 'Viewed profile')
-    return jsonify({'username': user.username, 'email': user.email, 'is_admin': user.is_admin}), 200
+    return jsonify({'username': user.username, 'email': user.get_email(), 'is_admin': user.is_admin}), 200
 
 
 @auth.route('/enable_2fa', methods=['POST'])
@@ -150,11 +166,11 @@ def request_password_reset():
     """
     data = request.get_json()
     email = data.get('email')
-    user = User.query.filter_by(email=email).first()
+    user = User.find_by_email(email)
 
     if user:
         token = generate_password_reset_token(user.id)
-        send_password_reset_email(user.email, token)
+        send_password_reset_email(email, token)
         log_user_activity(user.id, 'Requested password reset')
         return jsonify({'message': 'Password reset email sent'}), 200
 
@@ -179,6 +195,7 @@ def reset_password():
         user.password_reset_token = None
         user.password_reset_token_expiry = None
         db.session.commit()
+        revoke_user_tokens(user.id)
         log_user_activity(user.id, 'Password reset successfully')
         return jsonify({'message': 'Password reset successfully'}), 200
 
@@ -1,21 +1,21 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from app.models import db, BlogPost, User
-from flask_caching import Cache
+from app.models import db, BlogPost, RelatedPost, SocialMediaShare, SHARE_PLATFORMS
 from marshmallow import ValidationError
 from app.schemas import blog_post_schema
 from app.activity_logger import log_user_activity
+from app.related_posts import get_related_posts
+from app.view_counter import record_view, get_view_count
+from app import trending
+from app.share_counters import add_share
+from app.render_cache import get_post_html, remove_post_html, queue_warm_post_html
+from app.cache import cache
+from app.permissions import Permission, has_permission, require_permission
+from app.admin_stats import increment_stats
 from app import app
 
 
 blog = Blueprint('blog', __name__)
-cache = Cache(config={'CACHE_TYPE': 'redis', 'CACHE_REDIS_URL': 'redis://localhost:6379/1'})
-cache.init_app(app)
-
-
-def can_post(user_id):
-    user = User.query.get(user_id)
-    return user.is_admin if user else False
 
 
 @blog.route('/post', methods=['GET'])
@@ -32,7 +32,15 @@ def get_posts():
         "title": "New Blog Post",
         "content": "This is the content of the new blog post.",
         "author": "john_doe",
-        "url": "/blog/post/1"
+        "url": "/blog/post/1",
+        "shares": {
+          "facebook": 2,
+          "twitter": 5,
+          "linkedin": 0,
+          "reddit": 1,
+          "email": 0,
+          "total": 8
+        }
       }
     ]
     ```
@@ -40,11 +48,145 @@ def get_posts():
     posts = BlogPost.query.all()
     app.logger.info("Retrieved all blog posts")
     return jsonify([{"id": post.id, "title": post.title,
-                     "content": post.content, "author": post.author.username, "url": post.get_absolute_url()} for post in posts]), 200
+                     "content": post.content, "author": post.author.username, "url": post.get_absolute_url(),
+                     "shares": post.get_share_counts()} for post in posts]), 200
+
+
+@blog.route('/post/<int:post_id>', methods=['GET'])
+def get_post(post_id):
+    """
+    Retrieve a single blog post together with its related posts.
+
+    **Response:**
+    ```json
+    {
+      "id": 1,
+      "title": "New Blog Post",
+      "content": "This is the content of the new blog post.",
+      "author": "john_doe",
+      "url": "/blog/post/1",
+      "views": 42,
+      "shares": {
+        "facebook": 2,
+        "twitter": 5,
+        "linkedin": 0,
+        "reddit": 1,
+        "email": 0,
+        "total": 8
+      },
+      "related": [
+        {
+          "id": 7,
+          "title": "Another Blog Post",
+          "url": "/blog/post/7",
+          "score": 0.4182
+        }
+      ]
+    }
+    ```
+    """
+    post = BlogPost.query.get(post_id)
+    if not post:
+        return jsonify({"msg": "Post not found"}), 404
+
+    record_view(post.id)
+    trending.record_view(post.id)
+    return jsonify({"id": post.id, "title": post.title, "content": post.content,
+                    "author": post.author.username, "url": post.get_absolute_url(),
+                    "views": get_view_count(post), "shares": post.get_share_counts(),
+                    "related": get_related_posts(post.id)}), 200
+
+
+@blog.route('/post/<int:post_id>.html', methods=['GET'])
+def get_post_page(post_id):
+    """
+    Serve the rendered HTML page of a blog post.
+
+    Pages are pre-rendered by a background job after every write and cached
+    per post and modification time, so a request normally costs one
+    primary-key lookup and one cache read.
+
+    :param post_id: The ID of the blog post.
+    :return: HTML response with the rendered blog post.
+    """
+    html = get_post_html(post_id)
+    if html is None:
+        return jsonify({"msg": "Post not found"}), 404
+
+    record_view(post_id)
+    trending.record_view(post_id)
+    return Response(html, mimetype='text/html')
+
+
+@blog.route('/post/<int:post_id>/share', methods=['POST'])
+@jwt_required()
+def share_post(post_id):
+    """
+    Record a social media share of a blog post.
+
+    **Headers:**
+    Authorization: Bearer your_jwt_token
+
+    **Request:**
+    ```json
+    {
+      "platform": "twitter"
+    }
+    ```
+
+    **Response:**
+    ```json
+    {
+      "msg": "Share recorded",
+      "url": "/blog/post/1"
+    }
+    ```
+    """
+    post = BlogPost.query.get(post_id)
+    if not post:
+        return jsonify({"msg": "Post not found"}), 404
+
+    platform = (request.get_json() or {}).get('platform', '')
+    if platform not in SHARE_PLATFORMS:
+        return jsonify({"msg": f"Platform must be one of: {', '.join(SHARE_PLATFORMS)}"}), 400
+
+    add_share(post.id, platform)
+    db.session.commit()
+    trending.record_share(post.id)
+
+    return jsonify({"msg": "Share recorded", "url": post.get_absolute_url()}), 201
+
+
+@blog.route('/trending', methods=['GET'])
+def get_trending():
+    """
+    Retrieve the currently trending blog posts.
+
+    Posts are ranked by a time-decayed score of their recent shares and
+    views, served from a sorted set rather than aggregated per request.
+
+    **Request:**
+    `GET /blog/trending?limit=10`
+
+    **Response:**
+    ```json
+    [
+      {
+        "id": 1,
+        "title": "New Blog Post",
+        "url": "/blog/post/1",
+        "score": 12.5
+      }
+    ]
+    ```
+    """
+    limit = min(max(request.args.get('limit', 10, type=int), 1), 100)
+    return jsonify(trending.get_trending_posts(limit)), 200
 
 
 @blog.route('/post', methods=['POST'])
 @jwt_required()
+@require_permission(Permission.CREATE_POST, "You don't have the permission to post")
 def create_post():
     """
     Create a new blog post.
@@ -69,9 +211,6 @@ def create_post():
     ```
     """
     current_user_id = get_jwt_identity()
-    if not can_post(current_user_id):
-        return jsonify({"msg": "You don't have the permission to post"}), 403
-
     data = request.get_json()
     try:
         blog_post_schema.load(data)
@@ -80,10 +219,12 @@ def create_post():
 
     new_post = BlogPost(title=data['title'], content=data['content'], author_id=current_user_id)
     db.session.add(new_post)
+    increment_stats(post_count=1)
     db.session.commit()
 
     cache.delete_memoized(get_posts)
     cache.delete_memoized(search_posts)
+    queue_warm_post_html(new_post.id)
 
     app.logger.info(f"User {current_user_id} created a new post with ID {new_post.id}")
     log_user_activity(current_user_id, f'Created a new post with ID {new_post.id}')
@@ -121,7 +262,7 @@ def update_post(post_id):
     if not post:
         return jsonify({"msg": "Post not found"}), 404
 
-    if post.author_id != current_user_id and not can_post(current_user_id):
+    if post.author_id != current_user_id and not has_permission(current_user_id, Permission.EDIT_ANY_POST):
         return jsonify({"msg": "You don't have the permission to update this post"}), 403
 
     data = request.get_json()
@@ -136,6 +277,7 @@ def update_post(post_id):
 
     cache.delete_memoized(get_posts)
     cache.delete_memoized(search_posts)
+    queue_warm_post_html(post_id)
 
     app.logger.info(f"User {current_user_id} updated post with ID {post_id}")
     log_user_activity(current_user_id, f'Updated post with ID {post_id}')
@@ -165,14 +307,18 @@ def delete_post(post_id):
     if not post:
         return jsonify({"msg": "Post not found"}), 404
 
-    if post.author_id != current_user_id and not can_post(current_user_id):
+    if post.author_id != current_user_id and not has_permission(current_user_id, Permission.DELETE_ANY_POST):
         return jsonify({"msg": "You don't have the permission to delete this post"}), 403
 
+    RelatedPost.query.filter_by(post_id=post_id).delete(synchronize_session=False)
+    SocialMediaShare.query.filter_by(post_id=post_id).delete(synchronize_session=False)
     db.session.delete(post)
+    increment_stats(post_count=-1)
     db.session.commit()
 
     cache.delete_memoized(get_posts)
     cache.delete_memoized(search_posts)
+    remove_post_html(post_id)
 
     app.logger.info(f"User {current_user_id} deleted post with ID {post_id}")
     log_user_activity(current_user_id, f'Deleted post with ID {post_id}')
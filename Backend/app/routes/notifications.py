@@ -1,33 +1,118 @@
+from datetime import datetime, timezone
+
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.models import db, Notification
+from app.admin_stats import increment_stats
+from app.unread_counter import adjust_unread_count, get_unread_count
+from app.notification_feed import FEED_PAGE_SIZE, FEED_PAGE_SIZE_MAX, list_notifications
 
 
 notifications_bp = Blueprint('notifications', __name__)
 
 
+@notifications_bp.route('/notifications/feed', methods=['GET'])
+@jwt_required()
+def notification_feed():
+    """
+    Retrieve a page of the authenticated user's notifications, newest first.
+
+    Pages are requested with ``cursor`` set to the ``next_cursor`` of the
+    previous page. ``limit`` sets the page size (default 20, at most 100)
+    and ``unread_only=true`` leaves out read notifications.
+
+    **Headers:**
+    Authorization: Bearer your_jwt_token
+
+    **Response:**
+    ```json
+    {
+      "notifications": [
+        {
+          "id": 42,
+          "message": "New comment on your post",
+          "timestamp": "2023-08-02T09:21:45",
+          "is_read": false
+        }
+      ],
+      "next_cursor": "1690968105000000_42"
+    }
+    ```
+    """
+    user_id = get_jwt_identity()
+    limit = min(max(request.args.get('limit', FEED_PAGE_SIZE, type=int), 1), FEED_PAGE_SIZE_MAX)
+    unread_only = request.args.get('unread_only', '').lower() in ('1', 'true', 'yes')
+
+    try:
+        notifications, next_cursor = list_notifications(user_id, request.args.get('cursor'), limit, unread_only)
+    except ValueError:
+        return jsonify({"msg": "Invalid cursor"}), 400
+
+    return jsonify({
+        "notifications": [{
+            "id": notification.id,
+            "message": notification.message,
+            "timestamp": notification.timestamp.isoformat(),
+            "is_read": notification.is_read,
+        } for notification in notifications],
+        "next_cursor": next_cursor,
+    }), 200
+
+
 @notifications_bp.route('/notifications/mark_as_read', methods=['POST'])
 @jwt_required()
 def mark_as_read():
     """
     Mark notifications as read for the authenticated user.
 
-    :return: JSON response with a message.
+    :return: JSON response with a message and the number of notifications that were unread.
     """
     user_id = get_jwt_identity()
     notification_ids = request.json.get('notification_ids', [])
-    
+
     if not notification_ids:
         return jsonify({"msg": "No notification IDs provided"}), 400
 
-    notifications = Notification.query.filter(Notification.id.in_(notification_ids), Notification.user_id == user_id).all()
-    
-    for notification in notifications:
-        notification.is_read = True
+    count = Notification.query.filter(Notification.id.in_(notification_ids), Notification.user_id == user_id,
+                                      Notification.is_read.is_(False)) \
+        .update({'is_read': True}, synchronize_session=False)
+    adjust_unread_count(user_id, -count)
+    db.session.commit()
+
+    return jsonify({"msg": "Notifications marked as read", "count": count}), 200
+
+
+@notifications_bp.route('/notifications/mark_all_read', methods=['POST'])
+@jwt_required()
+def mark_all_as_read():
+    """
+    Mark every notification of the authenticated user up to a point in time as read.
+
+    ``before`` is an ISO 8601 timestamp; notifications created after it, such
+    as ones that arrived after the page was loaded, stay unread. It defaults
+    to the current time.
 
+    :return: JSON response with a message and the number of notifications marked as read.
+    """
+    user_id = get_jwt_identity()
+    before = (request.get_json(silent=True) or {}).get('before')
+    if before:
+        try:
+            before = datetime.fromisoformat(before.replace('Z', '+00:00'))
+        except (AttributeError, TypeError, ValueError):
+            return jsonify({"msg": "Invalid timestamp"}), 400
+        if before.tzinfo is not None:
+            before = before.astimezone(timezone.utc).replace(tzinfo=None)
+    else:
+        before = datetime.utcnow()
+
+    count = Notification.query.filter(Notification.user_id == user_id, Notification.is_read.is_(False),
+                                      Notification.timestamp <= before) \
+        .update({'is_read': True}, synchronize_session=False)
+    adjust_unread_count(user_id, -count)
     db.session.commit()
-    
-    return jsonify({"msg": "Notifications marked as read"}), 200
+
+    return jsonify({"msg": "Notifications marked as read", "count": count}), 200
 
 
 @notifications_bp.route('/notifications/delete', methods=['DELETE'])
@@ -36,19 +121,33 @@ def delete_notifications():
     """
     Delete notifications for the authenticated user.
 
-    :return: JSON response with a message.
+    :return: JSON response with a message and the number of notifications deleted.
     """
     user_id = get_jwt_identity()
     notification_ids = request.json.get('notification_ids', [])
-    
+
     if not notification_ids:
         return jsonify({"msg": "No notification IDs provided"}), 400
 
-    notifications = Notification.query.filter(Notification.id.in_(notification_ids), Notification.user_id == user_id).all()
-    
-    for notification in notifications:
-        db.session.delete(notification)
-
+    # Unread and read notifications are deleted separately to know how many unread ones went away
+    selected = Notification.query.filter(Notification.id.in_(notification_ids), Notification.user_id == user_id)
+    unread = selected.filter(Notification.is_read.is_(False)).delete(synchronize_session=False)
+    count = unread + selected.delete(synchronize_session=False)
+    adjust_unread_count(user_id, -unread)
+    increment_stats(notification_count=-count)
     db.session.commit()
-    
-    return jsonify({"msg": "Notifications deleted"}), 200
+
+    return jsonify({"msg": "Notifications deleted", "count": count}), 200
+
+
+@notifications_bp.route('/notifications/unread_count', methods=['GET'])
+@jwt_required()
+def unread_count():
+    """
+    Get the number of unread notifications of the authenticated user.
+
+    The count is served from a counter, so polling it does not query the notifications.
+
+    :return: JSON response with the unread count.
+    """
+    return jsonify({"unread_count": get_unread_count(get_jwt_identity())}), 200
@@ -0,0 +1,61 @@
+from flask import Blueprint, Response, abort, request
+from app.sitemaps import segment_fingerprints, render_sitemap_index, render_sitemap_segment
+from app.cache import cache
+
+
+sitemap = Blueprint('sitemap', __name__)
+
+
+# Seconds the per-segment summaries are reused before checking for changed posts
+FINGERPRINT_CACHE_TIMEOUT = 60
+# Rendered segments are keyed by their fingerprint, so they can live for long
+SEGMENT_CACHE_TIMEOUT = 7 * 24 * 3600
+
+
+def get_fingerprints():
+    """
+    Get the sitemap segment summaries, cached for a short time.
+
+    :return: List of (segment, post_count, last_modified) tuples.
+    """
+    fingerprints = cache.get('sitemap:fingerprints')
+    if fingerprints is None:
+        fingerprints = segment_fingerprints()
+        cache.set('sitemap:fingerprints', fingerprints, timeout=FINGERPRINT_CACHE_TIMEOUT)
+    return fingerprints
+
+
+@sitemap.route('/sitemap.xml', methods=['GET'])
+def sitemap_index():
+    """
+    Serve the sitemap index pointing at the gzipped sitemap segments.
+
+    :return: XML response with the sitemap index.
+    """
+    base_url = request.host_url.rstrip('/')
+    return Response(render_sitemap_index(base_url, get_fingerprints()), mimetype='application/xml')
+
+
+@sitemap.route('/sitemap-<int:segment>.xml.gz', methods=['GET'])
+def sitemap_segment(segment):
+    """
+    Serve a pre-rendered, gzipped sitemap segment.
+
+    Segments are cached under their post count and latest modification
+    time, so a segment is only rendered again after one of its posts changes.
+
+    :param segment: The segment number.
+    :return: Gzipped XML response with the sitemap segment.
+    """
+    fingerprint = next((entry for entry in get_fingerprints() if entry[0] == segment), None)
+    if fingerprint is None:
+        abort(404)
+
+    base_url = request.host_url.rstrip('/')
+    _, count, last_modified = fingerprint
+    key = f"sitemap:segment:{base_url}:{segment}:{count}:{last_modified.isoformat() if last_modified else ''}"
+    body = cache.get(key)
+    if body is None:
+        body = render_sitemap_segment(base_url, segment)
+        cache.set(key, body, timeout=SEGMENT_CACHE_TIMEOUT)
+    return Response(body, mimetype='application/gzip')
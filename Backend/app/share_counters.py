@@ -0,0 +1,89 @@
+import logging
+
+from app.models import db, BlogPost, SocialMediaShare, SHARE_PLATFORMS
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+# Number of posts recounted by a single UPDATE statement
+RECOUNT_BATCH_SIZE = 1000
+
+
+def _platform_column(platform):
+    """
+    Get the share counter column for a platform.
+
+    :param platform: The social media platform.
+    :return: The BlogPost column counting shares on the platform.
+    """
+    return getattr(BlogPost, f'{platform}_share_count')
+
+
+def add_share(post_id, platform):
+    """
+    Record a social media share and update the post's share counters.
+
+    The counters are incremented with an atomic ``UPDATE ... SET n = n + 1``
+    in the current session, so they commit or roll back together with the
+    share row. The caller is responsible for committing.
+
+    :param post_id: The ID of the shared blog post.
+    :param platform: The social media platform, one of SHARE_PLATFORMS.
+    :return: The new SocialMediaShare instance.
+    """
+    if platform not in SHARE_PLATFORMS:
+        raise ValueError(f"Unsupported platform: {platform}")
+
+    share = SocialMediaShare(post_id=post_id, platform=platform)
+    db.session.add(share)
+    column = _platform_column(platform)
+    BlogPost.query.filter_by(id=post_id).update({
+        BlogPost.share_count: BlogPost.share_count + 1,
+        column: column + 1,
+        # Shares are not content changes, keep the modification time.
+        BlogPost.updated_at: BlogPost.updated_at,
+    }, synchronize_session=False)
+    return share
+
+
+def _share_count_subquery(platform=None):
+    """
+    Build a correlated subquery counting the shares of the outer BlogPost.
+
+    :param platform: The platform to count, or None to count all shares.
+    :return: A scalar subquery.
+    """
+    query = db.select([db.func.count(SocialMediaShare.id)]).where(SocialMediaShare.post_id == BlogPost.id)
+    if platform is not None:
+        query = query.where(SocialMediaShare.platform == platform)
+    return query.scalar_subquery()
+
+
+def recount_share_counts(batch_size=RECOUNT_BATCH_SIZE):
+    """
+    Recount every post's share counters from the SocialMediaShare rows.
+
+    Posts are recounted in primary key ranges, one UPDATE and commit per
+    range, so the repair never locks the whole table.
+
+    :param batch_size: The number of post IDs covered by each UPDATE.
+    :return: The number of posts recounted.
+    """
+    values = {
+        BlogPost.share_count: _share_count_subquery(),
+        BlogPost.updated_at: BlogPost.updated_at,
+    }
+    for platform in SHARE_PLATFORMS:
+        values[_platform_column(platform)] = _share_count_subquery(platform)
+
+    max_id = db.session.query(db.func.max(BlogPost.id)).scalar() or 0
+    recounted = 0
+    for start in range(1, max_id + 1, batch_size):
+        recounted += BlogPost.query.filter(BlogPost.id.between(start, start + batch_size - 1)) \
+            .update(values, synchronize_session=False)
+        db.session.commit()
+
+    logger.info(f"Recounted share counters for {recounted} posts")
+    return recounted
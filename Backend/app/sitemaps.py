@@ -1,5 +1,14 @@
+import gzip
+import io
+from xml.sax.saxutils import escape
+
 from django.contrib.sitemaps import Sitemap
-from app.models import BlogPost
+from app.models import db, BlogPost
+
+
+# Maximum number of URLs in a sitemap file, as allowed by the sitemaps protocol
+SITEMAP_SEGMENT_SIZE = 50000
+SITEMAP_NAMESPACE = 'http://www.sitemaps.org/schemas/sitemap/0.9'
 
 
 class BlogPostSitemap(Sitemap):
@@ -8,21 +17,87 @@ class BlogPostSitemap(Sitemap):
     """
     changefreq = "daily"
     priority = 0.8
+    limit = SITEMAP_SEGMENT_SIZE
 
     def items(self):
         """
-        Returns all BlogPost objects.
+        Returns the id and updated_at of every BlogPost, without loading post content.
         """
-        return BlogPost.objects.all()
+        return db.session.query(BlogPost.id, BlogPost.updated_at).order_by(BlogPost.id)
 
     def lastmod(self, obj):
         """
-        Returns the last modified date of the BlogPost object.
+        Returns the last modified date of the BlogPost row.
         """
         return obj.updated_at
 
     def location(self, obj):
         """
-        Returns the absolute URL of the BlogPost object.
+        Returns the absolute URL of the BlogPost row.
         """
-        return obj.get_absolute_url()
+        return f"/blog/post/{obj.id}"
+
+
+def segment_fingerprints():
+    """
+    Summarise the blog posts in each sitemap segment.
+
+    Segment ``n`` holds the posts with IDs ``n * SITEMAP_SEGMENT_SIZE + 1``
+    through ``(n + 1) * SITEMAP_SEGMENT_SIZE``, so a segment never exceeds
+    the protocol limit and adding posts never shifts existing segments. The
+    post count and latest ``updated_at`` of a segment change whenever one
+    of its posts is created, edited or deleted, which makes them a cache key
+    for the rendered segment.
+
+    :return: List of (segment, post_count, last_modified) tuples ordered by segment.
+    """
+    # The offset of the first post of the segment; "/" would be true division on SQLAlchemy 2.0
+    offset = BlogPost.id - 1
+    segment_start = (offset - offset % SITEMAP_SEGMENT_SIZE).label('segment_start')
+    rows = db.session.query(segment_start, db.func.count(BlogPost.id), db.func.max(BlogPost.updated_at)) \
+        .group_by(segment_start).order_by(segment_start).all()
+    return [(int(start) // SITEMAP_SEGMENT_SIZE, count, last_modified) for start, count, last_modified in rows]
+
+
+def render_sitemap_index(base_url, fingerprints):
+    """
+    Render the sitemap index listing every non-empty segment.
+
+    :param base_url: The site root URL, without a trailing slash.
+    :param fingerprints: Segment summaries as returned by segment_fingerprints.
+    :return: The sitemap index XML as bytes.
+    """
+    entries = []
+    for index, _, last_modified in fingerprints:
+        lastmod = f"<lastmod>{last_modified.date().isoformat()}</lastmod>" if last_modified else ""
+        entries.append(f"<sitemap><loc>{escape(base_url)}/sitemap-{index}.xml.gz</loc>{lastmod}</sitemap>")
+    return (f'<?xml version="1.0" encoding="UTF-8"?>\n<sitemapindex xmlns="{SITEMAP_NAMESPACE}">\n'
+            + "\n".join(entries) + "\n</sitemapindex>\n").encode()
+
+
+def render_sitemap_segment(base_url, segment):
+    """
+    Render one sitemap segment as gzipped XML.
+
+    Only the ``id`` and ``updated_at`` columns are selected, and rows are
+    streamed in chunks straight into the gzip stream, so memory use is
+    bounded by the compressed output.
+
+    :param base_url: The site root URL, without a trailing slash.
+    :param segment: The segment number.
+    :return: The gzipped sitemap XML as bytes.
+    """
+    first_id = segment * SITEMAP_SEGMENT_SIZE + 1
+    rows = db.session.query(BlogPost.id, BlogPost.updated_at) \
+        .filter(BlogPost.id.between(first_id, first_id + SITEMAP_SEGMENT_SIZE - 1)) \
+        .order_by(BlogPost.id).yield_per(5000)
+
+    buffer = io.BytesIO()
+    with gzip.GzipFile(fileobj=buffer, mode='wb', mtime=0) as xml:
+        xml.write(f'<?xml version="1.0" encoding="UTF-8"?>\n<urlset xmlns="{SITEMAP_NAMESPACE}">\n'.encode())
+        for post_id, updated_at in rows:
+            lastmod = f"<lastmod>{updated_at.date().isoformat()}</lastmod>" if updated_at else ""
+            xml.write(f"<url><loc>{escape(base_url)}/blog/post/{post_id}</loc>{lastmod}"
+                      f"<changefreq>daily</changefreq><priority>0.8</priority></url>\n".encode())
+        xml.write(b"</urlset>\n")
+    return buffer.getvalue()
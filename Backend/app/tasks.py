@@ -0,0 +1,152 @@
+from api.celery_app import app as celery_app
+from app import app
+from app.related_posts import refresh_related_posts
+from app import view_counter
+from app.trending import reconcile_trending_scores
+from app import render_cache
+from app import email_encryption
+from app import user_admin
+from app.provisioning import provision_users
+from app.admin_stats import flush_stats, reconcile_stats
+from app.unread_counter import reconcile_unread_counts
+from app import mail_outbox
+from app.mail_outbox import send_email_batch  # noqa: F401  Registers the email task with the workers
+
+
+@celery_app.task
+def compute_related_posts(full=False):
+    """
+    Recompute the precomputed related-posts table.
+
+    :param full: Whether to recompute every post instead of only changed ones.
+    :return: The number of posts whose recommendations were recomputed.
+    """
+    with app.app_context():
+        return refresh_related_posts(full=full)
+
+
+@celery_app.task
+def flush_view_counts():
+    """
+    Write buffered blog post views to the database.
+
+    :return: The number of views written.
+    """
+    with app.app_context():
+        return view_counter.flush_view_counts()
+
+
+@celery_app.task
+def reconcile_trending():
+    """
+    Rebuild the trending scores from recorded shares.
+
+    :return: The number of posts in the trending set.
+    """
+    with app.app_context():
+        return reconcile_trending_scores()
+
+
+@celery_app.task
+def warm_post_html(post_id):
+    """
+    Pre-render a blog post into the render cache.
+
+    :param post_id: The ID of the blog post.
+    :return: True if the post was rendered, False if it does not exist.
+    """
+    with app.app_context():
+        return render_cache.warm_post_html(post_id)
+
+
+@celery_app.task
+def rotate_email_encryption(batch_size=email_encryption.EMAIL_BATCH_SIZE, max_batches=100):
+    """
+    Re-encrypt user emails with the primary encryption key.
+
+    Each run handles at most ``max_batches`` batches and then queues the
+    next run, so no single task holds a worker for the whole table.
+
+    :param batch_size: The number of user IDs covered by each transaction.
+    :param max_batches: The number of batches handled per run.
+    :return: The number of emails re-encrypted by this run.
+    """
+    with app.app_context():
+        rotated, finished = email_encryption.rotate_email_encryption(batch_size, max_batches)
+    if not finished:
+        rotate_email_encryption.delay(batch_size, max_batches)
+    return rotated
+
+
+@celery_app.task
+def flush_admin_stats():
+    """
+    Fold the admin dashboard counter changes buffered in Redis into the database.
+
+    :return: Dictionary of the changes applied.
+    """
+    with app.app_context():
+        return flush_stats()
+
+
+@celery_app.task
+def reconcile_admin_stats():
+    """
+    Recompute the admin dashboard counters from the tables.
+
+    :return: The number of users counted.
+    """
+    with app.app_context():
+        return reconcile_stats().user_count
+
+
+@celery_app.task
+def purge_deleted_users(batch_size=user_admin.PURGE_BATCH_SIZE, max_users=50):
+    """
+    Remove deleted users and their rows from the database.
+
+    Each run purges at most ``max_users`` users and then queues the next
+    run. Runs queued while another is active return at once.
+
+    :param batch_size: The number of rows per statement.
+    :param max_users: The number of users purged per run.
+    :return: The number of users purged by this run.
+    """
+    with app.app_context():
+        purged, finished = user_admin.purge_deleted_users(batch_size, max_users)
+    if not finished:
+        purge_deleted_users.delay(batch_size, max_users)
+    return purged
+
+
+@celery_app.task
+def provision_uploaded_users(records):
+    """
+    Create the users of an uploaded import file.
+
+    :param records: List of (line number, record or None, error or None) entries from read_user_records.
+    :return: Dictionary with the number of users created and the list of per-row errors.
+    """
+    with app.app_context():
+        return provision_users(records)
+
+
+@celery_app.task
+def reconcile_unread_notifications():
+    """
+    Recount the unread notifications of every user.
+
+    :return: The number of users whose count was corrected.
+    """
+    with app.app_context():
+        return reconcile_unread_counts()
+
+
+@celery_app.task
+def drain_mail_outbox():
+    """
+    Send the emails waiting in the mail outbox in batches.
+
+    :return: The number of emails taken off the outbox.
+    """
+    return mail_outbox.drain_outbox()
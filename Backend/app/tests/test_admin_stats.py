@@ -0,0 +1,63 @@
+import unittest
+import fakeredis
+from flask import Flask
+from app import admin_stats, redis_client
+from app.models import db, AdminStats, User
+
+
+class TestAdminStats(unittest.TestCase):
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+        self.app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+        db.init_app(self.app)
+        self.context = self.app.app_context()
+        self.context.push()
+        db.create_all()
+        self.redis = fakeredis.FakeRedis()
+        redis_client._client = self.redis
+
+    def tearDown(self):
+        redis_client._client = None
+        redis_client._unavailable_until = 0.0
+        db.session.remove()
+        db.drop_all()
+        self.context.pop()
+
+    def add_user(self, username):
+        db.session.add(User(username=username, email=username, password_hash='h', salt='s'))
+        admin_stats.increment_stats(user_count=1)
+        db.session.commit()
+
+    def test_changes_are_folded_in(self):
+        """
+        Test the increment_stats and flush_stats functions to ensure committed
+        changes are buffered, shown on the dashboard and folded in once.
+        """
+        admin_stats.reconcile_stats()
+        self.add_user('a')
+        self.add_user('b')
+        db.session.add(User(username='c', email='c', password_hash='h', salt='s'))
+        admin_stats.increment_stats(user_count=1)
+        db.session.rollback()
+
+        self.assertEqual(AdminStats.query.get(admin_stats.STATS_ID).user_count, 0)
+        self.assertEqual(admin_stats.get_stats()['user_count'], 2)
+        self.assertEqual(admin_stats.flush_stats(), {'user_count': 2})
+        self.assertEqual(admin_stats.flush_stats(), {})
+        db.session.expire_all()
+        self.assertEqual(admin_stats.get_stats()['user_count'], 2)
+
+    def test_missing_row_is_created(self):
+        """
+        Test the flush_stats function to ensure a missing stats row is created
+        from the tables without counting the pending changes twice.
+        """
+        self.add_user('a')
+        admin_stats.flush_stats()
+        self.assertEqual(AdminStats.query.get(admin_stats.STATS_ID).user_count, 1)
+        self.assertFalse(self.redis.exists(admin_stats.PENDING_STATS_KEY))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import sys
+import types
+import unittest
+import fakeredis
+import pyotp
+from flask import Flask
+from flask_jwt_extended import JWTManager
+from app import redis_client
+from app.models import db, AdminStats, User
+
+# app.activity_logger and app.utils import the application package, which
+# cannot be built in a unit test, so the route gets stand-ins for them.
+_stubs = {
+    'app.activity_logger': types.SimpleNamespace(log_user_activity=lambda user_id, activity: None),
+    'app.utils': types.SimpleNamespace(generate_password_reset_token=None, verify_password_reset_token=None,
+                                       send_password_reset_email=None),
+}
+_saved = {name: sys.modules.get(name) for name in _stubs}
+sys.modules.update(_stubs)
+try:
+    from app.routes.auth import auth
+finally:
+    for _name, _module in _saved.items():
+        if _module is None:
+            del sys.modules[_name]
+        else:
+            sys.modules[_name] = _module
+
+
+class TestAuthRoutes(unittest.TestCase):
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+        self.app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+        self.app.config['JWT_SECRET_KEY'] = 'test'
+        db.init_app(self.app)
+        JWTManager(self.app)
+        self.app.register_blueprint(auth, url_prefix='/auth')
+        self.context = self.app.app_context()
+        self.context.push()
+        db.create_all()
+        db.session.add(AdminStats(id=1))
+        db.session.commit()
+        self.redis = fakeredis.FakeRedis()
+        redis_client._client = self.redis
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        redis_client._client = None
+        redis_client._unavailable_until = 0.0
+        db.session.remove()
+        db.drop_all()
+        self.context.pop()
+
+    def register(self, username, email):
+        return self.client.post('/auth/register', json={'username': username, 'email': email,
+                                                        'password': 'Corr3ct!Horse'})
+
+    def test_register_creates_user(self):
+        """
+        Test the register route to ensure a new user is created and counted
+        in the admin stats, and a taken username is refused.
+        """
+        response = self.register('alice', 'alice@example.com')
+        self.assertEqual(response.status_code, 201)
+        self.assertIsNotNone(User.find_by_email('alice@example.com'))
+        self.assertEqual(int(self.redis.hget('admin:stats:pending', 'user_count')), 1)
+
+        self.assertEqual(self.register('alice', 'other@example.com').status_code, 400)
+
+    def test_login_without_mfa(self):
+        """
+        Test the login route to ensure users who have not enrolled in 2FA log
+        in without an OTP, and enrolled users still need a valid one.
+        """
+        user = User(username='bob')
+        user.set_email('bob@example.com')
+        user.set_password('Corr3ct!Horse')
+        db.session.add(user)
+        db.session.commit()
+
+        response = self.client.post('/auth/login', json={'username': 'bob', 'password': 'Corr3ct!Horse'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('access_token', response.get_json())
+
+        user.mfa_secret = pyotp.random_base32()
+        db.session.commit()
+        response = self.client.post('/auth/login', json={'username': 'bob', 'password': 'Corr3ct!Horse'})
+        self.assertEqual(response.status_code, 401)
+        response = self.client.post('/auth/login', json={'username': 'bob', 'password': 'Corr3ct!Horse',
+                                                         'otp': pyotp.TOTP(user.mfa_secret).now()})
+        self.assertEqual(response.status_code, 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import unittest
+from unittest import mock
+import fakeredis
+from flask import Flask
+from app import authz, redis_client
+from app.models import db, User
+
+
+class TestAuthz(unittest.TestCase):
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+        self.app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+        db.init_app(self.app)
+        self.context = self.app.app_context()
+        self.context.push()
+        db.create_all()
+        self.redis = fakeredis.FakeRedis()
+        redis_client._client = self.redis
+        authz._local_cache.clear()
+        authz._unpublished.clear()
+        self.user = User(username='alice')
+        self.user.set_email('alice@example.com')
+        self.user.set_password('Corr3ct!Horse')
+        db.session.add(self.user)
+        db.session.commit()
+
+    def tearDown(self):
+        redis_client._client = None
+        redis_client._unavailable_until = 0.0
+        authz._local_cache.clear()
+        authz._unpublished.clear()
+        db.session.remove()
+        db.drop_all()
+        self.context.pop()
+
+    def test_bump_publishes_version(self):
+        """
+        Test the bump_authz_version function to ensure the new version is
+        published on commit and tokens with the old version are re-checked.
+        """
+        old_claims = authz.get_claims(self.user.id)
+        self.assertEqual(int(self.redis.get(authz._version_key(self.user.id))), 0)
+
+        self.user.is_admin = True
+        authz.bump_authz_version(self.user)
+        db.session.commit()
+
+        self.assertEqual(int(self.redis.get(authz._version_key(self.user.id))), 1)
+        self.assertTrue(authz.get_claims(self.user.id, old_claims)['is_admin'])
+
+    def test_failed_publish_is_retried(self):
+        """
+        Test the bump_authz_version function to ensure a version that could not
+        be published is checked against the database, and the stale version in
+        Redis is removed once Redis is available again.
+        """
+        old_claims = authz.get_claims(self.user.id)
+
+        with mock.patch('app.authz.get_redis', return_value=None):
+            self.user.is_admin = True
+            authz.bump_authz_version(self.user)
+            db.session.commit()
+            self.assertIn(self.user.id, authz._unpublished)
+            self.assertTrue(authz.get_claims(self.user.id, old_claims)['is_admin'])
+        self.assertEqual(int(self.redis.get(authz._version_key(self.user.id))), 0)
+
+        authz._local_cache.clear()
+        self.assertTrue(authz.get_claims(self.user.id, old_claims)['is_admin'])
+        self.assertEqual(authz._unpublished, set())
+        self.assertEqual(int(self.redis.get(authz._version_key(self.user.id))), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
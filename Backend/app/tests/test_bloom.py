@@ -0,0 +1,53 @@
+import os
+import tempfile
+import unittest
+from app.bloom import BloomFilter
+
+
+class TestBloomFilter(unittest.TestCase):
+    def setUp(self):
+        self.bloom = BloomFilter.for_capacity(1000, 0.01)
+        for i in range(1000):
+            self.bloom.add(f"password{i}")
+
+    def test_membership(self):
+        """
+        Test the BloomFilter class to ensure added items are always found and
+        the false positive rate stays close to the configured rate.
+        """
+        self.assertTrue(all(f"password{i}" in self.bloom for i in range(1000)))
+        false_positives = sum(f"other{i}" in self.bloom for i in range(10000))
+        self.assertLess(false_positives, 300)
+
+    def test_save_and_open(self):
+        """
+        Test the save and open methods to ensure a memory-mapped filter
+        answers like the filter it was written from and is read-only.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'passwords.bloom')
+            self.bloom.save(path)
+            mapped = BloomFilter.open(path)
+            try:
+                self.assertEqual(mapped.count, 1000)
+                self.assertIn(b"password7", mapped)
+                self.assertEqual([f"other{i}" in mapped for i in range(1000)],
+                                 [f"other{i}" in self.bloom for i in range(1000)])
+                with self.assertRaises(TypeError):
+                    mapped.add("password")
+            finally:
+                mapped.close()
+
+    def test_open_invalid_file(self):
+        """
+        Test the open method to ensure files that are not filters are rejected.
+        """
+        with tempfile.NamedTemporaryFile() as invalid:
+            invalid.write(b"not a bloom filter at all")
+            invalid.flush()
+            with self.assertRaises(ValueError):
+                BloomFilter.open(invalid.name)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+import unittest
+from app.login_throttle import LoginThrottle, MemoryAttemptStore
+
+
+class TestLoginThrottle(unittest.TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        self.throttle = LoginThrottle(MemoryAttemptStore(), window=60, max_attempts=3, max_attempts_per_ip=5,
+                                      clock=lambda: self.now)
+
+    def test_user_lockout_slides(self):
+        """
+        Test the LoginThrottle class to ensure a username is locked after
+        too many failures and unlocked once the oldest failure leaves the window.
+        """
+        for offset in (0, 10, 20):
+            self.now = 1000.0 + offset
+            self.assertEqual(self.throttle.lockout_remaining('alice', '10.0.0.1'), 0)
+            self.throttle.record_failure('alice', '10.0.0.1')
+        self.assertEqual(self.throttle.lockout_remaining('alice', '10.0.0.2'), 40)
+        self.now = 1060.0
+        self.assertEqual(self.throttle.lockout_remaining('alice', '10.0.0.2'), 0)
+
+    def test_ip_lockout(self):
+        """
+        Test the LoginThrottle class to ensure a client IP is locked after
+        failures spread over many usernames.
+        """
+        for i in range(5):
+            self.throttle.record_failure(f'user{i}', '10.0.0.1')
+        self.assertGreater(self.throttle.lockout_remaining('someone', '10.0.0.1'), 0)
+        self.assertEqual(self.throttle.lockout_remaining('someone', '10.0.0.2'), 0)
+
+    def test_success_resets_user(self):
+        """
+        Test the record_success method to ensure a successful login clears
+        the failures of the username.
+        """
+        for _ in range(2):
+            self.throttle.record_failure('alice', '10.0.0.1')
+        self.throttle.record_success('alice')
+        self.throttle.record_failure('alice', '10.0.0.1')
+        self.assertEqual(self.throttle.lockout_remaining('alice', '10.0.0.1'), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+import socket
+import unittest
+from unittest import mock
+import fakeredis
+from aiosmtpd.controller import Controller
+from app import mail_outbox, redis_client
+from app.mail_outbox import SMTPConnectionPool, send_messages
+
+
+class RecordingHandler:
+    def __init__(self):
+        self.messages = []
+        self.sessions = set()
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address.startswith('bounce@'):
+            return '550 No such user'
+        envelope.rcpt_tos.append(address)
+        return '250 OK'
+
+    async def handle_DATA(self, server, session, envelope):
+        self.sessions.add(id(session))
+        self.messages.append((envelope.rcpt_tos, envelope.content.decode()))
+        return '250 Message accepted'
+
+
+class TestMailOutbox(unittest.TestCase):
+    def setUp(self):
+        with socket.socket() as probe:
+            probe.bind(('127.0.0.1', 0))
+            port = probe.getsockname()[1]
+        self.handler = RecordingHandler()
+        self.controller = Controller(self.handler, hostname='127.0.0.1', port=port)
+        self.controller.start()
+        self.pool = SMTPConnectionPool(host='127.0.0.1', port=port, username='', use_tls=False, use_ssl=False,
+                                       size=1)
+
+    def tearDown(self):
+        self.pool.close()
+        self.controller.stop()
+
+    def message(self, recipient):
+        return {'subject': 'Hello', 'sender': 'noreply@example.com', 'recipients': [recipient],
+                'body': 'Plain text', 'html': '<p>HTML</p>'}
+
+    def test_batch_reuses_connection(self):
+        """
+        Test the send_messages function to ensure a batch, and the batch
+        after it, are delivered over one pooled connection.
+        """
+        self.assertEqual(send_messages([self.message('a@example.com'), self.message('b@example.com')], self.pool), [])
+        self.assertEqual(send_messages([self.message('c@example.com')], self.pool), [])
+        self.assertEqual([recipients for recipients, _ in self.handler.messages],
+                         [['a@example.com'], ['b@example.com'], ['c@example.com']])
+        self.assertEqual(len(self.handler.sessions), 1)
+        self.assertIn('<p>HTML</p>', self.handler.messages[0][1])
+
+    def test_permanent_failures_are_dropped(self):
+        """
+        Test the send_messages function to ensure a rejected recipient does
+        not block the rest of the batch and is not retried.
+        """
+        failed = send_messages([self.message('bounce@example.com'), self.message('a@example.com')], self.pool)
+        self.assertEqual(failed, [])
+        self.assertEqual([recipients for recipients, _ in self.handler.messages], [['a@example.com']])
+
+    def test_unreachable_server_is_retried(self):
+        """
+        Test the send_messages function to ensure every message is returned
+        for retry when the server cannot be reached.
+        """
+        with socket.socket() as probe:
+            probe.bind(('127.0.0.1', 0))
+            closed_port = probe.getsockname()[1]
+        pool = SMTPConnectionPool(host='127.0.0.1', port=closed_port, username='', use_tls=False, use_ssl=False)
+        messages = [self.message('a@example.com'), self.message('b@example.com')]
+        self.assertEqual(send_messages(messages, pool), messages)
+        self.assertEqual(self.handler.messages, [])
+
+    def test_outbox_is_sent_in_batches(self):
+        """
+        Test the enqueue_email and drain_outbox functions to ensure queued
+        emails schedule one drain and are sent in batches over one connection.
+        """
+        redis_client._client = fakeredis.FakeRedis()
+        self.addCleanup(setattr, redis_client, '_client', None)
+        with mock.patch.object(mail_outbox.celery_app, 'send_task') as send_task:
+            for recipient in ('a@example.com', 'b@example.com', 'c@example.com'):
+                mail_outbox.enqueue_email('Hello', [recipient], body='Plain text')
+        send_task.assert_called_once_with('app.tasks.drain_mail_outbox', countdown=mail_outbox.MAIL_BATCH_DELAY)
+
+        with mock.patch.object(mail_outbox, 'get_pool', return_value=self.pool):
+            self.assertEqual(mail_outbox.drain_outbox(batch_size=2), 3)
+            self.assertEqual(mail_outbox.drain_outbox(batch_size=2), 0)
+        self.assertEqual([recipients for recipients, _ in self.handler.messages],
+                         [['a@example.com'], ['b@example.com'], ['c@example.com']])
+        self.assertEqual(len(self.handler.sessions), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
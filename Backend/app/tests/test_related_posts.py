@@ -0,0 +1,63 @@
+import unittest
+import numpy as np
+from app.related_posts import (
+    tokenize,
+    build_tfidf_matrix,
+    top_k_neighbours,
+)
+
+
+class TestRelatedPosts(unittest.TestCase):
+    def setUp(self):
+        self.documents = [
+            "Flask blueprints and routing in Flask",
+            "Routing requests with Flask blueprints",
+            "Baking sourdough bread at home",
+            "Sourdough starter and bread baking tips",
+            "",
+        ]
+
+    def test_tokenize(self):
+        """
+        Test the tokenize function to ensure it lowercases text and drops
+        punctuation and single-character terms.
+        """
+        self.assertEqual(tokenize("Hello, World! A b2"), ["hello", "world", "b2"])
+
+    def test_build_tfidf_matrix(self):
+        """
+        Test the build_tfidf_matrix function to ensure non-empty rows are unit
+        vectors and empty documents produce empty rows.
+        """
+        matrix = build_tfidf_matrix(self.documents)
+        self.assertEqual(matrix.shape[0], 5)
+        norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+        np.testing.assert_allclose(norms[:4], 1.0, rtol=1e-5)
+        self.assertEqual(norms[4], 0.0)
+
+    def test_top_k_neighbours(self):
+        """
+        Test the top_k_neighbours function to ensure it ranks topically similar
+        documents first, excludes the document itself and drops zero scores.
+        """
+        matrix = build_tfidf_matrix(self.documents)
+        neighbours = dict(top_k_neighbours(matrix, [0, 2, 4], k=2))
+        self.assertEqual(neighbours[0][0][0], 1)
+        self.assertEqual(neighbours[2][0][0], 3)
+        self.assertEqual(neighbours[4], [])
+        for row, matches in neighbours.items():
+            self.assertNotIn(row, [match for match, _ in matches])
+            scores = [score for _, score in matches]
+            self.assertEqual(scores, sorted(scores, reverse=True))
+
+    def test_top_k_neighbours_single_document(self):
+        """
+        Test the top_k_neighbours function to ensure a single document has no
+        neighbours.
+        """
+        matrix = build_tfidf_matrix(["only one post"])
+        self.assertEqual(list(top_k_neighbours(matrix, [0], k=5)), [(0, [])])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+import os
+import time
+import unittest
+from unittest import mock
+import fakeredis
+from flask import Flask
+from app import redis_client, revocation
+
+
+class TestRevocation(unittest.TestCase):
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.context = self.app.app_context()
+        self.context.push()
+        self.redis = fakeredis.FakeRedis()
+        redis_client._client = self.redis
+        # The pub/sub listener is not needed, revocations are made by this process or written to Redis
+        revocation._listener_pid = os.getpid()
+        revocation._synced_pid = None
+        revocation._local_jtis.clear()
+        revocation._local_valid_after.clear()
+
+    def tearDown(self):
+        redis_client._client = None
+        redis_client._unavailable_until = 0.0
+        revocation._listener_pid = None
+        revocation._synced_pid = None
+        revocation._local_jtis.clear()
+        revocation._local_valid_after.clear()
+        self.context.pop()
+
+    def is_revoked(self, jti, user_id, issued_at):
+        return revocation.is_token_revoked({}, {'jti': jti, 'sub': user_id, 'iat': issued_at})
+
+    def test_revoke_token(self):
+        """
+        Test the revoke_token function to ensure only the revoked token is rejected.
+        """
+        self.assertFalse(self.is_revoked('a', 1, 1000))
+        revocation.revoke_token({'jti': 'a', 'exp': None})
+        self.assertTrue(self.is_revoked('a', 1, 1000))
+        self.assertFalse(self.is_revoked('b', 1, 1000))
+
+    def test_same_second_token_stays_valid(self):
+        """
+        Test the revoke_user_tokens function to ensure tokens issued before the
+        revocation are rejected and a token issued in the same second is accepted.
+        """
+        now = int(time.time())
+        with mock.patch('app.revocation.time.time', return_value=now + 0.7):
+            revocation.revoke_user_tokens(1)
+        self.assertTrue(self.is_revoked('a', 1, now - 1))
+        self.assertFalse(self.is_revoked('b', 1, now))
+        self.assertFalse(self.is_revoked('c', 2, now - 1))
+
+    def test_unsynced_filter_checks_redis(self):
+        """
+        Test the is_token_revoked function to ensure revocations made by other
+        workers before this process built its filter are not missed.
+        """
+        self.redis.set(f"{revocation.REVOKED_JTI_PREFIX}a", 1)
+        self.redis.set(f"{revocation.REVOKED_USER_PREFIX}2", 1000)
+        self.assertTrue(self.is_revoked('a', 1, 1000))
+        self.assertTrue(self.is_revoked('b', 2, 999))
+        self.assertFalse(self.is_revoked('c', 3, 1000))
+
+    def test_redis_down(self):
+        """
+        Test the is_token_revoked function to ensure tokens are rejected while
+        the filter cannot be built, and local revocations apply once it is.
+        """
+        with mock.patch('app.revocation.get_redis', return_value=None):
+            self.assertTrue(self.is_revoked('a', 1, 1000))
+
+        self.assertFalse(self.is_revoked('a', 1, 1000))
+        with mock.patch('app.revocation.get_redis', return_value=None):
+            revocation.revoke_token({'jti': 'b', 'exp': None})
+            self.assertTrue(self.is_revoked('b', 1, 1000))
+            self.assertFalse(self.is_revoked('a', 1, 1000))
+
+
+if __name__ == '__main__':
+    unittest.main()
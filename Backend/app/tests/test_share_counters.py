@@ -0,0 +1,77 @@
+import unittest
+from flask import Flask
+from app import share_counters
+from app.models import db, BlogPost, SocialMediaShare
+
+
+class TestShareCounters(unittest.TestCase):
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+        self.app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+        db.init_app(self.app)
+        self.context = self.app.app_context()
+        self.context.push()
+        db.create_all()
+        db.session.add_all([BlogPost(id=post_id, title=f'Post {post_id}', content='content', author_id=1)
+                            for post_id in (1, 2, 3)])
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.context.pop()
+
+    def counts(self, post_id):
+        post = db.session.get(BlogPost, post_id)
+        db.session.refresh(post)
+        return post.share_count, post.twitter_share_count, post.email_share_count
+
+    def test_add_share(self):
+        """
+        Test the add_share function to ensure the share is recorded and the
+        total and platform counters are incremented with it.
+        """
+        share_counters.add_share(1, 'twitter')
+        share_counters.add_share(1, 'twitter')
+        share_counters.add_share(1, 'email')
+        db.session.commit()
+
+        self.assertEqual(SocialMediaShare.query.filter_by(post_id=1).count(), 3)
+        self.assertEqual(self.counts(1), (3, 2, 1))
+        self.assertEqual(self.counts(2), (0, 0, 0))
+        with self.assertRaises(ValueError):
+            share_counters.add_share(1, 'myspace')
+
+    def test_add_share_rolls_back(self):
+        """
+        Test the add_share function to ensure the counters are rolled back
+        together with the share row.
+        """
+        share_counters.add_share(1, 'twitter')
+        db.session.rollback()
+
+        self.assertEqual(SocialMediaShare.query.count(), 0)
+        self.assertEqual(self.counts(1), (0, 0, 0))
+
+    def test_recount_share_counts(self):
+        """
+        Test the recount_share_counts function to ensure drifted counters are
+        repaired from the share rows across several batches.
+        """
+        db.session.add_all([SocialMediaShare(post_id=1, platform='twitter'),
+                            SocialMediaShare(post_id=3, platform='email'),
+                            SocialMediaShare(post_id=3, platform='twitter')])
+        BlogPost.query.filter_by(id=1).update({'share_count': 7, 'twitter_share_count': 0})
+        BlogPost.query.filter_by(id=2).update({'share_count': 4, 'email_share_count': 4})
+        db.session.commit()
+
+        self.assertEqual(share_counters.recount_share_counts(batch_size=2), 3)
+
+        self.assertEqual(self.counts(1), (1, 1, 0))
+        self.assertEqual(self.counts(2), (0, 0, 0))
+        self.assertEqual(self.counts(3), (2, 1, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
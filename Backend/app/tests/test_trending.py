@@ -0,0 +1,120 @@
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+import fakeredis
+from flask import Flask
+from app import redis_client, trending
+from app.models import db, BlogPost, SocialMediaShare
+
+
+class TestTrending(unittest.TestCase):
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+        self.app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+        db.init_app(self.app)
+        self.context = self.app.app_context()
+        self.context.push()
+        db.create_all()
+        db.session.add_all([BlogPost(id=post_id, title=f'Post {post_id}', content='content', author_id=1)
+                            for post_id in (1, 2, 3)])
+        db.session.commit()
+        self.redis = fakeredis.FakeRedis()
+        redis_client._client = self.redis
+        trending._local_scores.clear()
+        trending._local_share_scores.clear()
+
+    def tearDown(self):
+        redis_client._client = None
+        redis_client._unavailable_until = 0.0
+        trending._local_scores.clear()
+        trending._local_share_scores.clear()
+        db.session.remove()
+        db.drop_all()
+        self.context.pop()
+
+    def test_decay(self):
+        """
+        Test the _decayed function to ensure an event weighs twice as much one
+        half-life later and half as much one half-life earlier.
+        """
+        half_life = trending.TRENDING_HALF_LIFE
+        self.assertEqual(trending._decayed(5.0, 1000, 1000), 5.0)
+        self.assertAlmostEqual(trending._decayed(5.0, 1000 + half_life, 1000), 10.0)
+        self.assertAlmostEqual(trending._decayed(5.0, 1000 - half_life, 1000), 2.5)
+
+    def test_record_updates_sorted_sets(self):
+        """
+        Test the record_share and record_view functions to ensure shares and
+        views are weighted into the scores set and only shares into the shares set.
+        """
+        with mock.patch('app.trending.time.time', return_value=1000.0):
+            trending.record_share(1)
+            trending.record_view(1)
+            trending.record_view(2)
+
+        self.assertEqual(float(self.redis.get(trending.EPOCH_KEY)), 1000.0)
+        self.assertEqual(self.redis.zscore(trending.SCORES_KEY, 1), trending.SHARE_WEIGHT + trending.VIEW_WEIGHT)
+        self.assertEqual(self.redis.zscore(trending.SCORES_KEY, 2), trending.VIEW_WEIGHT)
+        self.assertEqual(self.redis.zscore(trending.SHARE_SCORES_KEY, 1), trending.SHARE_WEIGHT)
+        self.assertIsNone(self.redis.zscore(trending.SHARE_SCORES_KEY, 2))
+
+    def test_get_trending_posts(self):
+        """
+        Test the get_trending_posts function to ensure posts are ranked by score,
+        scores are decayed to the current time and deleted posts are skipped.
+        """
+        half_life = trending.TRENDING_HALF_LIFE
+        with mock.patch('app.trending.time.time', return_value=1000.0):
+            trending.record_view(1)
+            trending.record_share(4)
+        with mock.patch('app.trending.time.time', return_value=1000.0 + half_life):
+            trending.record_share(2)
+
+        with mock.patch('app.trending.time.time', return_value=1000.0 + half_life):
+            posts = trending.get_trending_posts(limit=10)
+
+        self.assertEqual([post['id'] for post in posts], [2, 1])
+        self.assertEqual(posts[0], {"id": 2, "title": "Post 2", "url": "/blog/post/2",
+                                    "score": trending.SHARE_WEIGHT})
+        self.assertEqual(posts[1]['score'], trending.VIEW_WEIGHT / 2)
+
+    def test_redis_down(self):
+        """
+        Test the record_share and get_trending_posts functions to ensure the
+        in-process scores are used while Redis is unavailable.
+        """
+        with mock.patch('app.trending.get_redis', return_value=None):
+            trending.record_view(1)
+            trending.record_share(3)
+            posts = trending.get_trending_posts(limit=1)
+
+        self.assertEqual([post['id'] for post in posts], [3])
+        self.assertEqual(self.redis.zcard(trending.SCORES_KEY), 0)
+
+    def test_reconcile_rebuilds_share_scores(self):
+        """
+        Test the reconcile_trending_scores function to ensure share scores are
+        rebuilt from the database, views are kept and deleted posts are dropped.
+        """
+        now = datetime.utcnow()
+        db.session.add_all([SocialMediaShare(post_id=2, platform='twitter', shared_at=now),
+                            SocialMediaShare(post_id=2, platform='email', shared_at=now - timedelta(days=30))])
+        db.session.commit()
+        trending.record_view(1)
+        # A share recorded in Redis that never reached the database is dropped.
+        trending.record_share(3)
+        self.redis.zadd(trending.SCORES_KEY, {99: 100.0})
+
+        self.assertEqual(trending.reconcile_trending_scores(), 2)
+
+        scores = dict((int(post_id), score) for post_id, score
+                      in self.redis.zrange(trending.SCORES_KEY, 0, -1, withscores=True))
+        self.assertEqual(set(scores), {1, 2})
+        self.assertAlmostEqual(scores[1], trending.VIEW_WEIGHT, places=2)
+        self.assertAlmostEqual(scores[2], trending.SHARE_WEIGHT, places=2)
+        self.assertEqual([int(post_id) for post_id in self.redis.zrange(trending.SHARE_SCORES_KEY, 0, -1)], [2])
+
+
+if __name__ == '__main__':
+    unittest.main()
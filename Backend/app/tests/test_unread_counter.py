@@ -0,0 +1,68 @@
+import unittest
+import fakeredis
+from flask import Flask
+from app import redis_client, unread_counter
+from app.models import db, Notification, User
+
+
+class TestUnreadCounter(unittest.TestCase):
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+        self.app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+        db.init_app(self.app)
+        self.context = self.app.app_context()
+        self.context.push()
+        db.create_all()
+        db.session.add(User(id=1, username='reader', email='x', password_hash='h', salt='s'))
+        db.session.commit()
+        self.redis = fakeredis.FakeRedis()
+        redis_client._client = self.redis
+
+    def tearDown(self):
+        redis_client._client = None
+        redis_client._unavailable_until = 0.0
+        db.session.remove()
+        db.drop_all()
+        self.context.pop()
+
+    def add_unread(self, count):
+        for _ in range(count):
+            db.session.add(Notification(user_id=1, message='Hello', is_read=False))
+        unread_counter.adjust_unread_count(1, count)
+
+    def test_cached_count_follows_commits(self):
+        """
+        Test the adjust_unread_count function to ensure the cached count
+        changes when the transaction commits and not when it rolls back.
+        """
+        self.assertEqual(unread_counter.get_unread_count(1), 0)
+        self.add_unread(2)
+        db.session.commit()
+        self.assertEqual(int(self.redis.get(unread_counter._unread_key(1))), 2)
+
+        self.add_unread(3)
+        db.session.rollback()
+        self.assertEqual(unread_counter.get_unread_count(1), 2)
+        self.redis.flushall()
+        self.assertEqual(unread_counter.get_unread_count(1), 2)
+
+    def test_reconcile_corrects_drift(self):
+        """
+        Test the reconcile_unread_counts function to ensure a drifted count is
+        recounted and its cached value dropped.
+        """
+        self.add_unread(2)
+        db.session.commit()
+        User.query.filter(User.id == 1).update({User.unread_notification_count: 7})
+        db.session.commit()
+        self.redis.set(unread_counter._unread_key(1), 7)
+
+        self.assertEqual(unread_counter.reconcile_unread_counts(batch_size=1), 1)
+        self.assertEqual(unread_counter.reconcile_unread_counts(batch_size=1), 0)
+        self.assertFalse(self.redis.exists(unread_counter._unread_key(1)))
+        self.assertEqual(unread_counter.get_unread_count(1), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import sys
+import types
+import unittest
+from datetime import datetime
+from unittest import mock
+import fakeredis
+from flask import Flask
+from app import redis_client
+from app.models import db, AdminStats, User
+
+# app.cache imports the application package, which cannot be built in a unit test
+_saved = sys.modules.get('app.cache')
+sys.modules['app.cache'] = types.SimpleNamespace(cache=None)
+try:
+    from app import user_admin
+finally:
+    if _saved is None:
+        del sys.modules['app.cache']
+    else:
+        sys.modules['app.cache'] = _saved
+
+
+class TestBulkUpdateUsers(unittest.TestCase):
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+        self.app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+        db.init_app(self.app)
+        self.context = self.app.app_context()
+        self.context.push()
+        db.create_all()
+        db.session.add(AdminStats(id=1))
+        for username in ('alice', 'bob', 'carol'):
+            user = User(username=username, is_active=False)
+            user.set_email(f'{username}@example.com')
+            user.set_password('Corr3ct!Horse')
+            db.session.add(user)
+        db.session.commit()
+        User.query.filter_by(username='carol').update({'deleted_at': datetime.utcnow()})
+        db.session.commit()
+        self.redis = fakeredis.FakeRedis()
+        redis_client._client = self.redis
+
+    def tearDown(self):
+        redis_client._client = None
+        redis_client._unavailable_until = 0.0
+        db.session.remove()
+        db.drop_all()
+        self.context.pop()
+
+    def active_usernames(self):
+        return sorted(username for username, in db.session.query(User.username).filter(User.is_active.is_(True)))
+
+    def test_deleted_users_are_skipped(self):
+        """
+        Test the bulk_update_users function to ensure deleted users are not
+        changed, whether they are selected by ID or by filters.
+        """
+        chunks = user_admin.iter_user_id_chunks(ids=[1, 3])
+        self.assertEqual(user_admin.bulk_update_users(chunks, {'is_active': True}), 1)
+        self.assertEqual(self.active_usernames(), ['alice'])
+
+        chunks = user_admin.iter_user_id_chunks(filters={'is_active': False})
+        self.assertEqual(user_admin.bulk_update_users(chunks, {'is_active': True}), 1)
+        self.assertEqual(self.active_usernames(), ['alice', 'bob'])
+
+
+class TestQueuePurge(unittest.TestCase):
+    def test_broker_down(self):
+        """
+        Test the queue_purge_deleted_users function to ensure a broker failure
+        is logged instead of failing the request that deleted the users.
+        """
+        with mock.patch.object(user_admin.celery_app, 'send_task', side_effect=OSError('refused')) as send_task, \
+                self.assertLogs('app.user_admin', 'WARNING'):
+            user_admin.queue_purge_deleted_users()
+        send_task.assert_called_once_with('app.tasks.purge_deleted_users')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import unittest
+from unittest import mock
+import fakeredis
+import redis
+from flask import Flask
+from app import redis_client, view_counter
+from app.models import db, BlogPost, User
+
+
+class TestViewCounter(unittest.TestCase):
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+        self.app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+        db.init_app(self.app)
+        self.context = self.app.app_context()
+        self.context.push()
+        db.create_all()
+        db.session.add(User(id=1, username='author', email='x', password_hash='h', salt='s'))
+        db.session.add(BlogPost(id=1, title='Post', content='Content', author_id=1))
+        db.session.commit()
+        self.redis = fakeredis.FakeRedis()
+        redis_client._client = self.redis
+
+    def tearDown(self):
+        redis_client._client = None
+        redis_client._unavailable_until = 0.0
+        db.session.remove()
+        db.drop_all()
+        self.context.pop()
+
+    def view_count(self):
+        db.session.expire_all()
+        return BlogPost.query.get(1).view_count
+
+    def test_flush_writes_views(self):
+        """
+        Test the flush_view_counts function to ensure buffered views are
+        written once and the Redis buffer is removed.
+        """
+        for _ in range(3):
+            view_counter.record_view(1)
+        self.assertEqual(view_counter.flush_view_counts(), 3)
+        self.assertEqual(view_counter.flush_view_counts(), 0)
+        self.assertEqual(self.view_count(), 3)
+        self.assertFalse(self.redis.exists(view_counter.FLUSHING_VIEWS_KEY))
+
+    def test_written_batch_is_not_applied_twice(self):
+        """
+        Test the flush_view_counts function to ensure a buffer that was
+        written but could not be removed from Redis is dropped by the next flush.
+        """
+        view_counter.record_view(1)
+        view_counter.record_view(1)
+        with mock.patch.object(self.redis, 'delete', side_effect=redis.ConnectionError('down')):
+            view_counter.flush_view_counts()
+        redis_client._client = self.redis
+        redis_client._unavailable_until = 0.0
+        self.assertTrue(self.redis.exists(view_counter.FLUSHING_VIEWS_KEY))
+
+        view_counter.record_view(1)
+        self.assertEqual(view_counter.flush_view_counts(), 0)
+        self.assertEqual(view_counter.flush_view_counts(), 1)
+        self.assertEqual(self.view_count(), 3)
+
+    def test_concurrent_flush_skips_redis_buffer(self):
+        """
+        Test the flush_view_counts function to ensure a flush leaves the
+        Redis buffer alone while another flush holds the lock.
+        """
+        view_counter.record_view(1)
+        self.redis.set(view_counter.FLUSH_LOCK_KEY, 'other')
+        self.assertEqual(view_counter.flush_view_counts(), 0)
+        self.assertEqual(self.view_count(), 0)
+
+        self.redis.delete(view_counter.FLUSH_LOCK_KEY)
+        self.assertEqual(view_counter.flush_view_counts(), 1)
+        self.assertEqual(self.view_count(), 1)
+        self.assertFalse(self.redis.exists(view_counter.FLUSH_LOCK_KEY))
+
+
+if __name__ == '__main__':
+    unittest.main()
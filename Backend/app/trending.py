@@ -0,0 +1,249 @@
+import heapq
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+import redis
+
+from app.models import db, BlogPost, SocialMediaShare
+from app.redis_client import get_redis, mark_redis_unavailable
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+# Trending settings
+TRENDING_HALF_LIFE = float(os.getenv('TRENDING_HALF_LIFE', 6 * 3600))
+TRENDING_WINDOW = timedelta(days=7)
+TRENDING_MAX_POSTS = 10000
+SHARE_WEIGHT = 5.0
+VIEW_WEIGHT = 1.0
+SCORES_KEY = 'trending:scores'
+SHARE_SCORES_KEY = 'trending:shares'
+VIEW_SCORES_KEY = 'trending:views'
+EPOCH_KEY = 'trending:epoch'
+
+# Scores are stored as weight * 2 ** ((event_time - epoch) / half_life), so a
+# post's ranking never has to be decayed in place: newer events simply weigh
+# exponentially more. The reconciliation job moves the epoch forward.
+RECORD_EVENT_SCRIPT = """
+local epoch = redis.call('GET', KEYS[3])
+if not epoch then
+    epoch = ARGV[3]
+    redis.call('SET', KEYS[3], epoch)
+end
+local score = tonumber(ARGV[2]) * 2 ^ ((tonumber(ARGV[3]) - tonumber(epoch)) / tonumber(ARGV[4]))
+redis.call('ZINCRBY', KEYS[1], score, ARGV[1])
+if ARGV[5] == '1' then
+    redis.call('ZINCRBY', KEYS[2], score, ARGV[1])
+end
+return tostring(score)
+"""
+
+_local_scores = {}
+_local_share_scores = {}
+_local_epoch = time.time()
+_local_lock = threading.Lock()
+
+
+def _decayed(weight, event_time, epoch):
+    """
+    Scale an event weight relative to the scoring epoch.
+
+    :param weight: The weight of the event.
+    :param event_time: The UNIX timestamp of the event.
+    :param epoch: The UNIX timestamp of the scoring epoch.
+    :return: The stored score contribution of the event.
+    """
+    return weight * 2 ** ((event_time - epoch) / TRENDING_HALF_LIFE)
+
+
+def _record_event(post_id, weight, is_share):
+    """
+    Add an event to the trending scores.
+
+    :param post_id: The ID of the blog post.
+    :param weight: The weight of the event.
+    :param is_share: Whether the event is a share.
+    """
+    now = time.time()
+    client = get_redis()
+    if client is not None:
+        try:
+            client.eval(RECORD_EVENT_SCRIPT, 3, SCORES_KEY, SHARE_SCORES_KEY, EPOCH_KEY,
+                        post_id, weight, now, TRENDING_HALF_LIFE, '1' if is_share else '0')
+            return
+        except redis.RedisError as e:
+            mark_redis_unavailable(e)
+
+    with _local_lock:
+        score = _decayed(weight, now, _local_epoch)
+        _local_scores[post_id] = _local_scores.get(post_id, 0.0) + score
+        if is_share:
+            _local_share_scores[post_id] = _local_share_scores.get(post_id, 0.0) + score
+
+
+def record_share(post_id):
+    """
+    Record a share of a blog post in the trending scores.
+
+    :param post_id: The ID of the shared blog post.
+    """
+    _record_event(post_id, SHARE_WEIGHT, is_share=True)
+
+
+def record_view(post_id):
+    """
+    Record a view of a blog post in the trending scores.
+
+    :param post_id: The ID of the viewed blog post.
+    """
+    _record_event(post_id, VIEW_WEIGHT, is_share=False)
+
+
+def _top_scores(limit):
+    """
+    Get the highest trending scores, expressed relative to the current time.
+
+    :param limit: The maximum number of posts to return.
+    :return: List of (post_id, score) tuples ordered by descending score.
+    """
+    now = time.time()
+    client = get_redis()
+    if client is not None:
+        try:
+            pipeline = client.pipeline(transaction=True)
+            pipeline.get(EPOCH_KEY)
+            pipeline.zrevrange(SCORES_KEY, 0, limit - 1, withscores=True)
+            epoch, top = pipeline.execute()
+            epoch = float(epoch) if epoch else now
+            return [(int(post_id), score / _decayed(1.0, now, epoch)) for post_id, score in top]
+        except redis.RedisError as e:
+            mark_redis_unavailable(e)
+
+    with _local_lock:
+        top = heapq.nlargest(limit, _local_scores.items(), key=lambda item: item[1])
+        epoch = _local_epoch
+    return [(post_id, score / _decayed(1.0, now, epoch)) for post_id, score in top]
+
+
+def get_trending_posts(limit=10):
+    """
+    Get the currently trending blog posts.
+
+    :param limit: The maximum number of posts to return.
+    :return: List of dictionaries with the id, title, url and score of each post.
+    """
+    top = _top_scores(limit)
+    titles = dict(db.session.query(BlogPost.id, BlogPost.title)
+                  .filter(BlogPost.id.in_([post_id for post_id, _ in top])).all()) if top else {}
+    return [{"id": post_id, "title": titles[post_id], "url": f"/blog/post/{post_id}", "score": round(score, 4)}
+            for post_id, score in top if post_id in titles]
+
+
+def reconcile_trending_scores():
+    """
+    Rebuild the share contribution of the trending scores from the database.
+
+    Share scores are recomputed from the ``SocialMediaShare`` rows inside
+    ``TRENDING_WINDOW``, view scores are carried over, every score is
+    rebased to a new epoch so the stored values stay small, and posts that
+    were deleted, decayed to nothing or fall outside the top
+    ``TRENDING_MAX_POSTS`` are dropped.
+
+    :return: The number of posts in the trending set.
+    """
+    global _local_epoch
+    now = time.time()
+    since = datetime.utcnow() - TRENDING_WINDOW
+    share_scores = {}
+    shares = db.session.query(SocialMediaShare.post_id, SocialMediaShare.shared_at) \
+        .filter(SocialMediaShare.shared_at >= since).yield_per(1000)
+    for post_id, shared_at in shares:
+        event_time = (shared_at - datetime(1970, 1, 1)).total_seconds()
+        share_scores[post_id] = share_scores.get(post_id, 0.0) + _decayed(SHARE_WEIGHT, event_time, now)
+    # Anything below the weight of a single view shared a full window ago is noise.
+    min_score = _decayed(VIEW_WEIGHT, now - TRENDING_WINDOW.total_seconds(), now)
+
+    client = get_redis()
+    if client is None:
+        with _local_lock:
+            factor = _decayed(1.0, _local_epoch, now)
+            scores = {post_id: (score - _local_share_scores.get(post_id, 0.0)) * factor
+                      for post_id, score in _local_scores.items()}
+            for post_id, score in share_scores.items():
+                scores[post_id] = scores.get(post_id, 0.0) + score
+            scores = {post_id: score for post_id, score in scores.items() if score >= min_score}
+            _local_scores.clear()
+            _local_scores.update(heapq.nlargest(TRENDING_MAX_POSTS, scores.items(), key=lambda item: item[1]))
+            _local_share_scores.clear()
+            _local_share_scores.update((post_id, score) for post_id, score in share_scores.items()
+                                       if post_id in _local_scores)
+            _local_epoch = now
+        _drop_deleted_posts(None)
+        return len(_local_scores)
+
+    try:
+        with client.pipeline(transaction=True) as pipeline:
+            while True:
+                try:
+                    pipeline.watch(EPOCH_KEY)
+                    epoch = pipeline.get(EPOCH_KEY)
+                    factor = _decayed(1.0, float(epoch), now) if epoch else 1.0
+                    pipeline.multi()
+                    # Carry the view contribution (total minus shares) over to the new epoch.
+                    pipeline.zunionstore(VIEW_SCORES_KEY, {SCORES_KEY: factor, SHARE_SCORES_KEY: -factor})
+                    pipeline.delete(SHARE_SCORES_KEY)
+                    if share_scores:
+                        pipeline.zadd(SHARE_SCORES_KEY, share_scores)
+                    pipeline.zunionstore(SCORES_KEY, [VIEW_SCORES_KEY, SHARE_SCORES_KEY])
+                    pipeline.delete(VIEW_SCORES_KEY)
+                    pipeline.zremrangebyscore(SCORES_KEY, '-inf', f'({min_score}')
+                    pipeline.zremrangebyrank(SCORES_KEY, 0, -(TRENDING_MAX_POSTS + 1))
+                    pipeline.zinterstore(SHARE_SCORES_KEY, {SHARE_SCORES_KEY: 1, SCORES_KEY: 0})
+                    pipeline.set(EPOCH_KEY, now)
+                    pipeline.execute()
+                    break
+                except redis.WatchError:
+                    continue
+        _drop_deleted_posts(client)
+        size = client.zcard(SCORES_KEY)
+    except redis.RedisError as e:
+        mark_redis_unavailable(e)
+        raise
+
+    logger.info(f"Reconciled trending scores for {size} posts")
+    return size
+
+
+def _drop_deleted_posts(client):
+    """
+    Remove posts that no longer exist from the trending scores.
+
+    :param client: The Redis client, or None to use the in-process scores.
+    """
+    if client is None:
+        with _local_lock:
+            post_ids = list(_local_scores)
+    else:
+        post_ids = [int(post_id) for post_id in client.zrange(SCORES_KEY, 0, -1)]
+
+    existing = set()
+    for start in range(0, len(post_ids), 1000):
+        chunk = post_ids[start:start + 1000]
+        existing.update(post_id for post_id, in db.session.query(BlogPost.id).filter(BlogPost.id.in_(chunk)))
+    deleted = [post_id for post_id in post_ids if post_id not in existing]
+    if not deleted:
+        return
+
+    if client is None:
+        with _local_lock:
+            for post_id in deleted:
+                _local_scores.pop(post_id, None)
+                _local_share_scores.pop(post_id, None)
+    else:
+        client.zrem(SCORES_KEY, *deleted)
+        client.zrem(SHARE_SCORES_KEY, *deleted)
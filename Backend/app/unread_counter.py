@@ -0,0 +1,154 @@
+import logging
+
+import redis
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.models import db, User, Notification
+from app.redis_client import get_redis, mark_redis_unavailable
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+# Unread notification counter settings
+UNREAD_KEY_PREFIX = 'notifications:unread:'
+# Seconds a counter loaded into Redis is kept, which bounds the drift of a missed update
+UNREAD_CACHE_TTL = 3600
+# Number of users recounted per transaction by reconcile_unread_counts
+RECONCILE_BATCH_SIZE = 1000
+
+# Only counters that are already cached are changed; a missing counter is
+# loaded from the database column on the next read.
+INCREMENT_IF_CACHED_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return nil
+end
+return redis.call('INCRBY', KEYS[1], ARGV[1])
+"""
+
+_PENDING_KEY = 'unread_notification_deltas'
+
+
+def _unread_key(user_id):
+    return f"{UNREAD_KEY_PREFIX}{user_id}"
+
+
+def adjust_unread_count(user_id, delta):
+    """
+    Change the unread notification count of a user as part of the current transaction.
+
+    ``User.unread_notification_count`` is updated in the transaction; the
+    cached Redis counter follows once the transaction commits.
+
+    :param user_id: The ID of the user.
+    :param delta: The number of notifications that became unread (positive) or read or deleted (negative).
+    """
+    if not delta:
+        return
+    User.query.filter(User.id == user_id) \
+        .update({User.unread_notification_count: User.unread_notification_count + delta},
+                synchronize_session=False)
+    pending = db.session.info.setdefault(_PENDING_KEY, {})
+    pending[user_id] = pending.get(user_id, 0) + delta
+
+
+@event.listens_for(Session, 'after_commit')
+def _publish_unread_deltas(session):
+    deltas = session.info.pop(_PENDING_KEY, None)
+    if not deltas:
+        return
+    client = get_redis()
+    if client is None:
+        return
+    try:
+        pipeline = client.pipeline(transaction=False)
+        for user_id, delta in deltas.items():
+            if delta:
+                pipeline.eval(INCREMENT_IF_CACHED_SCRIPT, 1, _unread_key(user_id), delta)
+        pipeline.execute()
+    except redis.RedisError as e:
+        mark_redis_unavailable(e)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_unread_deltas(session):
+    session.info.pop(_PENDING_KEY, None)
+
+
+def get_unread_count(user_id):
+    """
+    Get the number of unread notifications of a user.
+
+    The counter is read from Redis with a single GET. On a miss it is
+    loaded from ``User.unread_notification_count`` and cached, and while
+    Redis is unavailable the column is read directly.
+
+    :param user_id: The ID of the user.
+    :return: The number of unread notifications.
+    """
+    client = get_redis()
+    if client is not None:
+        try:
+            count = client.get(_unread_key(user_id))
+            if count is not None:
+                return max(int(count), 0)
+        except redis.RedisError as e:
+            mark_redis_unavailable(e)
+            client = None
+
+    count = db.session.query(User.unread_notification_count).filter(User.id == user_id).scalar() or 0
+    if client is not None:
+        try:
+            client.set(_unread_key(user_id), count, ex=UNREAD_CACHE_TTL, nx=True)
+        except redis.RedisError as e:
+            mark_redis_unavailable(e)
+    return max(count, 0)
+
+
+def reconcile_unread_counts(batch_size=RECONCILE_BATCH_SIZE):
+    """
+    Recount the unread notifications of every user.
+
+    Users are walked in ID order, one grouped COUNT, UPDATE and commit per
+    batch. The user rows of a batch are locked before counting, so an
+    unread count adjusted concurrently is either included in the count or
+    applied on top of the corrected value once the batch commits. The cached
+    Redis counters of each batch are dropped so they are reloaded from the
+    corrected column.
+
+    :param batch_size: The number of users recounted per transaction.
+    :return: The number of users whose count was corrected.
+    """
+    corrected = 0
+    last_id = 0
+    while True:
+        rows = db.session.query(User.id, User.unread_notification_count) \
+            .filter(User.id > last_id).order_by(User.id).limit(batch_size).with_for_update().all()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        user_ids = [user_id for user_id, _ in rows]
+        counts = dict(db.session.query(Notification.user_id, db.func.count(Notification.id))
+                      .filter(Notification.user_id.in_(user_ids), Notification.is_read.is_(False))
+                      .group_by(Notification.user_id))
+        stale = {user_id: counts.get(user_id, 0) for user_id, count in rows if count != counts.get(user_id, 0)}
+        if stale:
+            User.query.filter(User.id.in_(list(stale))).update({
+                User.unread_notification_count: db.case(stale, value=User.id),
+            }, synchronize_session=False)
+        # Also ends the transaction holding the row locks
+        db.session.commit()
+        corrected += len(stale)
+
+        client = get_redis()
+        if client is not None:
+            try:
+                client.delete(*[_unread_key(user_id) for user_id in user_ids])
+            except redis.RedisError as e:
+                mark_redis_unavailable(e)
+
+    if corrected:
+        logger.info(f"Corrected the unread notification count of {corrected} users")
+    return corrected
@@ -0,0 +1,349 @@
+import logging
+import uuid
+from datetime import datetime
+
+import redis
+from sqlalchemy.exc import IntegrityError
+
+from api.celery_app import app as celery_app
+from app.admin_stats import increment_stats
+from app.authz import invalidate_authz_versions
+from app.cache import cache
+from app.models import (db, User, Role, UserRoles, BlogPost, RelatedPost, SocialMediaShare, UserActivityLog,
+                        Notification, SearchQuery, PasswordHistory, TaskCheckpoint)
+from app.redis_client import get_redis, mark_redis_unavailable
+from app.revocation import revoke_users_tokens
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+# Admin user listing settings
+USER_PAGE_SIZE = 50
+USER_PAGE_SIZE_MAX = 200
+# Seconds a filtered user count is reused
+USER_COUNT_CACHE_TIMEOUT = 60
+# Number of users changed per statement and transaction by the bulk operations
+BULK_CHUNK_SIZE = 1000
+# Number of rows removed per statement when purging deleted users
+PURGE_BATCH_SIZE = 1000
+PURGE_CHECKPOINT = 'purge-deleted-users'
+PURGE_LOCK_KEY = 'users:purge-lock'
+# Seconds after which the purge lock of a crashed run expires; renewed after every user
+PURGE_LOCK_TIMEOUT = 600
+
+RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+RENEW_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('EXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+
+def filter_users(query, is_active=None, is_admin=None, role=None):
+    """
+    Restrict a User query to the admin listing filters, leaving out deleted users.
+
+    :param query: The query selecting users.
+    :param is_active: Only active (True) or inactive (False) users, or None for both.
+    :param is_admin: Only admins (True) or non-admins (False), or None for both.
+    :param role: Only users with the role of this name, or None.
+    :return: The filtered query.
+    """
+    query = query.filter(User.deleted_at.is_(None))
+    if is_active is not None:
+        query = query.filter(User.is_active.is_(is_active))
+    if is_admin is not None:
+        query = query.filter(User.is_admin.is_(is_admin))
+    if role is not None:
+        query = query.filter(db.exists().where(UserRoles.user_id == User.id)
+                             .where(UserRoles.role_id == Role.id).where(Role.name == role))
+    return query
+
+
+def list_users(after_id=None, limit=USER_PAGE_SIZE, **filters):
+    """
+    Get one page of users in ID order.
+
+    Pages are addressed by the last ID of the previous page instead of an
+    offset, so every page is an index range scan however deep it is.
+
+    :param after_id: The last user ID of the previous page, or None for the first page.
+    :param limit: The number of users per page.
+    :param filters: The filters accepted by filter_users.
+    :return: Tuple of the list of users and the ``after_id`` of the next page, or None on the last page.
+    """
+    query = filter_users(User.query, **filters)
+    if after_id is not None:
+        query = query.filter(User.id > after_id)
+    users = query.order_by(User.id).limit(limit + 1).all()
+    if len(users) > limit:
+        return users[:limit], users[limit - 1].id
+    return users, None
+
+
+def count_users(is_active=None, is_admin=None, role=None):
+    """
+    Count the users matching the admin listing filters.
+
+    Counts are cached for ``USER_COUNT_CACHE_TIMEOUT`` seconds, so the
+    number shown while paging can lag behind recent changes.
+
+    :param is_active: The is_active filter.
+    :param is_admin: The is_admin filter.
+    :param role: The role filter.
+    :return: The number of matching users.
+    """
+    key = f"admin:user-count:{is_active}:{is_admin}:{role}"
+    count = cache.get(key)
+    if count is None:
+        query = filter_users(db.session.query(db.func.count(User.id)), is_active=is_active, is_admin=is_admin,
+                             role=role)
+        count = query.scalar()
+        cache.set(key, count, timeout=USER_COUNT_CACHE_TIMEOUT)
+    return count
+
+
+def iter_user_id_chunks(ids=None, filters=None, exclude_id=None, chunk_size=BULK_CHUNK_SIZE):
+    """
+    Select users for a bulk operation, in chunks of IDs.
+
+    Users matching filters are walked in ID order with one keyset query
+    per chunk, so the selection may be changed by the operation itself.
+
+    :param ids: The IDs of the users, or None to select by filters.
+    :param filters: The filters accepted by filter_users.
+    :param exclude_id: A user ID never to select, such as the acting admin.
+    :param chunk_size: The number of IDs per chunk.
+    :return: Generator of lists of user IDs.
+    """
+    if ids is not None:
+        ids = sorted(set(ids) - {exclude_id})
+        for start in range(0, len(ids), chunk_size):
+            yield ids[start:start + chunk_size]
+        return
+
+    query = filter_users(db.session.query(User.id), **(filters or {}))
+    if exclude_id is not None:
+        query = query.filter(User.id != exclude_id)
+    after_id = 0
+    while True:
+        chunk = [user_id for user_id, in query.filter(User.id > after_id).order_by(User.id).limit(chunk_size)]
+        if not chunk:
+            return
+        yield chunk
+        after_id = chunk[-1]
+
+
+def bulk_update_users(chunks, values, revoke_tokens=False):
+    """
+    Update users with one UPDATE statement and commit per chunk.
+
+    The authorization version of every updated user is bumped in the same
+    statement, so their tokens are re-checked. Deleted users are skipped.
+
+    :param chunks: Iterable of lists of user IDs, from iter_user_id_chunks.
+    :param values: Dictionary of column names and new values.
+    :param revoke_tokens: Whether to also revoke the users' access tokens.
+    :return: The number of users updated.
+    """
+    updated = 0
+    for chunk in chunks:
+        updated += User.query.filter(User.id.in_(chunk), User.deleted_at.is_(None)) \
+            .update(dict(values, authz_version=User.authz_version + 1), synchronize_session=False)
+        db.session.commit()
+        invalidate_authz_versions(chunk)
+        if revoke_tokens:
+            revoke_users_tokens(chunk)
+    return updated
+
+
+def soft_delete_users(chunks):
+    """
+    Mark users as deleted, one UPDATE statement and commit per chunk.
+
+    Deleted users are deactivated and their tokens revoked at once; their
+    rows are removed later by purge_deleted_users.
+
+    :param chunks: Iterable of lists of user IDs, from iter_user_id_chunks.
+    :return: The number of users deleted.
+    """
+    deleted = 0
+    for chunk in chunks:
+        count = User.query.filter(User.id.in_(chunk), User.deleted_at.is_(None)) \
+            .update({'deleted_at': datetime.utcnow(), 'is_active': False,
+                     'authz_version': User.authz_version + 1}, synchronize_session=False)
+        increment_stats(user_count=-count)
+        db.session.commit()
+        deleted += count
+        invalidate_authz_versions(chunk)
+        revoke_users_tokens(chunk)
+    return deleted
+
+
+def queue_purge_deleted_users():
+    """
+    Queue a Celery run of purge_deleted_users.
+
+    Failing to reach the broker is logged and ignored: the users are already
+    deleted and the hourly scheduled purge removes their rows.
+    """
+    try:
+        celery_app.send_task('app.tasks.purge_deleted_users')
+    except Exception as e:
+        logger.warning(f"Could not queue the purge of deleted users: {e}")
+
+
+def _delete_in_batches(model, condition, batch_size, stat=None):
+    """
+    Delete the rows matching a condition, at most ``batch_size`` rows per statement and commit.
+
+    :param model: The model of the rows.
+    :param condition: The filter selecting the rows.
+    :param batch_size: The number of rows per statement.
+    :param stat: The admin stats counter of the rows, decremented with each batch, or None.
+    :return: The number of rows deleted.
+    """
+    deleted = 0
+    while True:
+        ids = [row_id for row_id, in db.session.query(model.id).filter(condition).limit(batch_size)]
+        if not ids:
+            return deleted
+        count = db.session.query(model).filter(model.id.in_(ids)).delete(synchronize_session=False)
+        if stat:
+            increment_stats(**{stat: -count})
+        db.session.commit()
+        deleted += count
+
+
+def purge_user(user_id, batch_size=PURGE_BATCH_SIZE):
+    """
+    Delete a user and every row referencing them, in bounded batches.
+
+    Posts are removed ``batch_size`` at a time together with their shares and
+    recommendations. Search queries are kept for statistics and only
+    unlinked from the user.
+
+    :param user_id: The ID of the user.
+    :param batch_size: The number of rows per statement.
+    :return: The number of rows deleted, including the user.
+    """
+    deleted = 0
+    while True:
+        post_ids = [post_id for post_id, in db.session.query(BlogPost.id)
+                    .filter(BlogPost.author_id == user_id).limit(batch_size)]
+        if not post_ids:
+            break
+        deleted += _delete_in_batches(SocialMediaShare, SocialMediaShare.post_id.in_(post_ids), batch_size)
+        deleted += _delete_in_batches(RelatedPost, RelatedPost.post_id.in_(post_ids), batch_size)
+        deleted += _delete_in_batches(BlogPost, BlogPost.id.in_(post_ids), batch_size, 'post_count')
+
+    deleted += _delete_in_batches(UserActivityLog, UserActivityLog.user_id == user_id, batch_size,
+                                  'activity_log_count')
+    deleted += _delete_in_batches(Notification, Notification.user_id == user_id, batch_size, 'notification_count')
+    for model in (PasswordHistory, UserRoles):
+        deleted += _delete_in_batches(model, model.user_id == user_id, batch_size)
+
+    while True:
+        # SearchQuery has a column named "query", so it is queried through the session
+        ids = [row_id for row_id, in db.session.query(SearchQuery.id)
+               .filter(SearchQuery.user_id == user_id).limit(batch_size)]
+        if not ids:
+            break
+        db.session.query(SearchQuery).filter(SearchQuery.id.in_(ids)) \
+            .update({'user_id': None}, synchronize_session=False)
+        db.session.commit()
+
+    deleted += User.query.filter(User.id == user_id, User.deleted_at.isnot(None)).delete(synchronize_session=False)
+    db.session.commit()
+    return deleted
+
+
+def _set_purge_checkpoint(position):
+    """
+    Record the user being purged, creating the checkpoint if needed.
+
+    :param position: The ID of the user, as a string.
+    """
+    if TaskCheckpoint.query.filter_by(name=PURGE_CHECKPOINT) \
+            .update({'position': position, 'updated_at': datetime.utcnow()}, synchronize_session=False):
+        db.session.commit()
+        return
+    db.session.add(TaskCheckpoint(name=PURGE_CHECKPOINT, position=position))
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Created by a concurrent run since the update
+        db.session.rollback()
+        TaskCheckpoint.query.filter_by(name=PURGE_CHECKPOINT) \
+            .update({'position': position, 'updated_at': datetime.utcnow()}, synchronize_session=False)
+        db.session.commit()
+
+
+def purge_deleted_users(batch_size=PURGE_BATCH_SIZE, max_users=None):
+    """
+    Purge the users marked as deleted, oldest ID first.
+
+    The ID of the user being purged is kept in a TaskCheckpoint, so the
+    progress of a long purge can be followed and an interrupted run resumes
+    with the same user. Every statement is bounded and committed on its
+    own, so no transaction holds locks on a large history. Only one run at a
+    time purges, guarded by a Redis lock; a run that finds the lock taken
+    returns at once. While Redis is unavailable runs are not serialized, and
+    the checkpoint and the purge statements tolerate a concurrent run.
+
+    :param batch_size: The number of rows per statement.
+    :param max_users: Stop after this many users, or None to run to the end.
+    :return: Tuple of the number of users purged and whether this run has nothing left to do.
+    """
+    client = get_redis()
+    lock_token = None
+    if client is not None:
+        try:
+            lock_token = uuid.uuid4().hex
+            if not client.set(PURGE_LOCK_KEY, lock_token, nx=True, ex=PURGE_LOCK_TIMEOUT):
+                logger.info("Another run is purging deleted users")
+                return 0, True
+        except redis.RedisError as e:
+            mark_redis_unavailable(e)
+            lock_token = None
+
+    purged = 0
+    try:
+        while max_users is None or purged < max_users:
+            user_id = db.session.query(User.id).filter(User.deleted_at.isnot(None)) \
+                .order_by(User.id).limit(1).scalar()
+            if user_id is None:
+                TaskCheckpoint.query.filter_by(name=PURGE_CHECKPOINT).delete(synchronize_session=False)
+                db.session.commit()
+                return purged, True
+            _set_purge_checkpoint(str(user_id))
+
+            rows = purge_user(user_id, batch_size)
+            purged += 1
+            logger.info(f"Purged deleted user {user_id} ({rows} rows)")
+
+            if lock_token is not None:
+                try:
+                    if not client.eval(RENEW_LOCK_SCRIPT, 1, PURGE_LOCK_KEY, lock_token, PURGE_LOCK_TIMEOUT):
+                        logger.warning("Lost the purge lock, leaving the rest to the run that holds it")
+                        lock_token = None
+                        return purged, True
+                except redis.RedisError as e:
+                    mark_redis_unavailable(e)
+                    lock_token = None
+        return purged, False
+    finally:
+        if lock_token is not None:
+            try:
+                client.eval(RELEASE_LOCK_SCRIPT, 1, PURGE_LOCK_KEY, lock_token)
+            except redis.RedisError as e:
+                mark_redis_unavailable(e)
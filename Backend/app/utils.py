@@ -1,9 +1,9 @@
 import jwt
 import datetime
 from flask import render_template
-from flask_mail import Message
-from app import app, mail
+from app import app
 from app.models import User
+from app.mail_outbox import enqueue_email
 
 def generate_password_reset_token(user_id):
     """
@@ -38,15 +38,15 @@ def send_password_reset_email(email, token):
     """
     Send a password reset email to the given email address.
 
+    The email is rendered here and queued for a Celery worker, so the
+    request does not wait for the SMTP server.
+
     :param email: The email address to send the password reset email to.
     :param token: The password reset token.
     """
-    user = User.query.filter_by(email=email).first()
+    user = User.find_by_email(email)
     if user:
         reset_link = f"{app.config['FRONTEND_URL']}/reset_password?token={token}"
         html = render_template('email/password_reset.html', user=user, reset_link=reset_link)
-        msg = Message(subject="Password Reset Instructions",
-                      sender=app.config['MAIL_DEFAULT_SENDER'],
-                      recipients=[email],
-                      html=html)
-        mail.send(msg)
+        enqueue_email("Password Reset Instructions", [email], html=html,
+                      sender=app.config.get('MAIL_DEFAULT_SENDER'))
@@ -0,0 +1,252 @@
+import logging
+import threading
+import time
+import uuid
+from collections import Counter
+
+import redis
+
+from app.models import db, BlogPost, TaskCheckpoint
+from app.redis_client import get_redis, mark_redis_unavailable
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+# View counter settings
+PENDING_VIEWS_KEY = 'blog:views:pending'
+FLUSHING_VIEWS_KEY = 'blog:views:flushing'
+FLUSHING_BATCH_KEY = 'blog:views:flushing:batch'
+FLUSH_LOCK_KEY = 'blog:views:flush-lock'
+# Seconds after which the flush lock of a crashed flush expires
+FLUSH_LOCK_TIMEOUT = 300
+FLUSH_CHECKPOINT = 'flush-view-counts'
+# Seconds between flushes of the in-process fallback counter
+LOCAL_FLUSH_INTERVAL = 10
+# Maximum number of posts updated by a single UPDATE statement
+FLUSH_CHUNK_SIZE = 1000
+
+# Moves the pending buffer to the flushing buffer unless a claimed buffer is
+# left over, and returns the batch ID of the claimed buffer, or nil if none.
+CLAIM_BUFFER_SCRIPT = """
+if redis.call('EXISTS', KEYS[2]) == 0 then
+    if redis.call('EXISTS', KEYS[1]) == 0 then
+        return nil
+    end
+    redis.call('RENAME', KEYS[1], KEYS[2])
+    redis.call('SET', KEYS[3], ARGV[1])
+end
+if redis.call('EXISTS', KEYS[3]) == 0 then
+    redis.call('SET', KEYS[3], ARGV[1])
+end
+return redis.call('GET', KEYS[3])
+"""
+
+# Deletes the lock only if it is still held with the given token
+RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+_local_pending = Counter()
+_local_lock = threading.Lock()
+_last_local_flush = time.monotonic()
+
+
+def record_view(post_id):
+    """
+    Record a view of a blog post without writing to the database.
+
+    Views are buffered with a Redis HINCRBY and written to
+    ``BlogPost.view_count`` by flush_view_counts. When Redis is unavailable
+    they are buffered in-process and flushed from the request thread at
+    most every ``LOCAL_FLUSH_INTERVAL`` seconds.
+
+    :param post_id: The ID of the viewed blog post.
+    """
+    global _last_local_flush
+    client = get_redis()
+    if client is not None:
+        try:
+            client.hincrby(PENDING_VIEWS_KEY, post_id, 1)
+            return
+        except redis.RedisError as e:
+            mark_redis_unavailable(e)
+
+    with _local_lock:
+        _local_pending[post_id] += 1
+        flush_due = time.monotonic() - _last_local_flush >= LOCAL_FLUSH_INTERVAL
+        if flush_due:
+            _last_local_flush = time.monotonic()
+    if flush_due:
+        flush_view_counts()
+
+
+def _drain_local_views():
+    """
+    Take all views buffered in-process.
+
+    :return: Counter of view deltas keyed by post ID.
+    """
+    with _local_lock:
+        deltas = Counter(_local_pending)
+        _local_pending.clear()
+    return deltas
+
+
+def apply_view_deltas(deltas):
+    """
+    Add view deltas to ``BlogPost.view_count`` with one UPDATE per chunk.
+
+    :param deltas: Mapping of post ID to the number of views to add.
+    """
+    post_ids = sorted(post_id for post_id, delta in deltas.items() if delta)
+    for start in range(0, len(post_ids), FLUSH_CHUNK_SIZE):
+        chunk = post_ids[start:start + FLUSH_CHUNK_SIZE]
+        increment = db.case({post_id: deltas[post_id] for post_id in chunk}, value=BlogPost.id, else_=0)
+        BlogPost.query.filter(BlogPost.id.in_(chunk)).update({
+            BlogPost.view_count: BlogPost.view_count + increment,
+            # View counts are not content changes, keep the modification time.
+            BlogPost.updated_at: BlogPost.updated_at,
+        }, synchronize_session=False)
+    db.session.commit()
+
+
+def _claim_buffer(client):
+    """
+    Claim the Redis view buffer for a flush.
+
+    The caller must hold the flush lock.
+
+    :param client: The Redis client.
+    :return: Tuple of the batch ID and the claimed deltas, or (None, empty Counter) if nothing is buffered.
+    """
+    batch_id = client.eval(CLAIM_BUFFER_SCRIPT, 3, PENDING_VIEWS_KEY, FLUSHING_VIEWS_KEY, FLUSHING_BATCH_KEY,
+                           uuid.uuid4().hex)
+    if batch_id is None:
+        return None, Counter()
+    deltas = Counter({int(post_id): int(delta) for post_id, delta in client.hgetall(FLUSHING_VIEWS_KEY).items()})
+    return batch_id.decode(), deltas
+
+
+def flush_view_counts():
+    """
+    Write all buffered views to the database.
+
+    The Redis buffer is claimed atomically by renaming it, so views recorded
+    during the flush go to a fresh buffer. Only one flush at a time works on
+    the Redis buffer, guarded by a lock. Each claimed buffer gets a batch ID
+    that is recorded in a TaskCheckpoint in the same transaction as the
+    views, so a buffer whose views were written but which could not be
+    removed from Redis is dropped instead of applied twice. A claimed buffer
+    left behind by a failed flush is retried before a new one is claimed.
+
+    :return: The total number of views written.
+    """
+    local_deltas = _drain_local_views()
+    deltas = Counter(local_deltas)
+    client = get_redis()
+    lock_token = None
+    batch_id = None
+    if client is not None:
+        try:
+            lock_token = uuid.uuid4().hex
+            if not client.set(FLUSH_LOCK_KEY, lock_token, nx=True, ex=FLUSH_LOCK_TIMEOUT):
+                lock_token = None  # Another flush is writing the Redis buffer
+            else:
+                batch_id, buffered = _claim_buffer(client)
+                deltas.update(buffered)
+        except redis.RedisError as e:
+            mark_redis_unavailable(e)
+            batch_id = None
+
+    try:
+        written = _write_deltas(client, batch_id, deltas, local_deltas)
+    finally:
+        if lock_token is not None:
+            try:
+                client.eval(RELEASE_LOCK_SCRIPT, 1, FLUSH_LOCK_KEY, lock_token)
+            except redis.RedisError as e:
+                mark_redis_unavailable(e)
+    return written
+
+
+def _write_deltas(client, batch_id, deltas, local_deltas):
+    """
+    Apply the deltas of a flush and remove its claimed Redis buffer.
+
+    :param client: The Redis client, or None.
+    :param batch_id: The ID of the claimed Redis buffer, or None.
+    :param deltas: Counter of all view deltas of the flush.
+    :param local_deltas: The part of the deltas that was buffered in-process.
+    :return: The total number of views written.
+    """
+    if batch_id is not None:
+        checkpoint = TaskCheckpoint.query.get(FLUSH_CHECKPOINT)
+        if checkpoint is None:
+            checkpoint = TaskCheckpoint(name=FLUSH_CHECKPOINT)
+            db.session.add(checkpoint)
+        if checkpoint.position == batch_id:
+            # Written by an earlier flush that failed to remove the buffer
+            deltas = Counter(local_deltas)
+            logger.info(f"Dropping view batch {batch_id}, it was already written")
+        else:
+            checkpoint.position = batch_id
+
+    if deltas or batch_id is not None:
+        try:
+            apply_view_deltas(deltas)
+        except Exception:
+            db.session.rollback()
+            # The claimed Redis buffer is kept and retried by the next flush.
+            with _local_lock:
+                _local_pending.update(local_deltas)
+            raise
+
+    if batch_id is not None:
+        try:
+            client.delete(FLUSHING_VIEWS_KEY, FLUSHING_BATCH_KEY)
+        except redis.RedisError as e:
+            mark_redis_unavailable(e)
+
+    total = sum(deltas.values())
+    if total:
+        logger.info(f"Flushed {total} views for {len(deltas)} posts")
+    return total
+
+
+def get_pending_views(post_ids):
+    """
+    Get the number of buffered views that have not been written yet.
+
+    :param post_ids: List of blog post IDs.
+    :return: Dictionary mapping each post ID to its pending view count.
+    """
+    with _local_lock:
+        pending = {post_id: _local_pending.get(post_id, 0) for post_id in post_ids}
+
+    client = get_redis()
+    if client is not None and post_ids:
+        try:
+            pipeline = client.pipeline(transaction=False)
+            pipeline.hmget(PENDING_VIEWS_KEY, post_ids)
+            pipeline.hmget(FLUSHING_VIEWS_KEY, post_ids)
+            for counts in pipeline.execute():
+                for post_id, count in zip(post_ids, counts):
+                    pending[post_id] += int(count or 0)
+        except redis.RedisError as e:
+            mark_redis_unavailable(e)
+    return pending
+
+
+def get_view_count(post):
+    """
+    Get the view count of a blog post, including buffered views.
+
+    :param post: The BlogPost instance.
+    :return: The persisted view count plus pending views.
+    """
+    return (post.view_count or 0) + get_pending_views([post.id])[post.id]
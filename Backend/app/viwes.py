@@ -1,9 +1,14 @@
 from flask import Flask
+from flask_jwt_extended import JWTManager
 from routes.admin import admin
 from routes.blog import blog
 from routes.auth import auth
+from routes.sitemap import sitemap
+from routes.notifications import notifications_bp
 from models import db
 from error_handler import init_error_handler
+from app.revocation import is_token_revoked
+import commands  # noqa: F401  Registers the Flask CLI commands
 
 app = Flask(__name__)
 
@@ -12,9 +17,14 @@ app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
 db.init_app(app)
 
+jwt = JWTManager(app)
+jwt.token_in_blocklist_loader(is_token_revoked)
+
 app.register_blueprint(admin, url_prefix='/admin')
 app.register_blueprint(blog, url_prefix='/blog')
 app.register_blueprint(auth, url_prefix='/auth')
+app.register_blueprint(sitemap)
+app.register_blueprint(notifications_bp)
 
 with app.app_context():
     db.create_all()
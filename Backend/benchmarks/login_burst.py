@@ -0,0 +1,116 @@
+"""
+Login burst benchmark
+
+Measures how a burst of logins affects the latency of unrelated blog reads
+when argon2 runs inline on the web workers versus in the bounded hashing
+pool from ``app.hashing``.
+
+A thread pool stands in for the gunicorn workers. Each simulated login
+verifies an argon2 hash; each simulated blog read does a millisecond of
+work. Reads are issued at a steady rate while the login burst is queued,
+and the read latency percentiles are reported for both modes.
+
+Usage:
+```bash
+cd Backend
+python -m benchmarks.login_burst --workers 8 --logins 200 --reads 400
+```
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from app import hashing  # noqa: E402
+
+
+def simulate_read():
+    """
+    Simulate a cheap blog read.
+
+    :return: The perf_counter value when the read finished.
+    """
+    time.sleep(0.001)
+    return time.perf_counter()
+
+
+def simulate_login(password_hash, inline):
+    """
+    Simulate a login that verifies a password.
+
+    :param password_hash: The argon2 hash to verify against.
+    :param inline: Whether to hash on the worker thread instead of the pool.
+    :return: The HTTP status code the login would return.
+    """
+    if inline:
+        hashing._verify(password_hash, 'Secret123!')
+        return 200
+    try:
+        hashing.verify_password(password_hash, 'Secret123!')
+        return 200
+    except hashing.HashingPoolSaturated:
+        return 503
+
+
+def run(workers, logins, reads, read_interval, inline):
+    """
+    Run one benchmark round.
+
+    :param workers: The number of simulated web workers.
+    :param logins: The number of logins in the burst.
+    :param reads: The number of blog reads issued during the burst.
+    :param read_interval: Seconds between blog reads.
+    :param inline: Whether logins hash on the worker threads.
+    :return: Tuple of (sorted read latencies, login status counts).
+    """
+    password_hash = hashing._hash('Secret123!')
+    with ThreadPoolExecutor(max_workers=workers) as web_workers:
+        login_futures = [web_workers.submit(simulate_login, password_hash, inline) for _ in range(logins)]
+        read_futures = []
+        for _ in range(reads):
+            submitted = time.perf_counter()
+            read_futures.append((submitted, web_workers.submit(simulate_read)))
+            time.sleep(read_interval)
+
+        # Latency is measured from submission, so time spent queued behind logins counts.
+        latencies = sorted(future.result() - submitted for submitted, future in read_futures)
+        statuses = {}
+        for future in login_futures:
+            status = future.result()
+            statuses[status] = statuses.get(status, 0) + 1
+    return latencies, statuses
+
+
+def percentile(values, fraction):
+    """
+    Get a percentile from sorted values.
+
+    :param values: Sorted list of values.
+    :param fraction: The percentile as a fraction between 0 and 1.
+    :return: The value at the percentile.
+    """
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', type=int, default=8, help='Simulated web workers.')
+    parser.add_argument('--logins', type=int, default=200, help='Logins in the burst.')
+    parser.add_argument('--reads', type=int, default=400, help='Blog reads issued during the burst.')
+    parser.add_argument('--read-interval', type=float, default=0.005, help='Seconds between blog reads.')
+    args = parser.parse_args()
+
+    print(f"hashing pool: {hashing.HASHING_POOL_SIZE} processes, {hashing.HASHING_MAX_PENDING} pending jobs max")
+    for label, inline in (('inline', True), ('pooled', False)):
+        latencies, statuses = run(args.workers, args.logins, args.reads, args.read_interval, inline)
+        print(f"{label:>7}: read p50 {percentile(latencies, 0.5) * 1000:8.1f} ms, "
+              f"p99 {percentile(latencies, 0.99) * 1000:8.1f} ms, "
+              f"mean {statistics.mean(latencies) * 1000:8.1f} ms, login statuses {statuses}")
+
+
+if __name__ == '__main__':
+    main()
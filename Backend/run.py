@@ -4,6 +4,7 @@ from flask import Flask
 from app.routes.admin import admin
 from app.routes.blog import blog
 from app.routes.auth import auth
+from app.routes.sitemap import sitemap
 from app.models import db
 from app.error_handler import init_error_handler
 
@@ -18,6 +19,7 @@ db.init_app(app)
 app.register_blueprint(admin, url_prefix='/admin')
 app.register_blueprint(blog, url_prefix='/blog')
 app.register_blueprint(auth, url_prefix='/auth')
+app.register_blueprint(sitemap)
 
 with app.app_context():
     db.create_all()